@@ -1,12 +1,24 @@
-from flask import Flask, request, jsonify, render_template, g
+from flask import Flask, Response, request, jsonify, render_template, g, stream_with_context
+import hashlib
 import os
 import logging
 import time
-import requests
 from datetime import datetime, timezone
 import json
 
-from services import conversations_client
+from services import (
+    agenda_index,
+    cassette,
+    conversation_pool,
+    conversations_client,
+    faq_index,
+    http_client,
+    metrics,
+    oba_details,
+    prefetch,
+    typesense_search,
+)
+from services.oba_config import COLLECTION_FAQ, OBA_API_BASE
 from services.oba_helpers import make_envelope
 
 app = Flask(__name__)
@@ -15,6 +27,9 @@ app.secret_key = os.environ["SECRET_KEY"]
 # Alleen nodig voor OBA proxies
 OBA_API_KEY = os.environ["OBA_API_KEY"]
 
+# Token voor beheerroutes (cache legen na herindexering); zonder token staan ze uit
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
 # === Logging setup (alleen stdout, geen externe logging) ===
 logger = logging.getLogger("oba_app")
 logger.setLevel(getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO))
@@ -24,6 +39,13 @@ if not logger.handlers:
     logger.addHandler(h)
 logger.propagate = False
 
+# Agenda-index alvast vullen (no-op tenzij AGENDA_INDEX=1)
+agenda_index.ensure_started()
+# FAQ-collectie in het geheugen laden (no-op als FAQ_INDEX=0)
+faq_index.ensure_started()
+# Pool met kant-en-klare conversaties voor /start_thread (no-op tenzij CONVERSATION_POOL=pool)
+conversation_pool.ensure_started(conversations_client.client)
+
 
 # === Helpers ===
 def _utc_now_iso() -> str:
@@ -43,6 +65,12 @@ def _log_response(resp):
         f"http {request.method} {request.path} "
         f"status={resp.status_code} dur_ms={int(dur * 1000)}"
     )
+    if cassette.RECORDING:
+        cassette.record_inbound(request.method, request.path, request.query_string.decode("latin-1"), request.get_data())
+    # Route-patroon i.p.v. pad, zodat /static/... geen losse series worden
+    route = request.url_rule.rule if request.url_rule else "other"
+    metrics.observe("request", dur, route=route, status=resp.status_code)
+    metrics.inc("http_requests", route=route, method=request.method, status=resp.status_code)
     return resp
 
 
@@ -64,24 +92,53 @@ def start_thread():
     return jsonify({"thread_id": conversation_id})
 
 
+def _wants_stream(data: dict) -> bool:
+    return bool(data.get("stream")) or "text/event-stream" in request.headers.get("Accept", "")
+
+
+def _sse(cid: str, events):
+    """Zet (event, data)-tuples om naar Server-Sent Events."""
+    try:
+        for name, data in events:
+            with metrics.span("serialize", route="sse"):
+                chunk = f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            yield chunk
+    except Exception:
+        logger.exception("stream_error")
+        err = make_envelope("text", message="internal server error", thread_id=cid)
+        yield f"event: error\ndata: {json.dumps(err, ensure_ascii=False)}\n\n"
+
+
+def _turn_response(cid: str, user_text: str, stream: bool):
+    if stream:
+        return Response(
+            stream_with_context(_sse(cid, conversations_client.run_turn(cid, user_text, stream=True))),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    out = conversations_client.ask_with_tools(cid, user_text)
+
+    with metrics.span("serialize", route="json"):
+        if isinstance(out, dict):
+            return jsonify(out)
+
+        return jsonify(
+            make_envelope(
+                "text",
+                message=str(out),
+                thread_id=cid
+            )
+        )
+
+
 @app.route("/send_message", methods=["POST"])
 def send_message():
     data = request.json or {}
     cid = data.get("thread_id")
     user_text = data.get("user_input", "")
 
-    out = conversations_client.ask_with_tools(cid, user_text)
-
-    if isinstance(out, dict):
-        return jsonify(out)
-
-    return jsonify(
-        make_envelope(
-            "text",
-            message=str(out),
-            thread_id=cid
-        )
-    )
+    return _turn_response(cid, user_text, _wants_stream(data))
 
 
 @app.route("/apply_filters", methods=["POST"])
@@ -91,29 +148,69 @@ def apply_filters():
     filters = (data.get("filter_values") or "").strip()
 
     prompt = f"[FILTER] {filters}"
-    out = conversations_client.ask_with_tools(cid, prompt)
+    return _turn_response(cid, prompt, _wants_stream(data))
 
-    if isinstance(out, dict):
-        return jsonify(out)
 
-    return jsonify(
-        make_envelope(
-            "text",
-            message=str(out),
-            thread_id=cid
-        )
-    )
+# === Beheer ===
+@app.route("/admin/cache/invalidate", methods=["POST"])
+def invalidate_cache():
+    if not ADMIN_TOKEN or request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return jsonify({"error": "forbidden"}), 403
+
+    data = request.json or {}
+    collection = data.get("collection")  # None = alles
+    removed = typesense_search.invalidate_cache(collection)
+    if collection in (None, COLLECTION_FAQ):
+        faq_index.request_sync()
+    logger.info(f"cache_invalidate collection={collection} removed={removed}")
+    return jsonify({
+        "collection": collection,
+        "removed": removed,
+        "stats": typesense_search.SEARCH_CACHE.stats(),
+    })
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Latency-histogrammen en tellers per stage (Prometheus text format)."""
+    if not metrics.METRICS_ENABLED:
+        return jsonify({"error": "metrics disabled"}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 # === Proxies ===
+@app.route('/proxy/book')
+def proxy_book():
+    """Resolver + details in één call, getrimd en gecachet (met ETag)."""
+    ppn = (request.args.get('ppn') or '').strip()
+    if not ppn:
+        return jsonify({"error": "missing ppn"}), 400
+
+    prefetch.record_access(ppn)
+    detail = oba_details.get_book_detail(ppn)
+    if detail is None:
+        return jsonify({"error": "not found"}), 404
+
+    body = json.dumps(detail, ensure_ascii=False, sort_keys=True)
+    etag = '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={int(oba_details.DETAIL_CACHE.default_ttl)}",
+    }
+    if request.headers.get("If-None-Match") == etag:
+        return "", 304, headers
+
+    return app.response_class(body, mimetype="application/json", headers=headers)
+
+
 @app.route('/proxy/resolver')
 def proxy_resolver():
     ppn = request.args.get('ppn')
     url = (
-        f'https://zoeken.oba.nl/api/v1/resolver/ppn/'
+        f'{OBA_API_BASE}/resolver/ppn/'
         f'?id={ppn}&authorization={OBA_API_KEY}'
     )
-    r = requests.get(url, timeout=15)
+    r = http_client.get("oba", url)
     return r.content, r.status_code, r.headers.items()
 
 
@@ -124,11 +221,11 @@ def proxy_details():
         return "Missing item_id", 400
 
     url = (
-        f'https://zoeken.oba.nl/api/v1/details/'
+        f'{OBA_API_BASE}/details/'
         f'?id=|oba-catalogus|{item_id}'
         f'&authorization={OBA_API_KEY}&output=json'
     )
-    r = requests.get(url, timeout=15)
+    r = http_client.get("oba", url)
     return r.content, r.status_code, r.headers.items()
 
 
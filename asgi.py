@@ -0,0 +1,216 @@
+# asgi.py
+"""
+ASGI-entry: de gespreksroutes en /proxy/book draaien volledig async
+(AsyncOpenAI + httpx), zodat één worker veel gelijktijdige beurten kan
+bedienen terwijl er op OpenAI/Typesense/OBA gewacht wordt. Alle andere
+routes (pagina's, statics, beheer, oude proxies) gaan ongewijzigd naar de
+Flask-app, via een WSGI-adapter met een eigen threadpool
+(a2wsgi, ASGI_FLASK_THREADS threads per worker).
+
+Starten: uvicorn asgi:app --workers 2
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+from app import app as flask_app, logger
+from services import (
+    async_conversations_client,
+    async_http,
+    async_oba_helpers,
+    cassette,
+    metrics,
+    oba_details,
+    prefetch,
+)
+from services.oba_helpers import make_envelope
+
+# Niet asgiref's WsgiToAsgi: die draait elke request op één gedeelde executor-thread
+# en faalt onder gelijktijdige keep-alive verbindingen ("would deadlock")
+ASGI_FLASK_THREADS = int(os.getenv("ASGI_FLASK_THREADS", "10"))
+_flask = WSGIMiddleware(flask_app, workers=ASGI_FLASK_THREADS)
+
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+# === Helpers ===
+async def _read_json(receive) -> Dict[str, Any]:
+    body = b""
+    while True:
+        msg = await receive()
+        body += msg.get("body", b"")
+        if not msg.get("more_body"):
+            break
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _header(scope, name: bytes) -> str:
+    for k, v in scope.get("headers", []):
+        if k == name:
+            return v.decode("latin-1")
+    return ""
+
+
+async def _send(send: Send, status: int, body: bytes = b"",
+                content_type: str = "application/json",
+                headers: Optional[Dict[str, str]] = None) -> None:
+    raw = [(b"content-type", content_type.encode())]
+    raw += [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    await send({"type": "http.response.start", "status": status, "headers": raw})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send: Send, status: int, data: Any, headers: Optional[Dict[str, str]] = None) -> None:
+    with metrics.span("serialize", route="json"):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    await _send(send, status, body, headers=headers)
+
+
+def _sse_event(name: str, data: Any) -> bytes:
+    with metrics.span("serialize", route="sse"):
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+# === Routes ===
+async def start_thread(scope, receive, send: Send) -> int:
+    await _send_json(send, 200, {"thread_id": await async_conversations_client.create_conversation()})
+    return 200
+
+
+async def _turn(scope, send: Send, cid: str, user_text: str, stream: bool) -> int:
+    if not stream:
+        out = await async_conversations_client.ask_with_tools(cid, user_text)
+        await _send_json(send, 200, out)
+        return 200
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+    try:
+        async for name, data in async_conversations_client.run_turn(cid, user_text, stream=True):
+            await send({"type": "http.response.body", "body": _sse_event(name, data), "more_body": True})
+    except Exception:
+        logger.exception("stream_error")
+        err = make_envelope("text", message="internal server error", thread_id=cid)
+        await send({"type": "http.response.body", "body": _sse_event("error", err), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+    return 200
+
+
+def _wants_stream(scope, data: Dict[str, Any]) -> bool:
+    return bool(data.get("stream")) or "text/event-stream" in _header(scope, b"accept")
+
+
+async def send_message(scope, receive, send: Send) -> int:
+    data = await _read_json(receive)
+    return await _turn(scope, send, data.get("thread_id"), data.get("user_input", ""), _wants_stream(scope, data))
+
+
+async def apply_filters(scope, receive, send: Send) -> int:
+    data = await _read_json(receive)
+    filters = (data.get("filter_values") or "").strip()
+    return await _turn(scope, send, data.get("thread_id"), f"[FILTER] {filters}", _wants_stream(scope, data))
+
+
+async def proxy_book(scope, receive, send: Send) -> int:
+    """Async /proxy/book: zelfde caches, ETag en Cache-Control als de Flask-route."""
+    qs = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    ppn = (qs.get("ppn", [""])[0]).strip()
+    if not ppn:
+        await _send_json(send, 400, {"error": "missing ppn"})
+        return 400
+
+    prefetch.record_access(ppn)
+    detail = await async_oba_helpers.get_book_detail(ppn)
+    if detail is None:
+        await _send_json(send, 404, {"error": "not found"})
+        return 404
+
+    body = json.dumps(detail, ensure_ascii=False, sort_keys=True)
+    etag = '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={int(oba_details.DETAIL_CACHE.default_ttl)}",
+    }
+    if _header(scope, b"if-none-match") == etag:
+        await _send(send, 304, headers=headers)
+        return 304
+
+    await _send(send, 200, body.encode("utf-8"), headers=headers)
+    return 200
+
+
+ROUTES = {
+    ("POST", "/start_thread"): start_thread,
+    ("POST", "/send_message"): send_message,
+    ("POST", "/apply_filters"): apply_filters,
+    ("GET", "/proxy/book"): proxy_book,
+}
+
+
+# === App ===
+async def _lifespan(receive, send: Send) -> None:
+    while True:
+        msg = await receive()
+        if msg["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif msg["type"] == "lifespan.shutdown":
+            await async_http.aclose_all()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def _capturing(receive, body: bytearray):
+    """receive-wrapper die de requestbody bewaart voor de cassette."""
+    async def wrapped() -> Dict[str, Any]:
+        msg = await receive()
+        body.extend(msg.get("body", b""))
+        return msg
+    return wrapped
+
+
+async def app(scope, receive, send: Send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    handler = ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if handler is None:
+        await _flask(scope, receive, send)
+        return
+
+    body = bytearray()
+    if cassette.RECORDING:
+        receive = _capturing(receive, body)
+
+    t0 = time.time()
+    try:
+        status = await handler(scope, receive, send)
+    except Exception:
+        logger.exception("unhandled_error")
+        await _send_json(send, 500, {"error": "internal server error"})
+        status = 500
+    dur = time.time() - t0
+    logger.info(
+        f"http {scope['method']} {scope['path']} "
+        f"status={status} dur_ms={int(dur * 1000)} async=1"
+    )
+    metrics.observe("request", dur, route=scope["path"], status=status)
+    metrics.inc("http_requests", route=scope["path"], method=scope["method"], status=status)
+    if cassette.RECORDING:
+        cassette.record_inbound(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"), bytes(body))
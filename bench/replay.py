@@ -0,0 +1,166 @@
+# bench/replay.py
+"""
+Speel een opgenomen cassette (CASSETTE_MODE=record) opnieuw af als load test.
+
+De app draait met CASSETTE_MODE=replay: alle upstream-calls (OpenAI,
+Typesense, OBA API) komen uit de cassette, met de opgenomen timing of
+zonder vertraging (`--timing none`). De inkomende requests uit de cassette
+worden per gesprek (thread_id) gegroepeerd en als sessies opnieuw
+verstuurd; elk gesprek krijgt een verse /start_thread. Proxyrequests
+vormen samen één extra sessie.
+
+    python -m bench.replay cassette.jsonl.gz
+    python -m bench.replay cassette.jsonl.gz --speed 0 --timing none --concurrency 32
+    python -m bench.replay cassette.jsonl.gz --server asgi --json replay.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from bench.run import (
+    Recorder,
+    _call,
+    _free_port,
+    print_report,
+    scrape,
+    stage_breakdown,
+    start_app,
+    stop_app,
+    summarize,
+)
+from services.cassette import read_cassette
+
+_NAMES = {
+    "/send_message": "send_message",
+    "/apply_filters": "apply_filters",
+    "/proxy/book": "proxy_book",
+    "/proxy/resolver": "proxy_resolver",
+    "/proxy/details": "proxy_details",
+}
+
+
+def load_sessions(path: str) -> Tuple[Dict[str, str], List[List[Dict[str, Any]]]]:
+    """(header-env, sessies): inkomende requests per thread_id, in opnamevolgorde."""
+    env: Dict[str, str] = {}
+    threads: Dict[str, List[Dict[str, Any]]] = {}
+    proxies: List[Dict[str, Any]] = []
+    for entry in read_cassette(path):
+        if entry.get("kind") == "header":
+            env = entry.get("env") or {}
+            continue
+        if entry.get("up") != "inbound" or entry["path"] == "/start_thread":
+            continue
+        if entry["path"].startswith("/proxy/"):
+            proxies.append(entry)
+            continue
+        try:
+            tid = json.loads(entry.get("body") or "{}").get("thread_id")
+        except ValueError:
+            tid = None
+        if tid:
+            threads.setdefault(tid, []).append(entry)
+    sessions = list(threads.values()) + ([proxies] if proxies else [])
+    sessions.sort(key=lambda s: s[0].get("t", 0.0))
+    return env, sessions
+
+
+def _wait_until(t0: float, at: float, speed: float) -> None:
+    if speed <= 0:
+        return
+    wait = t0 + at / speed - time.perf_counter()
+    if wait > 0:
+        time.sleep(wait)
+
+
+def replay_session(base: str, rec: Recorder, entries: List[Dict[str, Any]], t0: float, origin: float,
+                   speed: float) -> None:
+    tid: Optional[str] = None
+    for entry in entries:
+        _wait_until(t0, entry.get("t", 0.0) - origin, speed)
+        path = entry["path"]
+        url = f"{base}{path}" + (f"?{entry['query']}" if entry.get("query") else "")
+        if path.startswith("/proxy/"):
+            _call(rec, _NAMES[path], entry["method"], url)
+            continue
+        if tid is None:
+            r = _call(rec, "start_thread", "POST", f"{base}/start_thread")
+            if r is None or r.status_code != 200:
+                return
+            tid = r.json()["thread_id"]
+        try:
+            data = json.loads(entry.get("body") or "{}")
+        except ValueError:
+            data = {}
+        data["thread_id"] = tid
+        stream = bool(data.get("stream"))
+        headers = {"Accept": "text/event-stream"} if stream else {}
+        name = _NAMES.get(path, path) + ("(sse)" if stream else "")
+        _call(rec, name, entry["method"], url, json=data, headers=headers)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Speel een cassette af tegen de app (upstreams uit de cassette).")
+    ap.add_argument("cassette")
+    ap.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--concurrency", type=int, default=16, help="max. gelijktijdige sessies")
+    ap.add_argument("--speed", type=float, default=1.0,
+                    help="tempo t.o.v. de opname (2 = twee keer zo snel, 0 = zonder pauzes)")
+    ap.add_argument("--timing", choices=("original", "none"), default="original",
+                    help="upstream-antwoorden met opgenomen latency of direct")
+    ap.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE")
+    ap.add_argument("--json")
+    ap.add_argument("--baseline")
+    args = ap.parse_args()
+
+    header_env, sessions = load_sessions(args.cassette)
+    if not sessions:
+        raise SystemExit("geen inkomende requests in de cassette (opgenomen met CASSETTE_MODE=record?)")
+    env = {
+        **os.environ,
+        "SECRET_KEY": "replay", "OBA_API_KEY": "replay", "OPENAI_API_KEY": "sk-replay",
+        "TYPESENSE_API_KEY": "replay", "LOG_LEVEL": "WARNING",
+        **header_env,
+        "CASSETTE_MODE": "replay",
+        "CASSETTE_PATH": os.path.abspath(args.cassette),
+        "CASSETTE_TIMING": args.timing,
+        **dict(kv.split("=", 1) for kv in args.app_env),
+    }
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = start_app(args.server, port, env, args.workers)
+    origin = sessions[0][0].get("t", 0.0)
+    rec = Recorder()
+    try:
+        before = scrape(base)
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(lambda s: replay_session(base, rec, s, t0, origin, args.speed), sessions))
+        wall = time.perf_counter() - t0
+        after = scrape(base)
+    finally:
+        stop_app(proc)
+
+    result = {
+        "config": {
+            "server": args.server, "workers": args.workers, "concurrency": args.concurrency,
+            "cassette": args.cassette, "speed": args.speed, "timing": args.timing, "app_env": args.app_env,
+        },
+        "summary": summarize(rec, wall, len(sessions)),
+        "stages": stage_breakdown(before, after),
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+# bench/run.py
+"""
+End-to-end benchmark tegen lokale stub-upstreams (zie bench/stubs.py).
+
+Start de stubs, start de app (Flask of ASGI) als subprocess met de stubs als
+upstreams en laat `--concurrency` virtuele gebruikers sessies draaien:
+    /start_thread → /send_message → /apply_filters → /proxy/book
+    (+ /proxy/resolver en /proxy/details)
+Het rapport geeft per endpoint p50/p95/p99, de doorvoer, en per stage de
+breakdown uit /metrics (verschil tussen begin en eind van de meting).
+Daarna volgt een keep-alive check: `--concurrency` verbindingen die elk
+`--keepalive` requests achter elkaar naar Flask-routes sturen (onder ASGI via
+de WSGI-adapter); elke mislukte request telt als fout en geeft exitcode 1.
+
+    python -m bench.run --sessions 200 --concurrency 16
+    python -m bench.run --server asgi --json bench_output.json
+    python -m bench.run --baseline bench_output.json --app-env INTENT_ROUTER=0
+"""
+import argparse
+import json
+import os
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from bench.stubs import add_latency_args, latencies_from, start_stubs, stop_stubs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Invoer per sessie (gewogen): modelgekozen tools, router-paden en tekst
+MESSAGES: List[Tuple[str, int]] = [
+    ("boeken over de Tweede Wereldoorlog voor jongeren", 4),
+    ("spannende thrillers die zich in Amsterdam afspelen", 3),
+    ("zijn er workshops voor kinderen deze week?", 3),
+    ("voorlezen voor peuters in Osdorp", 2),
+    ("hoe word ik lid van de bibliotheek?", 2),
+    ("wat kost een boete als ik te laat ben?", 1),
+    ('"Het diner"', 2),
+    ("boeken van Annie M.G. Schmidt", 2),
+    ("hallo!", 1),
+    ("help", 1),
+]
+# Flask-routes (ook onder ASGI: die gaan via de WSGI-adapter)
+KEEPALIVE_PATHS = ["/metrics", "/", "/proxy/resolver?ppn=bench-1", "/proxy/details?item_id=bench-1"]
+FILTERS = {
+    "collection": "Indeling: fictie vanaf 12 jaar||Taal: nl",
+    "agenda": "Leeftijd: 4-12||Wanneer: c_nextweek",
+}
+
+_METRIC = re.compile(r'^oba_stage_duration_seconds_(bucket|sum|count)\{(.*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# --- App starten ---
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(server: str, port: int, env: Dict[str, str], workers: int) -> subprocess.Popen:
+    if server == "asgi":
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--with-threads"]
+    # stderr naar een logbestand: een volle pipe zou de app laten blokkeren
+    log = tempfile.NamedTemporaryFile(prefix="bench-app-", suffix=".log", delete=False)
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    log.close()
+    proc.log_path = log.name  # type: ignore[attr-defined]
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            with open(log.name, encoding="utf-8", errors="replace") as f:
+                raise RuntimeError("app gestopt tijdens het starten:\n" + f.read()[-2000:])
+        try:
+            if requests.get(f"{base}/metrics", timeout=1).status_code in (200, 404):
+                return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("app niet bereikbaar binnen 30 s")
+
+
+def stop_app(proc: subprocess.Popen) -> None:
+    """Netjes stoppen (SIGINT), zodat atexit-hooks zoals de cassette-writer lopen."""
+    proc.send_signal(signal.SIGINT)
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+    log_path = getattr(proc, "log_path", None)
+    if log_path:
+        print(f"app-log: {log_path}", flush=True)
+
+
+# --- Metrics ---
+def scrape(base: str) -> Dict[Tuple[Tuple[str, str], ...], Dict[str, Any]]:
+    """Histogrammen uit /metrics: labels (zonder le) → {count, sum, buckets}."""
+    try:
+        text = requests.get(f"{base}/metrics", timeout=5).text
+    except requests.RequestException:
+        return {}
+    out: Dict[Tuple[Tuple[str, str], ...], Dict[str, Any]] = {}
+    for line in text.splitlines():
+        m = _METRIC.match(line)
+        if not m:
+            continue
+        labels = dict(_LABEL.findall(m.group(2)))
+        le = labels.pop("le", None)
+        key = tuple(sorted(labels.items()))
+        h = out.setdefault(key, {"count": 0.0, "sum": 0.0, "buckets": {}})
+        if m.group(1) == "bucket":
+            h["buckets"][le] = float(m.group(3))
+        else:
+            h[m.group(1)] = float(m.group(3))
+    return out
+
+
+def _bucket_quantile(buckets: Dict[str, float], q: float) -> Optional[float]:
+    total = buckets.get("+Inf", 0.0)
+    if not total:
+        return None
+    for le, c in sorted(((float(k), v) for k, v in buckets.items() if k != "+Inf")):
+        if c >= q * total:
+            return le
+    return float("inf")
+
+
+def stage_breakdown(before: Dict, after: Dict) -> List[Dict[str, Any]]:
+    rows = []
+    for key, h in after.items():
+        b = before.get(key, {"count": 0.0, "sum": 0.0, "buckets": {}})
+        count = h["count"] - b["count"]
+        if count <= 0:
+            continue
+        buckets = {le: c - b["buckets"].get(le, 0.0) for le, c in h["buckets"].items()}
+        p95 = _bucket_quantile(buckets, 0.95)
+        rows.append({
+            "labels": dict(key),
+            "count": int(count),
+            "mean_ms": round((h["sum"] - b["sum"]) / count * 1000, 1),
+            "p95_le_ms": None if p95 is None else (p95 * 1000 if p95 != float("inf") else "inf"),
+        })
+    rows.sort(key=lambda r: (r["labels"].get("stage", ""), -r["count"]))
+    return rows
+
+
+# --- Load ---
+class Recorder:
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = _local.session = requests.Session()
+    return s
+
+
+def _call(rec: Recorder, name: str, method: str, url: str, **kw: Any) -> Optional[requests.Response]:
+    t0 = time.perf_counter()
+    try:
+        r = _session().request(method, url, timeout=120, **kw)
+        _ = r.content
+    except requests.RequestException:
+        rec.add(name, time.perf_counter() - t0, False)
+        return None
+    rec.add(name, time.perf_counter() - t0, r.status_code < 400 or r.status_code == 404)
+    return r
+
+
+def _envelope(r: Optional[requests.Response], stream: bool) -> Dict[str, Any]:
+    if r is None:
+        return {}
+    if not stream:
+        try:
+            return r.json()
+        except ValueError:
+            return {}
+    # Laatste "done"-event uit de SSE-body
+    done = {}
+    for block in r.text.split("\n\n"):
+        if block.startswith("event: done"):
+            done = json.loads(block.split("data: ", 1)[1])
+    return done
+
+
+def run_session(base: str, rec: Recorder, rng: random.Random, stream: bool) -> None:
+    r = _call(rec, "start_thread", "POST", f"{base}/start_thread")
+    if r is None or r.status_code != 200:
+        return
+    tid = r.json()["thread_id"]
+    texts, weights = zip(*MESSAGES)
+    text = rng.choices(texts, weights)[0]
+    headers = {"Accept": "text/event-stream"} if stream else {}
+    name = "send_message(sse)" if stream else "send_message"
+    env = _envelope(_call(rec, name, "POST", f"{base}/send_message",
+                          json={"thread_id": tid, "user_input": text, "stream": stream}, headers=headers), stream)
+    resp = env.get("response") or {}
+    if resp.get("type") in FILTERS:
+        _call(rec, "apply_filters", "POST", f"{base}/apply_filters",
+              json={"thread_id": tid, "filter_values": FILTERS[resp["type"]]})
+    ppns = [it.get("ppn") for it in resp.get("results") or [] if isinstance(it, dict) and it.get("ppn")]
+    if ppns:
+        _call(rec, "proxy_book", "GET", f"{base}/proxy/book", params={"ppn": rng.choice(ppns[:5])})
+        _call(rec, "proxy_resolver", "GET", f"{base}/proxy/resolver", params={"ppn": ppns[-1]})
+        _call(rec, "proxy_details", "GET", f"{base}/proxy/details", params={"item_id": ppns[-1]})
+
+
+def keepalive_check(base: str, connections: int, per_connection: int) -> Dict[str, Any]:
+    """`connections` gelijktijdige keep-alive verbindingen met elk `per_connection` Flask-requests."""
+    def one(i: int) -> List[str]:
+        errors = []
+        with requests.Session() as s:
+            for n in range(per_connection):
+                path = KEEPALIVE_PATHS[(i + n) % len(KEEPALIVE_PATHS)]
+                try:
+                    r = s.get(f"{base}{path}", timeout=30)
+                    if r.status_code >= 500:
+                        errors.append(f"{path}: {r.status_code}")
+                except requests.RequestException as e:
+                    errors.append(f"{path}: {type(e).__name__}")
+        return errors
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        errors = [e for errs in pool.map(one, range(connections)) for e in errs]
+    return {"requests": connections * per_connection, "errors": len(errors), "examples": errors[:5]}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentiel."""
+    s = sorted(values)
+    return s[max(0, min(len(s) - 1, int(round(q * len(s) + 0.5)) - 1))]
+
+
+def summarize(rec: Recorder, wall_s: float, sessions: int) -> Dict[str, Any]:
+    endpoints = {}
+    total = 0
+    for name, vals in sorted(rec.samples.items()):
+        total += len(vals)
+        endpoints[name] = {
+            "count": len(vals),
+            "errors": rec.errors.get(name, 0),
+            "p50_ms": round(percentile(vals, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(vals, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(vals, 0.99) * 1000, 1),
+            "mean_ms": round(sum(vals) / len(vals) * 1000, 1),
+        }
+    return {
+        "wall_s": round(wall_s, 2),
+        "sessions": sessions,
+        "requests": total,
+        "rps": round(total / wall_s, 2) if wall_s else 0.0,
+        "sessions_per_s": round(sessions / wall_s, 2) if wall_s else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+# --- Rapport ---
+def _delta(now: float, then: Optional[float]) -> str:
+    if not then:
+        return ""
+    return f" ({(now - then) / then * 100:+.0f}%)"
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    base_ep = (baseline or {}).get("summary", {}).get("endpoints", {})
+    s = result["summary"]
+    print(f"\n== {result['config']['server']} c={result['config']['concurrency']} "
+          f"sessions={s['sessions']} wall={s['wall_s']}s")
+    print(f"throughput: {s['rps']} req/s{_delta(s['rps'], (baseline or {}).get('summary', {}).get('rps'))}, "
+          f"{s['sessions_per_s']} sessies/s")
+    print(f"{'endpoint':<20}{'n':>6}{'err':>5}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, e in s["endpoints"].items():
+        b = base_ep.get(name, {})
+        print(f"{name:<20}{e['count']:>6}{e['errors']:>5}{e['p50_ms']:>10}{e['p95_ms']:>10}{e['p99_ms']:>10}"
+              f"{_delta(e['p95_ms'], b.get('p95_ms'))}")
+    if result["stages"]:
+        print("\nstages (uit /metrics):")
+        print(f"{'stage':<12}{'labels':<58}{'n':>6}{'mean':>9}{'p95≤':>9}")
+        for row in result["stages"]:
+            labels = dict(row["labels"])
+            stage = labels.pop("stage", "")
+            tags = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+            print(f"{stage:<12}{tags[:57]:<58}{row['count']:>6}{row['mean_ms']:>9}{str(row['p95_le_ms']):>9}")
+    print()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Offline end-to-end benchmark met stub-upstreams.")
+    ap.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn-workers (alleen asgi; /metrics is per worker)")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--sessions", type=int, default=100)
+    ap.add_argument("--warmup", type=int, default=10, help="sessies vóór de meting (vullen pools/caches)")
+    ap.add_argument("--stream", type=float, default=0.5, help="aandeel sessies met SSE-streaming")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--keepalive", type=int, default=50,
+                    help="requests per verbinding in de keep-alive check (0 = overslaan)")
+    ap.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="extra env voor de app")
+    ap.add_argument("--json", help="schrijf het resultaat als JSON (bijv. als baseline)")
+    ap.add_argument("--baseline", help="eerder JSON-resultaat om mee te vergelijken")
+    add_latency_args(ap)
+    args = ap.parse_args()
+
+    servers, stub_env = start_stubs(latencies_from(args), args.fixtures, token_delay_ms=args.token_delay_ms)
+    env = {
+        **os.environ,
+        "SECRET_KEY": "bench", "OBA_API_KEY": "bench", "OPENAI_API_KEY": "sk-bench",
+        "TYPESENSE_API_KEY": "bench", "LOG_LEVEL": "WARNING",
+        **stub_env,
+        **dict(kv.split("=", 1) for kv in args.app_env),
+    }
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = start_app(args.server, port, env, args.workers)
+    rng = random.Random(args.seed)
+    rec = Recorder()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(lambda i: run_session(base, Recorder(), random.Random(i), False), range(args.warmup)))
+            before = scrape(base)
+            seeds = [rng.random() for _ in range(args.sessions)]
+            t0 = time.perf_counter()
+            list(pool.map(lambda s: run_session(base, rec, random.Random(s), s < args.stream), seeds))
+            wall = time.perf_counter() - t0
+        after = scrape(base)
+        keepalive = keepalive_check(base, args.concurrency, args.keepalive) if args.keepalive else None
+    finally:
+        stop_app(proc)
+        stop_stubs(servers)
+
+    result = {
+        "config": {
+            "server": args.server, "workers": args.workers, "concurrency": args.concurrency,
+            "sessions": args.sessions, "stream": args.stream, "app_env": args.app_env,
+            "latency": latencies_from(args), "token_delay_ms": args.token_delay_ms,
+        },
+        "summary": summarize(rec, wall, args.sessions),
+        "stages": stage_breakdown(before, after),
+        "upstream_requests": {name: srv.requests for name, srv in servers.items()},
+        "keepalive": keepalive,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    print("upstream requests:", result["upstream_requests"])
+    if keepalive:
+        print(f"keep-alive check: {keepalive['errors']}/{keepalive['requests']} fouten", keepalive["examples"] or "")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if keepalive and keepalive["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+# bench/stubs.py
+"""
+Lokale stand-ins voor OpenAI, Typesense en de OBA API, zodat de app zonder
+live upstreams gebenchmarkt kan worden.
+
+Elke upstream is een eigen ThreadingHTTPServer met een eigen
+latency-verdeling (zie `Latency`) en antwoordt met opgenomen payloads uit
+bench/fixtures/:
+- responses.json   welke toolcall bij welke invoer hoort, ack-tekst, usage
+- typesense.json   multi_search-hits per rol (books / faq / events)
+- agenda.xml       OBA agenda-XML (search-API)
+- resolver.xml     resolver-XML ({ppn} wordt ingevuld)
+- details.json     details-JSON ({item_id}/{title} worden ingevuld)
+
+Los starten (print de env-variabelen voor de app):
+    python -m bench.stubs --openai-latency lognormal:900,0.4
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class Latency:
+    """
+    Latency-verdeling uit een spec (milliseconden):
+      "0" | "fixed:40" | "uniform:20,80" | "normal:200,50" | "lognormal:800,0.4"
+    Bij lognormal is het eerste getal de mediaan en het tweede sigma.
+    """
+
+    def __init__(self, spec: str) -> None:
+        self.spec = spec
+        kind, _, args = (spec or "0").partition(":")
+        nums = [float(x) for x in args.split(",") if x.strip()]
+        if kind.replace(".", "", 1).isdigit():
+            kind, nums = "fixed", [float(kind)]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"onbekende latency-spec: {spec!r}")
+        self.kind, self.nums = kind, nums
+        self._rng = random.Random(hashlib.sha1(spec.encode()).hexdigest())
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """Eén trekking in seconden (nooit negatief)."""
+        with self._lock:
+            if self.kind == "fixed":
+                ms = self.nums[0]
+            elif self.kind == "uniform":
+                ms = self._rng.uniform(self.nums[0], self.nums[1])
+            elif self.kind == "normal":
+                ms = self._rng.gauss(self.nums[0], self.nums[1])
+            else:
+                ms = self.nums[0] * math.exp(self._rng.gauss(0, self.nums[1]))
+        return max(0.0, ms) / 1000
+
+    def sleep(self) -> None:
+        s = self.sample()
+        if s:
+            time.sleep(s)
+
+
+def load_fixtures(path: str = FIXTURES_DIR) -> Dict[str, Any]:
+    def read(name: str) -> str:
+        with open(os.path.join(path, name), encoding="utf-8") as f:
+            return f.read()
+
+    return {
+        "responses": json.loads(read("responses.json")),
+        "typesense": json.loads(read("typesense.json")),
+        "agenda": read("agenda.xml").encode("utf-8"),
+        "resolver": read("resolver.xml"),
+        "details": read("details.json"),
+    }
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr: Tuple[str, int], handler: type, latency: Latency, fixtures: Dict[str, Any]) -> None:
+        super().__init__(addr, handler)
+        self.latency = latency
+        self.fixtures = fixtures
+        self.requests = 0
+        self._count_lock = threading.Lock()
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # Client (de app) die halverwege afhaakt, bijv. bij het stoppen: geen traceback
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def count(self) -> None:
+        with self._count_lock:
+            self.requests += 1
+
+    @property
+    def base(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubServer
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        pass
+
+    def _json_body(self) -> Dict[str, Any]:
+        n = int(self.headers.get("Content-Length") or 0)
+        if not n:
+            return {}
+        try:
+            return json.loads(self.rfile.read(n) or b"{}")
+        except ValueError:
+            return {}
+
+    def _reply(self, status: int, body: bytes = b"", ctype: str = "application/json",
+               headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _json(self, data: Any, status: int = 200) -> None:
+        self._reply(status, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def _begin(self) -> Tuple[str, Dict[str, List[str]]]:
+        self.server.count()
+        parts = urlsplit(self.path)
+        return parts.path, parse_qs(parts.query)
+
+
+# --- OpenAI (Responses + Conversations) ---
+def _user_text(inp: Any) -> str:
+    if isinstance(inp, str):
+        return inp
+    text = ""
+    for item in inp or []:
+        if not isinstance(item, dict) or item.get("role") != "user":
+            continue
+        content = item.get("content")
+        if isinstance(content, list):
+            content = " ".join(c.get("text", "") for c in content if isinstance(c, dict))
+        text = content or ""
+    return text
+
+
+def _fill(value: Any, text: str) -> Any:
+    if isinstance(value, str):
+        return value.replace("{text}", text)
+    if isinstance(value, dict):
+        return {k: _fill(v, text) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, text) for v in value]
+    return value
+
+
+class OpenAIHandler(_Handler):
+    token_delay = 0.0
+
+    def do_POST(self) -> None:
+        path, _ = self._begin()
+        body = self._json_body()
+        if path == "/v1/conversations":
+            self.server.latency.sleep()
+            return self._json({"id": f"conv_{uuid.uuid4().hex}", "object": "conversation",
+                               "created_at": int(time.time()), "metadata": {}})
+        if re.fullmatch(r"/v1/conversations/[^/]+/items", path):
+            self.server.latency.sleep()
+            return self._json({"object": "list", "data": [], "first_id": None, "last_id": None, "has_more": False})
+        if path == "/v1/responses":
+            return self._responses(body)
+        if path == "/v1/embeddings":
+            self.server.latency.sleep()
+            inputs = body.get("input")
+            inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+            return self._json({"object": "list", "model": body.get("model"), "data": [
+                {"object": "embedding", "index": i, "embedding": _fake_embedding(t)} for i, t in enumerate(inputs)
+            ]})
+        self._json({"error": {"message": f"stub: onbekend pad {path}"}}, 404)
+
+    def _output(self, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        cfg = self.server.fixtures["responses"]
+        text = _user_text(body.get("input"))
+        if body.get("tools") and not re.search(cfg.get("text_match") or r"(?!)", text, re.I):
+            for rule in cfg["tool_calls"]:
+                if re.search(rule["match"], text, re.I):
+                    return [{
+                        "type": "function_call", "id": f"fc_{uuid.uuid4().hex[:16]}",
+                        "call_id": f"call_{uuid.uuid4().hex[:16]}", "name": rule["name"],
+                        "arguments": json.dumps(_fill(rule["arguments"], text), ensure_ascii=False),
+                        "status": "completed",
+                    }]
+        reply = cfg["text_reply"] if body.get("tools") else cfg["ack_text"]
+        return [{
+            "type": "message", "id": f"msg_{uuid.uuid4().hex[:16]}", "role": "assistant", "status": "completed",
+            "content": [{"type": "output_text", "text": reply, "annotations": []}],
+        }]
+
+    def _response(self, body: Dict[str, Any], output: List[Dict[str, Any]]) -> Dict[str, Any]:
+        u = self.server.fixtures["responses"].get("usage") or {}
+        return {
+            "id": f"resp_{uuid.uuid4().hex}", "object": "response", "created_at": int(time.time()),
+            "status": "completed", "model": body.get("model"), "output": output,
+            "parallel_tool_calls": True, "tool_choice": body.get("tool_choice", "auto"), "tools": [],
+            "usage": {
+                "input_tokens": u.get("input_tokens", 0),
+                "input_tokens_details": {"cached_tokens": u.get("cached_tokens", 0)},
+                "output_tokens": u.get("output_tokens", 0),
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": u.get("input_tokens", 0) + u.get("output_tokens", 0),
+            },
+        }
+
+    def _responses(self, body: Dict[str, Any]) -> None:
+        output = self._output(body)
+        resp = self._response(body, output)
+        # De latency-trekking is de time-to-first-token; tekst volgt per woord
+        self.server.latency.sleep()
+        if not body.get("stream"):
+            return self._json(resp)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        seq = 0
+
+        def event(data: Dict[str, Any]) -> None:
+            nonlocal seq
+            data["sequence_number"] = seq
+            seq += 1
+            chunk = f"event: {data['type']}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+
+        event({"type": "response.created", "response": {**resp, "status": "in_progress", "output": []}})
+        for idx, item in enumerate(output):
+            event({"type": "response.output_item.added", "output_index": idx, "item": item})
+            if item["type"] == "message":
+                words = item["content"][0]["text"].split(" ")
+                for i, w in enumerate(words):
+                    if self.token_delay:
+                        time.sleep(self.token_delay)
+                    event({"type": "response.output_text.delta", "item_id": item["id"], "output_index": idx,
+                           "content_index": 0, "delta": w if i == 0 else " " + w, "logprobs": []})
+            event({"type": "response.output_item.done", "output_index": idx, "item": item})
+        event({"type": "response.completed", "response": resp})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def _fake_embedding(text: str, dim: int = 64) -> List[float]:
+    """Deterministische pseudo-embedding (zelfde tekst → zelfde vector)."""
+    rng = random.Random(hashlib.sha1((text or "").encode("utf-8")).hexdigest())
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+# --- Typesense ---
+def _role(collection: str) -> str:
+    from services.oba_config import COLLECTION_EVENTS, COLLECTION_FAQ
+    if collection == COLLECTION_FAQ:
+        return "faq"
+    if collection == COLLECTION_EVENTS:
+        return "events"
+    return "books"
+
+
+class TypesenseHandler(_Handler):
+    def do_POST(self) -> None:
+        path, _ = self._begin()
+        body = self._json_body()
+        self.server.latency.sleep()
+        if not path.endswith("/multi_search"):
+            return self._json({"message": "Not Found"}, 404)
+        results = []
+        for search in body.get("searches") or []:
+            docs = self.server.fixtures["typesense"].get(_role(search.get("collection") or ""), [])
+            hits = [{"document": d} for d in docs[: int(search.get("per_page") or 10)]]
+            results.append({"found": len(docs), "hits": hits, "page": 1})
+        self._json({"results": results})
+
+    def do_GET(self) -> None:
+        path, _ = self._begin()
+        self.server.latency.sleep()
+        m = re.fullmatch(r".*/collections/([^/]+)/documents/export", path)
+        if not m:
+            return self._json({"message": "Not Found"}, 404)
+        docs = self.server.fixtures["typesense"].get(_role(m.group(1)), [])
+        body = "\n".join(json.dumps(d, ensure_ascii=False) for d in docs).encode("utf-8")
+        self._reply(200, body, "text/plain")
+
+
+# --- OBA API ---
+class OBAHandler(_Handler):
+    def do_GET(self) -> None:
+        path, qs = self._begin()
+        self.server.latency.sleep()
+        fx = self.server.fixtures
+        if path.endswith("/search/"):
+            return self._reply(200, fx["agenda"], "application/xml")
+        if path.endswith("/resolver/ppn/"):
+            ppn = (qs.get("id") or [""])[0]
+            return self._reply(200, fx["resolver"].replace("{ppn}", ppn).encode("utf-8"), "application/xml")
+        if path.endswith("/details/"):
+            item_id = (qs.get("id") or [""])[0].rsplit("|", 1)[-1]
+            body = fx["details"].replace("{item_id}", item_id).replace("{title}", f"Titel {item_id}").encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._reply(304, headers={"ETag": etag})
+            return self._reply(200, body, headers={"ETag": etag})
+        self._reply(404, b"not found", "text/plain")
+
+
+# --- Start/stop ---
+def start_stubs(
+    latencies: Dict[str, str],
+    fixtures_dir: str = FIXTURES_DIR,
+    host: str = "127.0.0.1",
+    token_delay_ms: float = 0.0,
+) -> Tuple[Dict[str, StubServer], Dict[str, str]]:
+    """Start de drie stubs op vrije poorten; geeft (servers, env voor de app)."""
+    fixtures = load_fixtures(fixtures_dir)
+    handler = type("OpenAIHandler", (OpenAIHandler,), {"token_delay": token_delay_ms / 1000})
+    servers = {
+        "openai": StubServer((host, 0), handler, Latency(latencies.get("openai", "0")), fixtures),
+        "typesense": StubServer((host, 0), TypesenseHandler, Latency(latencies.get("typesense", "0")), fixtures),
+        "oba": StubServer((host, 0), OBAHandler, Latency(latencies.get("oba", "0")), fixtures),
+    }
+    for name, srv in servers.items():
+        threading.Thread(target=srv.serve_forever, name=f"stub-{name}", daemon=True).start()
+    env = {
+        "OPENAI_BASE_URL": f"{servers['openai'].base}/v1",
+        "TYPESENSE_API_URL": f"{servers['typesense'].base}/multi_search",
+        "OBA_API_BASE": f"{servers['oba'].base}/api/v1",
+    }
+    return servers, env
+
+
+def stop_stubs(servers: Dict[str, StubServer]) -> None:
+    for srv in servers.values():
+        srv.shutdown()
+        srv.server_close()
+
+
+def add_latency_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--openai-latency", default="lognormal:700,0.35", help="latency-spec OpenAI (ms)")
+    ap.add_argument("--typesense-latency", default="lognormal:60,0.3", help="latency-spec Typesense (ms)")
+    ap.add_argument("--oba-latency", default="lognormal:250,0.4", help="latency-spec OBA API (ms)")
+    ap.add_argument("--token-delay-ms", type=float, default=15.0, help="pauze per gestreamd woord")
+    ap.add_argument("--fixtures", default=FIXTURES_DIR, help="map met opgenomen payloads")
+
+
+def latencies_from(args: argparse.Namespace) -> Dict[str, str]:
+    return {"openai": args.openai_latency, "typesense": args.typesense_latency, "oba": args.oba_latency}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Start stub-upstreams voor OpenAI, Typesense en OBA.")
+    add_latency_args(ap)
+    args = ap.parse_args()
+    servers, env = start_stubs(latencies_from(args), args.fixtures, token_delay_ms=args.token_delay_ms)
+    for k, v in env.items():
+        print(f"{k}={v}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop_stubs(servers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# services/ack.py
+"""
+Ack-strategie per beurt.
+
+Alleen FAQ-antwoorden hebben een modelgegenereerde ack nodig (parafrase van
+de FAQ-resultaten). Voor collectie-, agenda- en tekstbeurten toont de
+frontend de lijst; daar volstaat een vaste tekst in de taal van de gebruiker
+en kan de tweede modelcall vervallen.
+"""
+import re
+from typing import Any, Dict
+
+from services.conversations_config import ACK_MODE, ACK_TEMPLATES
+
+# Een paar veelvoorkomende functiewoorden per taal; genoeg voor korte zoekvragen
+_LANG_HINTS = {
+    "en": {"the", "and", "about", "books", "book", "for", "with", "what", "is", "are", "by", "i", "want", "children"},
+    "de": {"der", "die", "das", "und", "über", "bücher", "buch", "für", "mit", "ich", "ist", "von", "kinder"},
+    "fr": {"le", "la", "les", "et", "sur", "livres", "livre", "pour", "avec", "je", "est", "des", "enfants"},
+    "es": {"el", "los", "las", "y", "sobre", "libros", "libro", "para", "con", "yo", "es", "niños"},
+    "tr": {"ve", "bir", "için", "kitap", "kitaplar", "hakkında", "ile", "ben", "çocuklar"},
+    "nl": {"de", "het", "een", "en", "over", "boeken", "boek", "voor", "met", "ik", "is", "van", "kinderen", "wat"},
+}
+
+
+def detect_language(text: str) -> str:
+    """Goedkope taalgok op basis van functiewoorden; standaard Nederlands."""
+    words = set(re.findall(r"\w+", (text or "").lower()))
+    best, score = "nl", 0
+    for lang, hints in _LANG_HINTS.items():
+        n = len(words & hints)
+        if n > score:
+            best, score = lang, n
+    return best
+
+
+def needs_model_ack(envelope: Dict[str, Any]) -> bool:
+    """True als deze beurt een FASTMODEL-ack verdient (FAQ), False voor een vaste tekst."""
+    if ACK_MODE == "model":
+        return True
+    return (envelope.get("response") or {}).get("type") == "faq"
+
+
+def template_ack(user_text: str) -> str:
+    return ACK_TEMPLATES.get(detect_language(user_text), ACK_TEMPLATES["nl"])
+
+
+def fallback_ack(envelope: Dict[str, Any], user_text: str) -> str:
+    """Tekst als de model-ack niet (op tijd) kan: bij FAQ het beste antwoord zelf, anders de vaste tekst."""
+    resp = envelope.get("response") or {}
+    if resp.get("type") == "faq":
+        for item in resp.get("results") or []:
+            answer = (item or {}).get("antwoord")
+            if isinstance(answer, str) and answer.strip():
+                return answer.strip()
+    return template_ack(user_text)
@@ -0,0 +1,367 @@
+# services/agenda_index.py
+"""
+Lokale agenda-index voor scenario A.
+
+Een achtergrondjob laadt periodiek alle evenementen uit de OBA API in een
+compacte in-process snapshot:
+- events:  lijst met compacte agenda-items (volgorde zoals de API ze geeft)
+- facets:  per facet (waar/leeftijd/type_activiteit/wanneer) een inverted
+           index  waarde → set(event-posities)
+- dates:   optionele date-range index (gesorteerd op startdatum) voor
+           `wanneer`, alleen als AGENDA_START_PATH is ingesteld. De
+           datumbereiken in `wanneer_range` benaderen de API-semantiek; zonder
+           datumpaden loopt `wanneer` via facet-queries zoals de andere facetten
+
+Een sync is één bulk-fetch van alle evenementen. De facet-postings kosten
+geen extra calls als dat kan:
+- uit de records zelf, voor facetten met een pad in AGENDA_FACET_PATHS
+  ("leeftijd=custom/…/leeftijd;waar=custom/gebeurtenis/locatienaam"); dat
+  pad moet de waarde in facetnotatie bevatten, want alleen exact gelijke
+  waarden tellen (een gevraagde waarde die niet in de records staat gaat
+  via een facet-query)
+- anders met dezelfde facet-queries als de live API-route (exact dezelfde
+  semantiek), maar alleen voor waarden die nog niet geïndexeerd zijn, of
+  als de set evenementen is veranderd of de postings ouder zijn dan
+  AGENDA_FACET_REFRESH. Bij een ongewijzigde agenda blijft het bij de
+  bulk-fetch.
+
+`query_url(api_url)` beantwoordt een scenario-A facet-URL uit de snapshot.
+Geeft None terug als de snapshot ontbreekt, verouderd of onvolledig is
+(de bulk-fetch stopte bij AGENDA_SYNC_MAX_PAGES) of een facetwaarde niet
+kent; de caller valt dan terug op de live API. Facetwaarden die live
+gevraagd worden, worden bij de volgende sync meegenomen.
+"""
+import bisect
+import calendar
+import os
+import threading
+import time
+import urllib.parse as ul
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from services import http_client
+from services.oba_config import OBA_API_BASE
+from services.oba_helpers import AGENDA_MAX_ITEMS, OBA_API_KEY, parse_agenda_item, agenda_field
+
+AGENDA_INDEX_ENABLED = os.getenv("AGENDA_INDEX", "0") == "1"
+SYNC_INTERVAL = float(os.getenv("AGENDA_SYNC_INTERVAL", "900"))
+MAX_STALENESS = float(os.getenv("AGENDA_MAX_STALENESS", "1800"))
+SYNC_PAGESIZE = int(os.getenv("AGENDA_SYNC_PAGESIZE", "100"))
+SYNC_MAX_PAGES = int(os.getenv("AGENDA_SYNC_MAX_PAGES", "20"))
+# Facet-postings via facet-queries hooguit zo oud (vangt gewijzigde evenementen)
+FACET_REFRESH = float(os.getenv("AGENDA_FACET_REFRESH", "21600"))
+
+BASE_API = f"{OBA_API_BASE}/search/?q=table:evenementen&refine=true"
+
+# Paden (vanaf <result>) voor id en start/einddatum van een evenement; zonder
+# START_PATH geen datumindex (bv. "custom/gebeurtenis/datum/start")
+ID_PATH = os.getenv("AGENDA_ID_PATH", "id")
+START_PATH = os.getenv("AGENDA_START_PATH", "")
+END_PATH = os.getenv("AGENDA_END_PATH", "")
+# Facetten die de records zelf bevatten: facet → pad (vanaf <result>)
+FACET_PATHS: Dict[str, str] = dict(
+    part.split("=", 1) for part in os.getenv("AGENDA_FACET_PATHS", "").split(";") if "=" in part
+)
+
+# Startset facetwaarden (zelfde notatie als _build_agenda_query); live gevraagde
+# waarden worden hier tijdens runtime aan toegevoegd.
+SEED_FACETS: Dict[str, List[str]] = {
+    "leeftijd": ["0-3", "4-12", "13-18", "19-26", "27-66", "67+"],
+    "type_activiteit": [
+        "boekenclub", "expositie", "film", "hulp-ontwikkeling", "muziek", "ontmoeten",
+        "overig", "speciaal", "talk", "theater", "voorlezen", "workshop",
+    ],
+    "wanneer": [
+        "a_today", "a_tomorrow", "b_upcomingweekend", "c_nextweek", "d_thismonth",
+        "e_nextmonth", "f_next3month", "g_thisyear", "h_nextyear",
+    ],
+    "waar": [],
+}
+
+
+class _Snapshot:
+    def __init__(self) -> None:
+        self.events: List[Dict[str, Any]] = []
+        self.facets: Dict[str, Dict[str, Set[int]]] = {}
+        self.dates: List[Tuple[date, date, int]] = []
+        self.synced_at = 0.0
+        self.synced_on: Optional[date] = None
+        self.complete = True  # False: bulk-fetch afgekapt, snapshot niet gezaghebbend
+        # Voor de volgende sync: postings per event-id, en wanneer ze via facet-queries zijn opgehaald
+        self.event_ids: Set[str] = set()
+        self.postings: Dict[str, Dict[str, Set[str]]] = {}
+        self.queried_at: Dict[Tuple[str, str], float] = {}
+
+
+_SNAPSHOT: Optional[_Snapshot] = None
+_WANTED: Dict[str, Set[str]] = {k: set(v) for k, v in SEED_FACETS.items()}
+_LOCK = threading.Lock()
+_THREAD: Optional[threading.Thread] = None
+
+STATS = {"hits": 0, "fallbacks": 0, "syncs": 0, "sync_errors": 0, "last_sync_ms": 0,
+         "facet_queries": 0, "facet_reused": 0, "truncated": 0}
+
+
+# --- URL's & facets ---
+def _facet_param(facet: str, value: str) -> str:
+    return f"facet={facet}%28{ul.quote_plus(value)}%29"
+
+
+def parse_facets(api_url: str) -> Optional[Dict[str, str]]:
+    """Haal {facet: waarde} uit een scenario-A API-URL; None bij iets onverwachts."""
+    parts = ul.urlsplit(api_url)
+    out: Dict[str, str] = {}
+    for k, v in ul.parse_qsl(parts.query, keep_blank_values=True):
+        if k in ("q", "refine", "authorization"):
+            continue
+        if k != "facet" or not v.endswith(")") or "(" not in v:
+            return None
+        name, val = v[:-1].split("(", 1)
+        out[name] = val
+    return out
+
+
+def _parse_date(txt: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(txt.strip()[:10])
+    except ValueError:
+        return None
+
+
+def wanneer_range(value: str, today: date) -> Optional[Tuple[date, date]]:
+    """
+    Vertaal een `wanneer`-facetwaarde naar een datumbereik (inclusief).
+    Een benadering van de API (bv. weekend en "komende week"); alleen in
+    gebruik met een datumindex (AGENDA_START_PATH).
+    """
+    def month_end(d: date) -> date:
+        return d.replace(day=calendar.monthrange(d.year, d.month)[1])
+
+    if value == "a_today":
+        return today, today
+    if value == "a_tomorrow":
+        t = today + timedelta(days=1)
+        return t, t
+    if value == "b_upcomingweekend":
+        if today.weekday() == 6:
+            return today, today
+        sat = today + timedelta(days=(5 - today.weekday()) % 7)
+        return sat, sat + timedelta(days=1)
+    if value == "c_nextweek":
+        mon = today + timedelta(days=7 - today.weekday())
+        return mon, mon + timedelta(days=6)
+    if value == "d_thismonth":
+        return today, month_end(today)
+    if value == "e_nextmonth":
+        first = month_end(today) + timedelta(days=1)
+        return first, month_end(first)
+    if value == "f_next3month":
+        return today, today + timedelta(days=92)
+    if value == "g_thisyear":
+        return today, date(today.year, 12, 31)
+    if value == "h_nextyear":
+        return date(today.year + 1, 1, 1), date(today.year + 1, 12, 31)
+    return None
+
+
+# --- Sync ---
+Record = Tuple[str, Dict[str, Any], Optional[date], Optional[date], Dict[str, List[str]]]
+
+
+def _fetch_pages(url: str) -> Tuple[List[Record], bool]:
+    """
+    Haal alle pagina's van een agenda-URL op als (id, item, start, end,
+    facetwaarden uit FACET_PATHS), plus of dat alles was: False als de laatste
+    toegestane pagina (SYNC_MAX_PAGES) nog vol was.
+    """
+    out = []
+    for page in range(1, SYNC_MAX_PAGES + 1):
+        full = f"{url}&pagesize={SYNC_PAGESIZE}&page={page}&authorization={OBA_API_KEY}"
+        r = http_client.get("oba", full, stream=True)
+        try:
+            if r.status_code != 200:
+                raise RuntimeError(f"status={r.status_code}")
+            r.raw.decode_content = True
+            n = 0
+            for _, elem in ET.iterparse(r.raw, events=("end",)):
+                if elem.tag != "result":
+                    continue
+                item = parse_agenda_item(elem)
+                eid = agenda_field(elem, ID_PATH) or item["link"] or item["title"]
+                start = _parse_date(agenda_field(elem, START_PATH)) if START_PATH else None
+                end = (_parse_date(agenda_field(elem, END_PATH)) if END_PATH else None) or start
+                values = {
+                    facet: [(v.text or "").strip() for v in elem.findall(path) if (v.text or "").strip()]
+                    for facet, path in FACET_PATHS.items()
+                }
+                out.append((eid, item, start, end, values))
+                elem.clear()
+                n += 1
+        finally:
+            r.close()
+        if n < SYNC_PAGESIZE:
+            return out, True
+    return out, False
+
+
+def _postings(snap: _Snapshot, prev: Optional[_Snapshot], wanted: Dict[str, Set[str]],
+              records: Dict[str, Dict[str, List[str]]], now: float) -> None:
+    """Vul snap.postings: uit de records, uit de vorige snapshot of met een facet-query."""
+    unchanged = prev is not None and prev.event_ids == snap.event_ids
+    for facet, values in wanted.items():
+        index = snap.postings.setdefault(facet, {})
+        if facet in FACET_PATHS:
+            for eid, rec in records.items():
+                for value in rec.get(facet, ()):
+                    index.setdefault(value, set()).add(eid)
+            # Waarden die niet (in facetnotatie) in de records staan: via een facet-query
+            values = values - set(index)
+        for value in values:
+            queried = prev.queried_at.get((facet, value)) if prev else None
+            if unchanged and queried is not None and now - queried <= FACET_REFRESH:
+                index[value] = prev.postings[facet][value]
+                snap.queried_at[(facet, value)] = queried
+                STATS["facet_reused"] += 1
+                continue
+            url = f"{BASE_API}&{_facet_param(facet, value)}"
+            rows, complete = _fetch_pages(url)
+            STATS["facet_queries"] += 1
+            if not complete:
+                # Afgekapte postings niet indexeren: deze waarde blijft via de live API lopen
+                STATS["truncated"] += 1
+                continue
+            index[value] = {eid for eid, *_ in rows if eid in snap.event_ids}
+            snap.queried_at[(facet, value)] = now
+
+
+def sync() -> None:
+    """Bouw een nieuwe snapshot en wissel hem atomisch in."""
+    global _SNAPSHOT
+    t0 = time.time()
+    snap = _Snapshot()
+    pos: Dict[str, int] = {}
+    records: Dict[str, Dict[str, List[str]]] = {}
+
+    try:
+        rows, snap.complete = _fetch_pages(BASE_API)
+        for eid, item, start, end, values in rows:
+            if eid in pos:
+                continue
+            pos[eid] = len(snap.events)
+            records[eid] = values
+            snap.events.append(item)
+            if start:
+                snap.dates.append((start, end or start, pos[eid]))
+        snap.dates.sort()
+        snap.event_ids = set(pos)
+
+        with _LOCK:
+            wanted = {k: set(v) for k, v in _WANTED.items()}
+        if snap.dates:
+            # Datums aanwezig → `wanneer` via de date-range index
+            wanted.pop("wanneer", None)
+
+        if snap.complete:
+            _postings(snap, _SNAPSHOT, wanted, records, t0)
+        else:
+            # Meer evenementen dan SYNC_MAX_PAGES * SYNC_PAGESIZE: queries blijven live
+            STATS["truncated"] += 1
+            print(
+                f"[AGENDA][index] sync truncated at {len(rows)} events "
+                f"(AGENDA_SYNC_MAX_PAGES={SYNC_MAX_PAGES}); serving from the live API",
+                flush=True,
+            )
+        snap.facets = {
+            facet: {value: {pos[eid] for eid in eids} for value, eids in index.items()}
+            for facet, index in snap.postings.items()
+        }
+    except Exception as e:
+        STATS["sync_errors"] += 1
+        print(f"[AGENDA][index] sync error: {e}", flush=True)
+        return
+
+    snap.synced_at = time.time()
+    snap.synced_on = date.today()
+    _SNAPSHOT = snap
+    STATS["syncs"] += 1
+    STATS["last_sync_ms"] = int((time.time() - t0) * 1000)
+    print(
+        f"[AGENDA][index] synced events={len(snap.events)} "
+        f"dated={len(snap.dates)} dur_ms={STATS['last_sync_ms']}",
+        flush=True,
+    )
+
+
+def _loop() -> None:
+    while True:
+        sync()
+        time.sleep(SYNC_INTERVAL)
+
+
+def ensure_started() -> None:
+    """Start de sync-thread één keer (alleen als AGENDA_INDEX=1)."""
+    global _THREAD
+    if not AGENDA_INDEX_ENABLED or _THREAD is not None:
+        return
+    with _LOCK:
+        if _THREAD is None:
+            _THREAD = threading.Thread(target=_loop, name="agenda-index-sync", daemon=True)
+            _THREAD.start()
+
+
+# --- Query ---
+def _is_fresh(snap: Optional[_Snapshot]) -> bool:
+    return bool(snap) and (time.time() - snap.synced_at) <= MAX_STALENESS
+
+
+def _dates_in(snap: _Snapshot, lo: date, hi: date) -> Set[int]:
+    # Alles dat start vóór het eind van het bereik en eindigt ná het begin
+    cut = bisect.bisect_right(snap.dates, (hi, date.max, len(snap.events)))
+    return {p for start, end, p in snap.dates[:cut] if end >= lo}
+
+
+def query_url(api_url: str, max_items: int = AGENDA_MAX_ITEMS) -> Optional[List[Dict[str, Any]]]:
+    """Beantwoord een scenario-A API-URL lokaal; None = val terug op de live API."""
+    if not AGENDA_INDEX_ENABLED:
+        return None
+    ensure_started()
+
+    facets = parse_facets(api_url)
+    snap = _SNAPSHOT
+    if facets is None or not _is_fresh(snap) or not snap.complete:
+        STATS["fallbacks"] += 1
+        return None
+
+    hit: Optional[Set[int]] = None
+    for facet, value in facets.items():
+        if facet == "wanneer" and snap.dates:
+            rng = wanneer_range(value, date.today())
+            ids = _dates_in(snap, *rng) if rng else None
+        elif facet == "wanneer" and snap.synced_on != date.today():
+            # Relatieve datums ("vandaag") zijn na middernacht niet meer geldig
+            ids = None
+        else:
+            ids = snap.facets.get(facet, {}).get(value)
+
+        if ids is None:
+            with _LOCK:
+                _WANTED.setdefault(facet, set()).add(value)
+            STATS["fallbacks"] += 1
+            return None
+        hit = set(ids) if hit is None else hit & ids
+
+    positions = sorted(hit) if hit is not None else range(len(snap.events))
+    STATS["hits"] += 1
+    return [dict(snap.events[p]) for p in list(positions)[:max_items]]
+
+
+def stats() -> Dict[str, Any]:
+    snap = _SNAPSHOT
+    return {
+        **STATS,
+        "enabled": AGENDA_INDEX_ENABLED,
+        "events": len(snap.events) if snap else 0,
+        "age_s": int(time.time() - snap.synced_at) if snap else None,
+    }
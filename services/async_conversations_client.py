@@ -0,0 +1,266 @@
+# services/async_conversations_client.py
+"""
+Async pipeline voor een gespreksbeurt (AsyncOpenAI + httpx), voor de
+ASGI-entry (asgi.py). Zelfde events en envelopes als
+conversations_client.run_turn(); alle niet-I/O-logica (tools, envelopes,
+ack-strategie, state store) wordt daaruit hergebruikt.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from openai import AsyncOpenAI
+
+from services import (
+    ack,
+    agenda_index,
+    async_oba_helpers,
+    cassette,
+    compaction,
+    conversation_commits,
+    conversation_pool,
+    conversations_client as cc,
+    deadline,
+    decision_cache,
+    intent_router,
+    metrics,
+    speculative,
+    state_store,
+    tool_executor,
+    usage,
+)
+from services.conversations_config import FASTMODEL, HELP_MSG, MODEL, NO_RESULTS_MSG, SYSTEM
+from services.oba_config import TOOLS
+from services.oba_helpers import make_envelope
+
+logger = logging.getLogger("oba_app")
+
+aclient = AsyncOpenAI(**cassette.openai_kwargs(asynchronous=True))
+abudget_client = aclient.with_options(max_retries=0)
+
+
+async def create_conversation() -> str:
+    if conversation_pool.POOL_MODE == "off":
+        return (await aclient.conversations.create()).id
+    # Pool/lazy kan bij een lege pool synchroon aanmaken (of de vultaak starten): niet op de event loop
+    return await asyncio.to_thread(conversation_pool.start_thread, cc.client)
+
+
+async def _fetch(kind: Optional[str], result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if kind == "faq":
+        return await async_oba_helpers.typesense_search_faq(result)
+    if kind == "books":
+        items = await speculative.atake(result)
+        if items is not None:
+            return items
+    if kind in ("books", "events"):
+        return await async_oba_helpers.typesense_search_any(result)
+    if kind == "agenda_api":
+        ag_results = agenda_index.query_url(result["API"])
+        if ag_results is None:
+            ag_results = await async_oba_helpers.fetch_agenda_results(result["API"])
+        return ag_results
+    return []
+
+
+async def _handle_tool_result(name: str, result: Dict[str, Any], conversation_id: str) -> Dict[str, Any]:
+    kind = cc.fetch_kind(name, result)
+    with metrics.span("fetch", tool=name, kind=kind, collection=cc.fetch_collection(kind, result)):
+        fetched = await _fetch(kind, result) if kind else []
+    return cc.build_handled(name, result, kind, fetched, conversation_id)
+
+
+async def _model_call(
+    stream: bool, emit_text: bool, stage: str, out: Dict[str, Any], **kwargs: Any
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Async tegenhanger van cc._model_call; de response komt in out["resp"]."""
+    t0 = time.monotonic()
+    budget = deadline.timeout()
+    api = aclient if budget is None else abudget_client
+    if budget is not None:
+        kwargs["timeout"] = budget
+    if not stream:
+        out["resp"] = await api.responses.create(**kwargs)
+        usage.record(stage, out["resp"], time.monotonic() - t0)
+        return
+
+    final = None
+    ttft = None
+    events = await api.responses.create(stream=True, **kwargs)
+    try:
+        async for ev in events:
+            if ttft is None:
+                ttft = time.monotonic() - t0
+            etype = getattr(ev, "type", "")
+            if etype == "response.output_item.added":
+                item = getattr(ev, "item", None)
+                if getattr(item, "type", "") in ("function_call", "tool_call"):
+                    yield "tool", {"name": getattr(item, "name", None)}
+            elif etype == "response.output_text.delta" and emit_text:
+                yield "delta", {"text": ev.delta}
+            elif etype == "response.completed":
+                final = ev.response
+            if final is None and deadline.expired():
+                raise deadline.DeadlineExceeded(f"{stage} stream")
+    finally:
+        await events.close()
+    if final is None:
+        raise RuntimeError("Responses stream ended without response.completed")
+    usage.record(stage, final, time.monotonic() - t0, ttft)
+    out["resp"] = final
+
+
+async def run_turn(
+    conversation_id: str,
+    user_text: str,
+    stream: bool = False,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Async variant van conversations_client.run_turn() (zelfde events en deadline)."""
+    owns_deadline = deadline.start()
+    try:
+        async for ev in _turn(conversation_id, user_text, stream):
+            yield ev
+    finally:
+        speculative.settle()
+        if owns_deadline:
+            deadline.clear()
+
+
+async def _turn(conversation_id: str, user_text: str, stream: bool) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    cid = await asyncio.to_thread(compaction.active_conversation, cc.client, conversation_id)
+
+    # 1) Eenduidige invoer lokaal routeren (of een gecachte toolkeuze voor een
+    #    bekende openingsvraag), anders de eerste beurt met tools
+    state = await asyncio.to_thread(state_store.get, conversation_id)
+    routed = intent_router.route(user_text, state.get("last_tool")) or decision_cache.lookup(user_text, state)
+    lead: List[Dict[str, Any]] = []
+    resp = None
+    tool_calls: List[Tuple[str, Optional[str], Dict[str, Any]]] = []
+    if not routed and deadline.affords(deadline.MODEL_MIN_BUDGET):
+        # State store kan een gedeelde backend (SQLite/Mongo) zijn: niet op de loop
+        turn_input, ctx_sent = await asyncio.to_thread(cc._turn_input, conversation_id, user_text)
+        speculative.astart(user_text)
+        first: Dict[str, Any] = {}
+        try:
+            async for ev in _model_call(
+                stream,
+                True,
+                "tools",
+                first,
+                model=MODEL,
+                instructions=SYSTEM,
+                conversation=cid,
+                input=turn_input,
+                tools=TOOLS,
+                tool_choice="auto",
+            ):
+                yield ev
+        except cc.MODEL_TIMEOUTS as e:
+            logger.warning(f"[DEADLINE] tools call: {e!r}")
+        else:
+            resp = first["resp"]
+            if ctx_sent:
+                await asyncio.to_thread(state_store.update, conversation_id, ctx_sent=ctx_sent)
+            tool_calls = cc._tool_calls(resp)
+            if tool_calls:
+                decision_cache.store(user_text, state, tool_calls)
+    if not routed and resp is None:
+        deadline.degrade("heuristic_search")
+        routed = intent_router.heuristic(user_text)
+        if routed is None:
+            yield "done", make_envelope("text", results=[], url=None, message=NO_RESULTS_MSG, thread_id=conversation_id)
+            return
+    if routed:
+        lead = intent_router.synthetic_items(user_text, routed)
+        if routed["tool"] is None:
+            envelope = make_envelope("text", results=[], url=None, message=HELP_MSG, thread_id=conversation_id)
+            if stream:
+                yield "delta", {"text": HELP_MSG}
+            await asyncio.to_thread(
+                conversation_commits.add_items, cc.client, cid, lead + [conversation_commits.assistant_message(HELP_MSG)]
+            )
+            await asyncio.to_thread(compaction.record_turn, cc.client, conversation_id, cid, None)
+            yield "done", envelope
+            return
+        if stream:
+            yield "tool", {"name": routed["tool"]}
+        tool_calls = [(routed["tool"], routed["call_id"], routed["args"])]
+
+    # 2) Geen tools → gewoon tekst
+    if not tool_calls:
+        await asyncio.to_thread(compaction.record_turn, cc.client, conversation_id, cid, resp)
+        yield "done", make_envelope(
+            "text",
+            results=[],
+            url=None,
+            message=(resp.output_text or "").strip(),
+            thread_id=conversation_id,
+        )
+        return
+
+    # 3) Toolcalls: parameters bouwen, fetches gelijktijdig
+    specs = cc.build_specs(tool_calls)
+    outputs: List[Dict[str, str]] = [cc._output_item(result) for _, result in specs]
+    handled = await tool_executor.arun(
+        specs,
+        lambda name, result: _handle_tool_result(name, result, conversation_id),
+    )
+    if handled is None:
+        envelope = make_envelope("text", results=[], url=None, message=NO_RESULTS_MSG, thread_id=conversation_id)
+    else:
+        envelope = handled["envelope"]
+        await asyncio.to_thread(cc.remember_turn, conversation_id, handled, tool_calls)
+
+    yield "results", envelope
+
+    # 4) Ack (zonder budget of bij een time-out: tekst zonder model)
+    needs_ack_text = not (envelope.get("response") or {}).get("message")
+    ack_text: Optional[str] = None
+    if ack.needs_model_ack(envelope):
+        if deadline.affords(deadline.ACK_MIN_BUDGET):
+            ack_out: Dict[str, Any] = {}
+            try:
+                async for ev in _model_call(
+                    stream,
+                    needs_ack_text,
+                    "ack",
+                    ack_out,
+                    model=FASTMODEL,
+                    instructions=cc._ack_instruction(envelope, user_text),
+                    conversation=cid,
+                    tools=[],
+                    input=lead + outputs,
+                    tool_choice="none",
+                ):
+                    yield ev
+                ack_text = (getattr(ack_out["resp"], "output_text", "") or "").strip()
+            except cc.MODEL_TIMEOUTS as e:
+                logger.warning(f"[DEADLINE] ack call: {e!r}")
+        if ack_text is None:
+            deadline.degrade("skip_ack")
+    if ack_text is None:
+        ack_text = ack.fallback_ack(envelope, user_text)
+        if stream and needs_ack_text:
+            yield "delta", {"text": ack_text}
+        shown = envelope["response"].get("message") or ack_text
+        await asyncio.to_thread(
+            conversation_commits.add_items,
+            cc.client,
+            cid,
+            lead + outputs + [conversation_commits.assistant_message(shown)],
+        )
+
+    if needs_ack_text:
+        envelope["response"]["message"] = ack_text or envelope["response"].get("message")
+
+    await asyncio.to_thread(compaction.record_turn, cc.client, conversation_id, cid, resp)
+    yield "done", envelope
+
+
+async def ask_with_tools(conversation_id: str, user_text: str) -> Dict[str, Any]:
+    envelope: Optional[Dict[str, Any]] = None
+    async for event, data in run_turn(conversation_id, user_text):
+        if event == "done":
+            envelope = data
+    return envelope or make_envelope("text", results=[], url=None, message="Klaar.", thread_id=conversation_id)
@@ -0,0 +1,78 @@
+# services/async_http.py
+"""
+Async tegenhanger van http_client: één `httpx.AsyncClient` per upstream,
+met hetzelfde pool-, timeout- en retrybeleid (UPSTREAMS). Clients horen bij
+de event loop van het ASGI-proces; `aclose_all()` bij afsluiten.
+"""
+import asyncio
+from typing import Any, Dict
+
+import httpx
+
+from services import cassette, deadline
+from services.http_client import UPSTREAMS
+
+_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+
+_RETRY_STATUS = (502, 503, 504)
+
+
+def get_client(upstream: str) -> httpx.AsyncClient:
+    c = _CLIENTS.get(upstream)
+    if c is None:
+        policy = UPSTREAMS[upstream]
+        connect, read = policy["timeout"]
+        limits = httpx.Limits(
+            max_connections=policy["pool_connections"] * policy["pool_maxsize"],
+            max_keepalive_connections=policy["pool_maxsize"],
+        )
+        c = httpx.AsyncClient(
+            # transport-retries dekken alleen verbindingsfouten; 5xx hieronder
+            transport=cassette.wrap_async_transport(
+                httpx.AsyncHTTPTransport(retries=policy["retries"], limits=limits), upstream
+            ),
+            timeout=httpx.Timeout(read, connect=connect),
+        )
+        _CLIENTS[upstream] = c
+    return c
+
+
+async def request(upstream: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """Request via de pool van `upstream`, met retry/backoff op 502/503/504."""
+    policy = UPSTREAMS[upstream]
+    client = get_client(upstream)
+    attempt = 0
+    while True:
+        r = await client.request(method, url, **with_deadline(upstream, kwargs))
+        backoff = policy["backoff"] * (2 ** attempt)
+        if (
+            r.status_code not in _RETRY_STATUS
+            or attempt >= policy["retries"]
+            or method not in policy["retry_methods"]
+            or not deadline.affords(backoff)
+        ):
+            return r
+        await asyncio.sleep(backoff)
+        attempt += 1
+
+
+def with_deadline(upstream: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """kwargs met een timeout die binnen de deadline van de beurt blijft (zie deadline)."""
+    if "timeout" in kwargs or deadline.remaining() is None:
+        return kwargs
+    connect, read = deadline.http_timeout(UPSTREAMS[upstream]["timeout"])
+    return {**kwargs, "timeout": httpx.Timeout(read, connect=connect)}
+
+
+async def get(upstream: str, url: str, **kwargs: Any) -> httpx.Response:
+    return await request(upstream, "GET", url, **kwargs)
+
+
+async def post(upstream: str, url: str, **kwargs: Any) -> httpx.Response:
+    return await request(upstream, "POST", url, **kwargs)
+
+
+async def aclose_all() -> None:
+    for c in list(_CLIENTS.values()):
+        await c.aclose()
+    _CLIENTS.clear()
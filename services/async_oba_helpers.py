@@ -0,0 +1,164 @@
+# services/async_oba_helpers.py
+"""
+Async varianten van de Typesense-, agenda- en detailfetchers. Profielen,
+parsers en caches worden gedeeld met de synchrone versies.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from services import async_http, deadline, faq_index, metrics, oba_details, typesense_search
+from services.cache import MISS
+from services.oba_helpers import (
+    AGENDA_CACHE,
+    AGENDA_MAX_ITEMS,
+    AgendaStreamParser,
+    agenda_cache_key,
+    logger,
+    stop_partial,
+    with_oba_key,
+)
+
+
+# --- Typesense ---
+async def typesense_search_any(params: Dict[str, Any], collection: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Async typesense_search.search(): zelfde profielen, cache en mapping."""
+    if not typesense_search.TYPESENSE_API_URL or not typesense_search.TYPESENSE_API_KEY:
+        return []
+
+    prepared = typesense_search.prepare(params, collection)
+    if prepared is None:
+        return []
+    profile, entry, key = prepared
+
+    cached = typesense_search.SEARCH_CACHE.get(key)
+    if cached is not MISS:
+        return list(cached)
+
+    try:
+        with metrics.span("upstream", upstream="typesense", collection=entry["collection"]):
+            r = await async_http.post(
+                "typesense",
+                typesense_search.TYPESENSE_API_URL,
+                json={"searches": [entry]},
+                headers=typesense_search.headers(),
+            )
+        if r.status_code != 200:
+            metrics.inc("upstream_errors", upstream="typesense", status=r.status_code)
+            print(f"[TS] Error body: {r.text[:500]}", flush=True)
+            return []
+        out = typesense_search.map_hits(profile, r.json())
+        logger.debug(f"[TS] Collection={entry['collection']} hits={len(out)}")
+        typesense_search.SEARCH_CACHE.set(key, out, profile["ttl"])
+        return list(out)
+    except Exception:
+        return []
+
+
+async def typesense_search_faq(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Lokale FAQ-index; anders (zie faq_index.search) Typesense."""
+    if faq_index.FAQ_EMBED_MODEL:
+        # Query-embedding is een (synchrone) netwerkcall
+        local = await asyncio.to_thread(faq_index.search, params)
+    else:
+        local = faq_index.search(params)
+    if local is not None:
+        return local
+    return await typesense_search_any(params)
+
+
+typesense_search_books = typesense_search_any
+typesense_search_events = typesense_search_any
+
+
+# --- OBA Agenda ---
+async def fetch_agenda_results(api_url: str, max_items: int = AGENDA_MAX_ITEMS) -> List[Dict[str, Any]]:
+    """Async fetch_agenda_results(): streamt de XML en stopt na `max_items`."""
+    if not api_url:
+        return []
+
+    key = agenda_cache_key(api_url, max_items)
+    cached = AGENDA_CACHE.get(key)
+    if cached is not MISS:
+        return list(cached)
+
+    try:
+        logger.debug(f"[AGENDA][fetch] GET {key}")
+        t0 = time.perf_counter()
+        parser = AgendaStreamParser(max_items)
+        client = async_http.get_client("oba")
+        try:
+            async with client.stream("GET", with_oba_key(api_url), **async_http.with_deadline("oba", {})) as r:
+                if r.status_code != 200:
+                    metrics.inc("upstream_errors", upstream="oba", status=r.status_code)
+                    print(f"[AGENDA][fetch] status={r.status_code}", flush=True)
+                    return []
+                complete = True
+                try:
+                    async for chunk in r.aiter_bytes():
+                        if parser.feed(chunk):
+                            complete = False
+                            break
+                        if deadline.expired() and parser.items:
+                            stop_partial(parser)
+                            complete = False
+                            break
+                except Exception:
+                    # Read-timeout halverwege (budget op): geef terug wat er al is
+                    if not parser.items or deadline.remaining() is None:
+                        raise
+                    stop_partial(parser)
+                    complete = False
+                if complete:
+                    parser.close()
+        finally:
+            metrics.observe("xml_parse", parser.parse_s, upstream="oba")
+            metrics.observe("upstream", time.perf_counter() - t0 - parser.parse_s, upstream="oba", collection="agenda")
+        out = parser.items
+        if not parser.truncated:
+            AGENDA_CACHE.set(key, out)
+        return list(out)
+    except Exception as e:
+        print(f"[AGENDA][fetch] request error: {e}", flush=True)
+        return []
+
+
+# --- Boekdetails ---
+async def resolve_item_id(ppn: str) -> Optional[str]:
+    cached = oba_details.RESOLVER_CACHE.get(ppn)
+    if cached is not MISS:
+        return cached
+
+    r = await async_http.get("oba", oba_details.resolver_url(ppn))
+    if r.status_code != 200:
+        print(f"[DETAIL][resolver] ppn={ppn} status={r.status_code}", flush=True)
+        return None
+
+    item_id = oba_details.parse_item_id(r.content)
+    if item_id:
+        oba_details.RESOLVER_CACHE.set(ppn, item_id)
+    return item_id
+
+
+async def fetch_details(item_id: str) -> Optional[Dict[str, Any]]:
+    cached = oba_details.DETAIL_CACHE.get(item_id)
+    if cached is not MISS:
+        return cached
+
+    stale = oba_details.DETAIL_VALIDATORS.get(item_id)
+    r = await async_http.get(
+        "oba",
+        oba_details.details_url(item_id),
+        headers=oba_details.validator_headers(stale),
+    )
+    return oba_details.store_details(item_id, r.status_code, r.headers, r.json, stale)
+
+
+async def get_book_detail(ppn: str) -> Optional[Dict[str, Any]]:
+    item_id = await resolve_item_id(ppn)
+    if not item_id:
+        return None
+    doc = await fetch_details(item_id)
+    if doc is None:
+        return None
+    return {"ppn": ppn, "item_id": item_id, **doc}
@@ -0,0 +1,168 @@
+# services/cache.py
+"""
+Kleine, thread-safe TTL + LRU cache voor in-process gebruik, met
+optionele gedeelde backend (MongoDB) zodat meerdere workers dezelfde
+entries zien.
+
+Sleutels zijn strings van de vorm "<tag>:<rest>"; `invalidate(tag)`
+verwijdert alles onder één tag (bijv. een Typesense-collectie).
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+MISS = object()
+
+
+class MongoBackend:
+    """Gedeelde cache-backend in MongoDB (pymongo is optioneel)."""
+
+    def __init__(self, uri: str, db: str = "nexi", collection: str = "cache"):
+        from pymongo import MongoClient  # optionele dependency
+
+        self._coll = MongoClient(uri, serverSelectionTimeoutMS=2000)[db][collection]
+        # Mongo ruimt verlopen documenten zelf op via de TTL-index
+        self._coll.create_index("exp", expireAfterSeconds=0)
+        self._coll.create_index("tag")
+
+    def get(self, key: str) -> Any:
+        """(waarde, resterende TTL in seconden), of MISS."""
+        now = datetime.now(timezone.utc)
+        doc = self._coll.find_one({"_id": key, "exp": {"$gt": now}})
+        if doc is None:
+            return MISS
+        exp = doc["exp"]
+        if exp.tzinfo is None:
+            # pymongo geeft standaard naïeve UTC-datetimes terug
+            exp = exp.replace(tzinfo=timezone.utc)
+        return doc.get("v"), (exp - now).total_seconds()
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        exp = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        self._coll.replace_one(
+            {"_id": key},
+            {"_id": key, "v": value, "exp": exp, "tag": key.split(":", 1)[0]},
+            upsert=True,
+        )
+
+    def invalidate(self, tag: Optional[str] = None) -> None:
+        self._coll.delete_many({"tag": tag} if tag else {})
+
+
+class TTLCache:
+    """LRU-cache met TTL per entry en hit/miss/eviction-tellers."""
+
+    def __init__(self, name: str, max_items: int = 1024, default_ttl: float = 300,
+                 backend: Optional[Any] = None):
+        self.name = name
+        self.max_items = max_items
+        self.default_ttl = default_ttl
+        self.backend = backend
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_hits = 0
+
+    def get(self, key: str) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                exp, value = entry
+                if exp > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+        if self.backend is not None:
+            try:
+                hit = self.backend.get(key)
+            except Exception as e:
+                print(f"[CACHE][{self.name}] backend get error: {e}", flush=True)
+                hit = MISS
+            if hit is not MISS:
+                # Lokaal niet langer bewaren dan de entry in de backend nog geldig is
+                value, ttl = hit
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                    if ttl > 0:
+                        self._store(key, value, ttl, now)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return MISS
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._store(key, value, ttl, time.monotonic())
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value, ttl)
+            except Exception as e:
+                print(f"[CACHE][{self.name}] backend set error: {e}", flush=True)
+
+    def delete(self, key: str) -> None:
+        """Verwijder één lokale entry (gedeelde backend blijft ongemoeid)."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _store(self, key: str, value: Any, ttl: float, now: float) -> None:
+        self._data[key] = (now + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, tag: Optional[str] = None) -> int:
+        """Verwijder alle entries (of alleen die onder `tag`). Geeft aantal lokale verwijderingen."""
+        with self._lock:
+            if tag is None:
+                n = len(self._data)
+                self._data.clear()
+            else:
+                prefix = f"{tag}:"
+                doomed = [k for k in self._data if k.startswith(prefix)]
+                for k in doomed:
+                    del self._data[k]
+                n = len(doomed)
+        if self.backend is not None:
+            try:
+                self.backend.invalidate(tag)
+            except Exception as e:
+                print(f"[CACHE][{self.name}] backend invalidate error: {e}", flush=True)
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_items": self.max_items,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def make_backend(uri: Optional[str], collection: str) -> Optional[MongoBackend]:
+    """Maak een gedeelde backend als `uri` gezet is; anders (of bij fouten) None."""
+    if not uri:
+        return None
+    try:
+        return MongoBackend(uri, collection=collection)
+    except Exception as e:
+        print(f"[CACHE] shared backend disabled ({collection}): {e}", flush=True)
+        return None
@@ -0,0 +1,475 @@
+# services/cassette.py
+"""
+Record/replay van upstream-verkeer (OpenAI, Typesense, OBA API).
+
+CASSETTE_MODE:
+- record: elke upstream-exchange wordt (na afloop) als één JSON-regel aan
+          CASSETTE_PATH toegevoegd (`.gz` → gzip). Inkomende gespreks- en
+          proxyrequests worden ook vastgelegd, zodat bench/replay.py de
+          sessies later opnieuw kan afspelen.
+- replay: dezelfde exchanges worden uit de cassette geserveerd, zonder
+          netwerk. CASSETTE_TIMING=original wacht zoals de opname
+          (time-to-first-byte, en per chunk bij streams); `none` antwoordt direct.
+- off:    standaard; alle wrappers geven de originele transport terug.
+
+Geheimen komen niet in de cassette: request-headers worden niet bewaard,
+`authorization=`/`api_key=`/`key=` in URL's wordt REDACTED, en de waarden
+van OBA_API_KEY, TYPESENSE_API_KEY en OPENAI_API_KEY worden overal
+vervangen.
+
+Matching bij replay: op methode + URL + body, nadat volatiele ids (conv_…,
+call_…, resp_…, lazy_…) en geheimen zijn gemaskeerd. Lukt dat niet, dan
+op methode + gemaskeerd pad (in opnamevolgorde). Een uitgeputte reeks
+begint opnieuw, zodat een cassette als herhaalbare load test kan dienen.
+"""
+import asyncio
+import atexit
+import functools
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassette.jsonl.gz")
+CASSETTE_TIMING = os.getenv("CASSETTE_TIMING", "original").lower()
+# Chunks die binnen dit aantal ms na elkaar binnenkomen worden samengevoegd
+CASSETTE_CHUNK_MS = float(os.getenv("CASSETTE_CHUNK_MS", "10"))
+
+RECORDING = CASSETTE_MODE == "record"
+REPLAYING = CASSETTE_MODE == "replay"
+
+INBOUND_PATHS = ("/start_thread", "/send_message", "/apply_filters", "/proxy/book", "/proxy/resolver", "/proxy/details")
+_KEEP_HEADERS = ("content-type", "etag", "last-modified", "cache-control")
+_SECRET_PARAM = re.compile(r"\b((?:authorization|api_key|key)=)[^&\s\"']+", re.I)
+_STREAMING = re.compile(r'"stream"\s*:\s*true')
+_VOLATILE = re.compile(r"\b(conv|resp|msg|fc|call_router|call_cache|call|lazy)_[A-Za-z0-9]+")
+
+STATS = {"recorded": 0, "replayed": 0, "loose_matches": 0, "misses": 0, "inbound": 0}
+
+
+# --- Scrubben & sleutels ---
+def _secrets() -> List[str]:
+    vals = (os.getenv(k) or "" for k in ("OBA_API_KEY", "TYPESENSE_API_KEY", "OPENAI_API_KEY"))
+    return [v for v in vals if len(v) >= 6]
+
+
+def scrub(text: str) -> str:
+    text = _SECRET_PARAM.sub(r"\1REDACTED", text)
+    for secret in _secrets():
+        text = text.replace(secret, "REDACTED")
+    return text
+
+
+def _text(data: Any) -> str:
+    if data is None:
+        return ""
+    if isinstance(data, bytes):
+        return data.decode("utf-8", "surrogateescape")
+    return str(data)
+
+
+def _mask(text: str) -> str:
+    return _VOLATILE.sub(lambda m: f"{m.group(1)}_*", scrub(text))
+
+
+def match_keys(method: str, url: str, body: Any) -> Tuple[str, str]:
+    """(exacte sleutel, losse sleutel) voor een request."""
+    masked_url = _mask(url)
+    text = _mask(_text(body))
+    digest = hashlib.sha1(text.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    path = masked_url.split("?", 1)[0]
+    # Een streaming-antwoord mag nooit een gewoon antwoord vervangen (en andersom)
+    loose = f"{method} {path}" + (" stream" if _STREAMING.search(text) else "")
+    return f"{method} {masked_url} {digest}", loose
+
+
+# --- Opnemen ---
+class _Writer:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._t0 = time.time()
+        self._fh: Any = None
+
+    def _open(self) -> Any:
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        opener = gzip.open if self.path.endswith(".gz") else open
+        fh = opener(self.path, "at", encoding="utf-8")
+        if new:
+            fh.write(json.dumps({"kind": "header", "v": 1, "created_at": int(self._t0), "env": _replay_env()}) + "\n")
+        return fh
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        entry["t"] = round(time.time() - self._t0, 4)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._fh is None:
+                self._fh = self._open()
+            self._fh.write(line)
+            self._fh.flush()
+        STATS["recorded"] += 1
+
+    def close(self) -> None:
+        # Bij gzip schrijft pas close() het einde van de stream
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+def _replay_env() -> Dict[str, str]:
+    """Niet-geheime config die bij replay weer nodig is (URL's, collecties)."""
+    keys = ("OPENAI_BASE_URL", "TYPESENSE_API_URL", "OBA_API_BASE", "COLLECTION_BOOKS", "COLLECTION_BOOKS_KN",
+            "COLLECTION_FAQ", "COLLECTION_EVENTS", "MODEL", "FASTMODEL")
+    return {k: scrub(os.environ[k]) for k in keys if os.getenv(k)}
+
+
+_WRITER: Optional[_Writer] = _Writer(CASSETTE_PATH) if RECORDING else None
+if _WRITER is not None:
+    atexit.register(_WRITER.close)
+
+
+class _Recording:
+    """Eén exchange in opname: chunks met hun tijd t.o.v. de start van het request."""
+
+    def __init__(self, upstream: str, method: str, url: str, body: Any, t0: float) -> None:
+        self.entry: Dict[str, Any] = {
+            "up": upstream,
+            "method": method,
+            "url": scrub(url),
+        }
+        self.entry["key"], self.entry["loose"] = match_keys(method, url, body)
+        self.t0 = t0
+        self.chunks: List[List[Any]] = []
+        self._done = False
+
+    def response(self, status: int, headers: Any) -> None:
+        self.entry["status"] = status
+        self.entry["headers"] = {k: scrub(v) for k, v in headers.items() if k.lower() in _KEEP_HEADERS}
+        self.entry["ttfb"] = round(time.perf_counter() - self.t0, 4)
+
+    def add(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        ms = round((time.perf_counter() - self.t0) * 1000, 1)
+        if self.chunks and ms - self.chunks[-1][0] <= CASSETTE_CHUNK_MS:
+            self.chunks[-1][1] += chunk
+        else:
+            self.chunks.append([ms, chunk])
+
+    def finish(self) -> None:
+        if self._done or _WRITER is None:
+            return
+        self._done = True
+        self.entry["dur"] = round(time.perf_counter() - self.t0, 4)
+        if len(self.chunks) <= 1:
+            self.entry["body"] = scrub(_text(self.chunks[0][1])) if self.chunks else ""
+        else:
+            self.entry["chunks"] = [[ms, scrub(_text(c))] for ms, c in self.chunks]
+        _WRITER.write(self.entry)
+
+
+def record_inbound(method: str, path: str, query: str, body: Any) -> None:
+    """Leg een inkomend gespreks-/proxyrequest vast (alleen in record-mode)."""
+    if _WRITER is None or path not in INBOUND_PATHS:
+        return
+    STATS["inbound"] += 1
+    _WRITER.write({"up": "inbound", "method": method, "path": path, "query": scrub(query), "body": scrub(_text(body))})
+
+
+# --- Afspelen ---
+class _Replayer:
+    def __init__(self, path: str) -> None:
+        self.entries: List[Dict[str, Any]] = []
+        self.exact: Dict[str, List[int]] = defaultdict(list)
+        self.loose: Dict[str, List[int]] = defaultdict(list)
+        self.used: set = set()
+        # Per lijst: alles vóór de cursor is al gebruikt (scheelt scannen)
+        self.cursors: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        for entry in read_cassette(path):
+            if entry.get("kind") == "header" or entry.get("up") == "inbound":
+                continue
+            idx = len(self.entries)
+            self.entries.append(entry)
+            self.exact[entry["key"]].append(idx)
+            self.loose[entry["loose"]].append(idx)
+
+    def _take(self, kind: str, key: str) -> Optional[int]:
+        candidates = (self.exact if kind == "exact" else self.loose).get(key) or []
+        i = self.cursors.get((kind, key), 0)
+        while i < len(candidates) and candidates[i] in self.used:
+            i += 1
+        self.cursors[(kind, key)] = i
+        for idx in candidates[i:]:
+            if idx not in self.used:
+                self.used.add(idx)
+                return idx
+        return None
+
+    def match(self, method: str, url: str, body: Any) -> Optional[Dict[str, Any]]:
+        exact, loose = match_keys(method, url, body)
+        with self._lock:
+            idx = self._take("exact", exact)
+            if idx is None:
+                idx = self._take("loose", loose)
+                if idx is not None:
+                    STATS["loose_matches"] += 1
+            if idx is None and self.loose.get(loose):
+                # Reeks uitgeput: opnieuw vanaf het begin (herhaalbare load test)
+                self.used.difference_update(self.loose[loose])
+                self.cursors.clear()
+                idx = self._take("exact", exact)
+                if idx is None:
+                    idx = self._take("loose", loose)
+        if idx is None:
+            STATS["misses"] += 1
+            print(f"[CASSETTE] miss {exact}", flush=True)
+            return None
+        STATS["replayed"] += 1
+        return self.entries[idx]
+
+
+_REPLAYER: Optional[_Replayer] = None
+_REPLAYER_LOCK = threading.Lock()
+
+
+def _replayer() -> _Replayer:
+    global _REPLAYER
+    if _REPLAYER is None:
+        with _REPLAYER_LOCK:
+            if _REPLAYER is None:
+                _REPLAYER = _Replayer(CASSETTE_PATH)
+    return _REPLAYER
+
+
+def read_cassette(path: str) -> Iterator[Dict[str, Any]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as fh:
+        try:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+        except EOFError:
+            # Opname die nog loopt (of hard gestopt is): alles tot de laatste flush
+            return
+
+
+def _chunks(entry: Optional[Dict[str, Any]]) -> List[Tuple[float, bytes]]:
+    if entry is None:
+        return [(0.0, b'{"error": "cassette miss"}')]
+    if "chunks" in entry:
+        return [(ms / 1000, c.encode("utf-8", "surrogateescape")) for ms, c in entry["chunks"]]
+    return [(entry.get("dur", 0.0), entry.get("body", "").encode("utf-8", "surrogateescape"))]
+
+
+def _status(entry: Optional[Dict[str, Any]]) -> int:
+    return entry["status"] if entry else 404
+
+
+def _headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    return dict(entry.get("headers") or {}) if entry else {"content-type": "application/json"}
+
+
+def _ttfb(entry: Optional[Dict[str, Any]]) -> float:
+    return entry.get("ttfb", 0.0) if entry and CASSETTE_TIMING == "original" else 0.0
+
+
+# --- httpx (OpenAI SDK, async_http) ---
+# Nieuwere OpenAI SDK's gebruiken een eigen httpx-fork met dezelfde API; de
+# transportklassen worden daarom per httpx-module gebouwd.
+@functools.lru_cache(maxsize=None)
+def _httpx_layer(hx: Any) -> Tuple[type, type]:
+    class ReplayStream(hx.SyncByteStream):
+        def __init__(self, entry: Optional[Dict[str, Any]], t0: float) -> None:
+            self.chunks, self.t0 = _chunks(entry), t0
+
+        def __iter__(self) -> Iterator[bytes]:
+            for at, chunk in self.chunks:
+                if CASSETTE_TIMING == "original":
+                    wait = at - (time.perf_counter() - self.t0)
+                    if wait > 0:
+                        time.sleep(wait)
+                yield chunk
+
+    class AsyncReplayStream(hx.AsyncByteStream):
+        def __init__(self, entry: Optional[Dict[str, Any]], t0: float) -> None:
+            self.chunks, self.t0 = _chunks(entry), t0
+
+        async def __aiter__(self) -> Any:
+            for at, chunk in self.chunks:
+                if CASSETTE_TIMING == "original":
+                    wait = at - (time.perf_counter() - self.t0)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                yield chunk
+
+    class RecordingStream(hx.SyncByteStream):
+        def __init__(self, inner: Any, rec: _Recording) -> None:
+            self.inner, self.rec = inner, rec
+
+        def __iter__(self) -> Iterator[bytes]:
+            for chunk in self.inner:
+                self.rec.add(chunk)
+                yield chunk
+
+        def close(self) -> None:
+            try:
+                self.inner.close()
+            finally:
+                self.rec.finish()
+
+    class AsyncRecordingStream(hx.AsyncByteStream):
+        def __init__(self, inner: Any, rec: _Recording) -> None:
+            self.inner, self.rec = inner, rec
+
+        async def __aiter__(self) -> Any:
+            async for chunk in self.inner:
+                self.rec.add(chunk)
+                yield chunk
+
+        async def aclose(self) -> None:
+            try:
+                await self.inner.aclose()
+            finally:
+                self.rec.finish()
+
+    class CassetteTransport(hx.BaseTransport):
+        def __init__(self, inner: Any, upstream: str) -> None:
+            self.inner, self.upstream = inner, upstream
+
+        def handle_request(self, request: Any) -> Any:
+            t0 = time.perf_counter()
+            body = request.read()
+            if REPLAYING:
+                entry = _replayer().match(request.method, str(request.url), body)
+                if _ttfb(entry):
+                    time.sleep(_ttfb(entry))
+                return hx.Response(_status(entry), headers=_headers(entry), stream=ReplayStream(entry, t0))
+            # Ongecomprimeerd opnemen, dan is de cassette leesbaar en afspeelbaar
+            request.headers["Accept-Encoding"] = "identity"
+            rec = _Recording(self.upstream, request.method, str(request.url), body, t0)
+            resp = self.inner.handle_request(request)
+            rec.response(resp.status_code, resp.headers)
+            return hx.Response(resp.status_code, headers=resp.headers, stream=RecordingStream(resp.stream, rec),
+                               extensions=resp.extensions)
+
+        def close(self) -> None:
+            self.inner.close()
+
+    class AsyncCassetteTransport(hx.AsyncBaseTransport):
+        def __init__(self, inner: Any, upstream: str) -> None:
+            self.inner, self.upstream = inner, upstream
+
+        async def handle_async_request(self, request: Any) -> Any:
+            t0 = time.perf_counter()
+            body = await request.aread()
+            if REPLAYING:
+                entry = _replayer().match(request.method, str(request.url), body)
+                if _ttfb(entry):
+                    await asyncio.sleep(_ttfb(entry))
+                return hx.Response(_status(entry), headers=_headers(entry), stream=AsyncReplayStream(entry, t0))
+            request.headers["Accept-Encoding"] = "identity"
+            rec = _Recording(self.upstream, request.method, str(request.url), body, t0)
+            resp = await self.inner.handle_async_request(request)
+            rec.response(resp.status_code, resp.headers)
+            return hx.Response(resp.status_code, headers=resp.headers,
+                               stream=AsyncRecordingStream(resp.stream, rec), extensions=resp.extensions)
+
+        async def aclose(self) -> None:
+            await self.inner.aclose()
+
+    return CassetteTransport, AsyncCassetteTransport
+
+
+def _module_of(obj: Any) -> Any:
+    return sys.modules[type(obj).__module__.split(".", 1)[0]]
+
+
+def wrap_transport(transport: Any, upstream: str) -> Any:
+    if not (RECORDING or REPLAYING):
+        return transport
+    return _httpx_layer(_module_of(transport))[0](transport, upstream)
+
+
+def wrap_async_transport(transport: Any, upstream: str) -> Any:
+    if not (RECORDING or REPLAYING):
+        return transport
+    return _httpx_layer(_module_of(transport))[1](transport, upstream)
+
+
+def openai_kwargs(asynchronous: bool = False) -> Dict[str, Any]:
+    """Extra kwargs voor OpenAI()/AsyncOpenAI(): een http_client met cassette-transport."""
+    if not (RECORDING or REPLAYING):
+        return {}
+    from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+    hx = sys.modules[DefaultHttpxClient.__mro__[1].__module__.split(".", 1)[0]]
+    if asynchronous:
+        return {"http_client": DefaultAsyncHttpxClient(
+            transport=wrap_async_transport(hx.AsyncHTTPTransport(), "openai"))}
+    return {"http_client": DefaultHttpxClient(transport=wrap_transport(hx.HTTPTransport(), "openai"))}
+
+
+# --- requests (http_client) ---
+class CassetteAdapter(BaseAdapter):
+    """Wrapt de HTTPAdapter van een upstream-sessie (retries e.d. blijven van de inner adapter)."""
+
+    def __init__(self, inner: BaseAdapter, upstream: str) -> None:
+        super().__init__()
+        self.inner, self.upstream = inner, upstream
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        t0 = time.perf_counter()
+        if REPLAYING:
+            entry = _replayer().match(request.method, request.url, request.body)
+            wait = entry.get("dur", 0.0) if entry and CASSETTE_TIMING == "original" else 0.0
+            if wait:
+                time.sleep(wait)
+            return self._response(request, entry)
+        request.headers["Accept-Encoding"] = "identity"
+        rec = _Recording(self.upstream, request.method, request.url, request.body, t0)
+        resp = self.inner.send(request, **kwargs)
+        rec.response(resp.status_code, resp.headers)
+        # Body hier helemaal lezen; de caller krijgt dezelfde bytes als stream terug
+        content = resp.raw.read(decode_content=True)
+        resp.headers.pop("Content-Encoding", None)
+        resp.raw = io.BytesIO(content)
+        rec.add(content)
+        rec.finish()
+        return resp
+
+    def _response(self, request: requests.PreparedRequest, entry: Optional[Dict[str, Any]]) -> requests.Response:
+        r = requests.Response()
+        r.status_code = _status(entry)
+        r.headers = CaseInsensitiveDict(_headers(entry))
+        r.raw = io.BytesIO(b"".join(c for _, c in _chunks(entry)))
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+        r.reason = "OK" if r.status_code < 400 else "Cassette"
+        r.url = request.url
+        r.request = request
+        r.connection = self
+        return r
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+def wrap_adapter(adapter: BaseAdapter, upstream: str) -> BaseAdapter:
+    return CassetteAdapter(adapter, upstream) if RECORDING or REPLAYING else adapter
+
+
+def stats() -> Dict[str, Any]:
+    return {**STATS, "mode": CASSETTE_MODE, "path": CASSETTE_PATH if CASSETTE_MODE != "off" else None,
+            "timing": CASSETTE_TIMING}
@@ -0,0 +1,152 @@
+# services/compaction.py
+"""
+Rollende compactie van lange gesprekken.
+
+Elke beurt voegt items toe aan de OpenAI-conversatie (inclusief volledige
+function_call_outputs), dus de prompt groeit mee. Na COMPACT_AFTER_TURNS
+beurten of COMPACT_AFTER_TOKENS inputtokens wordt de geschiedenis op de
+achtergrond samengevat (FASTMODEL) en gaat het gesprek verder op een nieuwe
+conversatie met alleen die samenvatting.
+
+De frontend blijft dezelfde `thread_id` gebruiken: in de state store staat
+per thread de actieve conversatie (`conv`); dezelfde alias koppelt een lazy
+thread (conversation_pool) aan zijn echte conversatie. De compactie loopt
+via de commit-wachtrij van de oude conversatie, dus de volgende beurt wacht
+er vanzelf op (`active_conversation`).
+"""
+import os
+import threading
+from typing import Any, Dict, List
+
+from services import conversation_commits, conversation_pool, metrics, results_context, state_store
+from services.conversations_config import FASTMODEL
+
+COMPACT_AFTER_TURNS = int(os.getenv("COMPACT_AFTER_TURNS", "20"))
+COMPACT_AFTER_TOKENS = int(os.getenv("COMPACT_AFTER_TOKENS", "12000"))
+COMPACT_ITEM_CHARS = 400
+COMPACT_MAX_ITEMS = 200
+
+SUMMARY_INSTRUCTION = (
+    "Vat dit gesprek tussen een gebruiker en Nexi (zoekhulp van de OBA) samen in maximaal "
+    "200 woorden, in de taal van de gebruiker. Noem: waar de gebruiker naar zocht, gekozen "
+    "filters en voorkeuren (leeftijd, taal, locatie, type), genoemde titels of activiteiten, "
+    "en openstaande vragen. Geen inleiding, alleen de samenvatting."
+)
+
+_LOCK = threading.Lock()
+STATS = {"compactions": 0, "errors": 0, "tokens_before": 0, "tokens_after": 0, "tokens_saved": 0}
+
+
+def active_conversation(client: Any, thread_id: str) -> str:
+    """Actieve OpenAI-conversatie voor deze thread, na afronding van openstaande commits."""
+    cid = state_store.get(thread_id).get("conv") or thread_id
+    if conversation_pool.is_lazy(cid):
+        # Lazy thread (zie conversation_pool): eerste bericht, nu pas een conversatie
+        cid = conversation_pool.materialize(client)
+        state_store.update(thread_id, conv=cid)
+        return cid
+    conversation_commits.wait(cid)
+    # Een compactie in de wachtrij kan de thread net hebben omgezet
+    cid = state_store.get(thread_id).get("conv") or thread_id
+    # Mislukte commit van een vorige beurt eerst herstellen
+    conversation_commits.repair(client, cid)
+    return cid
+
+
+def _item_text(item: Any) -> str:
+    itype = getattr(item, "type", "")
+    if itype == "message":
+        parts = getattr(item, "content", None) or []
+        text = " ".join((getattr(p, "text", None) or "") for p in parts).strip()
+        return f"{getattr(item, 'role', '')}: {text}" if text else ""
+    if itype == "function_call":
+        return f"tool {getattr(item, 'name', '')}: {getattr(item, 'arguments', '')}"
+    if itype == "function_call_output":
+        return f"tool-resultaat: {getattr(item, 'output', '')}"
+    return ""
+
+
+def _transcript(client: Any, cid: str) -> str:
+    lines: List[str] = []
+    for item in client.conversations.items.list(cid, order="asc", limit=100):
+        text = " ".join(_item_text(item).split())
+        if text:
+            lines.append(text[:COMPACT_ITEM_CHARS])
+        if len(lines) >= COMPACT_MAX_ITEMS:
+            break
+    return "\n".join(lines)
+
+
+def _compact(client: Any, thread_id: str, old_cid: str, tokens_before: int) -> None:
+    transcript = _transcript(client, old_cid)
+    if not transcript:
+        return
+    resp = client.responses.create(
+        model=FASTMODEL,
+        instructions=SUMMARY_INSTRUCTION,
+        input=transcript,
+        store=False,
+    )
+    summary = (getattr(resp, "output_text", "") or "").strip()
+    if not summary:
+        return
+
+    new_cid = client.conversations.create(items=[{
+        "type": "message",
+        "role": "developer",
+        "content": f"Samenvatting van het gesprek tot nu toe:\n{summary}",
+    }]).id
+
+    with _LOCK:
+        state = state_store.get(thread_id)
+        if (state.get("conv") or thread_id) != old_cid:
+            return
+        # Resultaatregels moeten in de nieuwe conversatie opnieuw mee kunnen
+        state_store.update(thread_id, conv=new_cid, turns=0, tokens=0, ctx_sent=None)
+
+    tokens_after = results_context.estimate_tokens(summary)
+    with _LOCK:
+        STATS["compactions"] += 1
+        STATS["tokens_before"] += tokens_before
+        STATS["tokens_after"] += tokens_after
+        STATS["tokens_saved"] += max(0, tokens_before - tokens_after)
+    print(
+        f"[COMPACT] thread={thread_id} {old_cid} -> {new_cid} "
+        f"tokens_before={tokens_before} summary_tokens~{tokens_after}",
+        flush=True,
+    )
+
+
+def record_turn(client: Any, thread_id: str, cid: str, resp: Any) -> None:
+    """Tel een beurt mee en plan een compactie zodra een drempel bereikt is."""
+    input_tokens = int(getattr(getattr(resp, "usage", None), "input_tokens", 0) or 0)
+    state = state_store.get(thread_id)
+    turns = int(state.get("turns") or 0) + 1
+    state_store.update(thread_id, turns=turns, tokens=input_tokens)
+
+    due = (COMPACT_AFTER_TURNS and turns >= COMPACT_AFTER_TURNS) or (
+        COMPACT_AFTER_TOKENS and input_tokens >= COMPACT_AFTER_TOKENS
+    )
+    if not due:
+        return
+
+    def job() -> None:
+        try:
+            _compact(client, thread_id, cid, input_tokens)
+        except Exception as e:
+            STATS["errors"] += 1
+            print(f"[COMPACT] error thread={thread_id}: {e}", flush=True)
+
+    # Na de commits van deze beurt, vóór de volgende beurt
+    state_store.update(thread_id, turns=0)
+    conversation_commits.submit(cid, job)
+
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        s = dict(STATS)
+    s["avg_saved"] = int(s["tokens_saved"] / s["compactions"]) if s["compactions"] else 0
+    return s
+
+
+metrics.register("compaction", stats)
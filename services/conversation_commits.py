@@ -0,0 +1,127 @@
+# services/conversation_commits.py
+"""
+Items toevoegen aan een OpenAI-conversatie zonder tweede modelcall.
+
+Wordt gebruikt als een beurt zonder ack van het model wordt afgerond: de
+function_call_output-items (en de ack) moeten in de conversatie staan, anders
+weigert de Responses API de volgende beurt (toolcall zonder output).
+- `add_items()` commit synchroon, binnen de beurt en vóór het laatste event:
+  werk ná het antwoord is op serverless niet gegarandeerd.
+- Mislukt een commit, dan blijven de items als `pending_items` in de state
+  store (onder de conversatie-id) staan; `repair()` voegt ze aan het begin
+  van de volgende beurt alsnog toe, ook op een andere worker.
+- `submit()` plant ander werk (compactie) na eerdere jobs op dezelfde
+  conversatie; de volgende beurt wacht daarop met `wait()`.
+"""
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from services import metrics, state_store
+
+COMMIT_WORKERS = int(os.getenv("COMMIT_WORKERS", "4"))
+COMMIT_WAIT_TIMEOUT = float(os.getenv("COMMIT_WAIT_TIMEOUT", "10"))
+
+_POOL = ThreadPoolExecutor(max_workers=COMMIT_WORKERS, thread_name_prefix="commit")
+_PENDING: Dict[str, Future] = {}
+_LOCK = threading.Lock()
+STATS = {"submitted": 0, "done": 0, "errors": 0, "waited": 0, "wait_timeouts": 0, "repairs": 0, "repair_errors": 0}
+
+
+def _run(prev: Any, fn: Callable[[], Any]) -> None:
+    if prev is not None:
+        try:
+            prev.result(timeout=COMMIT_WAIT_TIMEOUT)
+        except Exception:
+            pass
+    try:
+        fn()
+        STATS["done"] += 1
+    except Exception as e:
+        STATS["errors"] += 1
+        print(f"[COMMIT] error: {e}", flush=True)
+
+
+def submit(conversation_id: str, fn: Callable[[], Any]) -> Future:
+    """Plan `fn` na eventuele eerdere commits op dezelfde conversatie."""
+    with _LOCK:
+        prev = _PENDING.get(conversation_id)
+        fut = _POOL.submit(_run, prev, fn)
+        _PENDING[conversation_id] = fut
+        STATS["submitted"] += 1
+
+    def _cleanup(f: Future) -> None:
+        with _LOCK:
+            if _PENDING.get(conversation_id) is f:
+                del _PENDING[conversation_id]
+
+    fut.add_done_callback(_cleanup)
+    return fut
+
+
+def _create(client: Any, conversation_id: str, items: List[Dict[str, Any]]) -> None:
+    client.conversations.items.create(conversation_id, items=items)
+
+
+def add_items(client: Any, conversation_id: str, items: List[Dict[str, Any]]) -> bool:
+    """
+    Voeg `items` nu toe via de Conversations API (na openstaande jobs). Bij een
+    fout blijven ze staan voor `repair()`; False in dat geval.
+    """
+    wait(conversation_id)
+    pending = state_store.get(conversation_id).get("pending_items") or []
+    try:
+        _create(client, conversation_id, pending + items)
+    except Exception as e:
+        STATS["errors"] += 1
+        print(f"[COMMIT] error conv={conversation_id}: {e}", flush=True)
+        state_store.update(conversation_id, pending_items=pending + items)
+        return False
+    STATS["done"] += 1
+    if pending:
+        state_store.update(conversation_id, pending_items=None)
+    return True
+
+
+def repair(client: Any, conversation_id: str) -> None:
+    """Voeg items van een eerder mislukte commit alsnog toe (no-op als er niets openstaat)."""
+    pending = state_store.get(conversation_id).get("pending_items")
+    if not pending:
+        return
+    STATS["repairs"] += 1
+    try:
+        _create(client, conversation_id, pending)
+    except Exception as e:
+        STATS["repair_errors"] += 1
+        print(f"[COMMIT] repair error conv={conversation_id}: {e}", flush=True)
+        return
+    state_store.update(conversation_id, pending_items=None)
+
+
+def wait(conversation_id: str) -> None:
+    """Blokkeer tot openstaande jobs voor deze conversatie klaar zijn."""
+    with _LOCK:
+        fut = _PENDING.get(conversation_id)
+    if fut is None:
+        return
+    STATS["waited"] += 1
+    try:
+        fut.result(timeout=COMMIT_WAIT_TIMEOUT)
+    except Exception as e:
+        # Jobs vangen hun eigen fouten af; dit is een time-out
+        STATS["wait_timeouts"] += 1
+        print(f"[COMMIT] wait conv={conversation_id}: {e!r}", flush=True)
+
+
+def assistant_message(text: str) -> Dict[str, Any]:
+    return {"type": "message", "role": "assistant", "content": text}
+
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        pending = len(_PENDING)
+    return {**STATS, "pending_jobs": pending}
+
+
+metrics.register("conversation_commits", stats)
@@ -0,0 +1,129 @@
+# services/conversation_pool.py
+"""
+Direct een thread_id bij /start_thread, zonder OpenAI-roundtrip.
+
+CONVERSATION_POOL:
+- pool: een achtergrondthread houdt CONVERSATION_POOL_SIZE kant-en-klare
+        conversaties klaar (ouder dan CONVERSATION_POOL_MAX_AGE wordt
+        weggegooid). Is de pool leeg, dan volgt een lazy thread.
+- lazy: /start_thread geeft alleen een lokale thread_id ("lazy_…"); de echte
+        conversatie wordt pas bij het eerste bericht aangemaakt en via de
+        alias in de state store gekoppeld (zie compaction.active_conversation).
+- off:  standaard; oude gedrag, synchroon conversations.create().
+
+Lazy threads kunnen alleen met een gedeelde state store (STATE_BACKEND=sqlite
+of mongo): met de geheugenstore per proces kent een andere worker de alias
+niet en zou hij een nieuwe, lege conversatie aanmaken. Zonder gedeelde store
+valt `lazy` terug op `off` en maakt `pool` bij een lege pool synchroon aan.
+Op serverless (geen blijvende achtergrondthread) hoort de modus `off`.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from services import metrics, state_store
+
+POOL_MODE = os.getenv("CONVERSATION_POOL", "off").lower()
+LAZY_ALLOWED = state_store.shared()
+if POOL_MODE == "lazy" and not LAZY_ALLOWED:
+    print("[POOL] CONVERSATION_POOL=lazy vereist STATE_BACKEND=sqlite|mongo; valt terug op off", flush=True)
+    POOL_MODE = "off"
+POOL_SIZE = int(os.getenv("CONVERSATION_POOL_SIZE", "4"))
+POOL_MAX_AGE = float(os.getenv("CONVERSATION_POOL_MAX_AGE", "3600"))
+POOL_REFILL_INTERVAL = float(os.getenv("CONVERSATION_POOL_REFILL_INTERVAL", "30"))
+
+LAZY_PREFIX = "lazy_"
+
+_POOL: Deque[Tuple[str, float]] = deque()
+_LOCK = threading.Lock()
+_WAKE = threading.Event()
+_THREAD: Optional[threading.Thread] = None
+STATS = {"pool_hits": 0, "lazy": 0, "created": 0, "expired": 0, "errors": 0, "materialized": 0, "sync_created": 0}
+
+
+def _pop_fresh() -> Optional[str]:
+    now = time.time()
+    with _LOCK:
+        while _POOL:
+            cid, created = _POOL.popleft()
+            if now - created <= POOL_MAX_AGE:
+                return cid
+            STATS["expired"] += 1
+    return None
+
+
+def _refill(client: Any) -> None:
+    while True:
+        now = time.time()
+        with _LOCK:
+            while _POOL and now - _POOL[0][1] > POOL_MAX_AGE:
+                _POOL.popleft()
+                STATS["expired"] += 1
+            missing = POOL_SIZE - len(_POOL)
+        for _ in range(max(0, missing)):
+            try:
+                cid = client.conversations.create().id
+            except Exception as e:
+                STATS["errors"] += 1
+                print(f"[POOL] create error: {e}", flush=True)
+                break
+            with _LOCK:
+                _POOL.append((cid, time.time()))
+                STATS["created"] += 1
+        _WAKE.wait(POOL_REFILL_INTERVAL)
+        _WAKE.clear()
+
+
+def ensure_started(client: Any) -> None:
+    """Start de refill-thread één keer (alleen als CONVERSATION_POOL=pool)."""
+    global _THREAD
+    if POOL_MODE != "pool" or POOL_SIZE <= 0 or _THREAD is not None:
+        return
+    with _LOCK:
+        if _THREAD is None:
+            _THREAD = threading.Thread(target=_refill, args=(client,), name="conversation-pool", daemon=True)
+            _THREAD.start()
+
+
+def start_thread(client: Any) -> str:
+    """thread_id voor een nieuw gesprek; behalve bij `off` zonder netwerkcall."""
+    if POOL_MODE == "off":
+        return client.conversations.create().id
+    if POOL_MODE == "pool":
+        ensure_started(client)
+        cid = _pop_fresh()
+        _WAKE.set()
+        if cid:
+            STATS["pool_hits"] += 1
+            return cid
+        if not LAZY_ALLOWED:
+            STATS["sync_created"] += 1
+            return client.conversations.create().id
+    STATS["lazy"] += 1
+    return f"{LAZY_PREFIX}{uuid.uuid4().hex}"
+
+
+def is_lazy(thread_id: str) -> bool:
+    return bool(thread_id) and thread_id.startswith(LAZY_PREFIX)
+
+
+def materialize(client: Any) -> str:
+    """Echte conversatie voor een lazy thread: uit de pool, anders nu aanmaken."""
+    STATS["materialized"] += 1
+    cid = _pop_fresh() if POOL_MODE == "pool" else None
+    if cid:
+        _WAKE.set()
+        return cid
+    return client.conversations.create().id
+
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        size = len(_POOL)
+    return {**STATS, "mode": POOL_MODE, "size": size, "target": POOL_SIZE, "lazy_allowed": LAZY_ALLOWED}
+
+
+metrics.register("conversation_pool", stats)
@@ -1,9 +1,29 @@
 # services/conversations_client.py
 import json
-from typing import Any, List, Dict, Optional, Union
-
-from openai import OpenAI
-
+import logging
+import time
+from typing import Any, Iterator, List, Dict, Optional, Tuple, Union
+
+from openai import APITimeoutError, OpenAI
+
+from services import (
+    ack,
+    agenda_index,
+    cassette,
+    compaction,
+    conversation_commits,
+    conversation_pool,
+    deadline,
+    decision_cache,
+    intent_router,
+    metrics,
+    prefetch,
+    results_context,
+    speculative,
+    state_store,
+    tool_executor,
+    usage,
+)
 from services.oba_config import TOOLS
 from services.oba_tools import (
     TOOL_IMPLS,
@@ -23,56 +43,21 @@ from services.conversations_config import (
     FASTMODEL,
     SYSTEM,
     NO_RESULTS_MSG,
+    HELP_MSG,
 )
 
-client = OpenAI()
+client = OpenAI(**cassette.openai_kwargs())
+# Binnen een deadline geen SDK-retries: elke poging zou het hele restbudget krijgen
+budget_client = client.with_options(max_retries=0)
+logger = logging.getLogger("oba_app")
 
-# Per-conversatie cache van laatste resultaten (boeken of agenda)
-LAST_RESULTS: dict[str, dict] = {}
-
-
-def _results_context_block(data: dict, max_items: int = 20) -> str:
-    """Bouw een compact SYSTEM-contextblok op basis van laatste resultaten."""
-    if not data:
-        return ""
-    kind = data.get("kind")
-    items = (data.get("items") or [])[:max_items]
-    lines = []
-
-    if kind == "books":
-        for b in items:
-            t = (b.get("short_title") or "").strip()
-            a = (b.get("auteur") or "").strip()
-            d = (b.get("beschrijving") or "").replace("\n", " ").strip()
-            if d and len(d) > 500:
-                d = d[:500] + "…"
-            lines.append(f"- titel: {t}\n  auteur: {a}\n  beschrijving: {d}")
-
-    elif kind == "agenda":
-        for it in items:
-            title = (it.get("title") or "").strip()
-            date = (it.get("date") or "").strip()
-            time = (it.get("time") or "").strip()
-            loc = (it.get("location") or "").strip()
-            summ = (it.get("summary") or "").replace("\n", " ").strip()
-            if summ and len(summ) > 500:
-                summ = summ[:500] + "…"
-            lines.append(
-                f"- titel: {title}\n  datum: {date} {time}\n  locatie: {loc}\n  samenvatting: {summ}"
-            )
-
-    if not lines:
-        return ""
-
-    return (
-        "Dit zijn de laatste zoekresultaten. Als iemand hier iets over vraagt, geef antwoord.\n"
-        "ZOEKRESULTATEN\n" + "\n".join(lines) + "\nEINDE_ZOEKRESULTATEN"
-    )
+# Model zonder (tijdig) antwoord: de beurt degradeert (zie deadline)
+MODEL_TIMEOUTS = (APITimeoutError, deadline.DeadlineExceeded)
 
 
 def create_conversation() -> str:
-    print("Creating conversation...")
-    return client.conversations.create().id
+    """Nieuwe thread_id: uit de pool of lazy (zie conversation_pool)."""
+    return conversation_pool.start_thread(client)
 
 
 def _extract_tool_calls(resp) -> List[Any]:
@@ -84,175 +69,238 @@ def _extract_tool_calls(resp) -> List[Any]:
     ]
 
 
-def _dyn_system_for(conversation_id: str) -> str:
-    """Bouw dynamische system-instructies met de laatste resultaten (indien aanwezig)."""
-    dyn = SYSTEM
-    prev = LAST_RESULTS.get(conversation_id)
-    if prev:
-        ctx = _results_context_block(prev, max_items=20)
-        if ctx:
-            dyn = f"{SYSTEM}\n\n{ctx}"
-    return dyn
+def _turn_input(conversation_id: str, user_text: str) -> Tuple[Union[str, List[Dict[str, str]]], Optional[Dict[str, Any]]]:
+    """
+    Input voor de eerste modelcall. `instructions` blijft altijd SYSTEM, zodat
+    de prefix (SYSTEM + TOOLS) door de prompt-cache hergebruikt kan worden.
+    Relevante, nog niet geïnjecteerde resultaatregels gaan als developer-item
+    vóór de gebruikersvraag (zie results_context.select).
+    Retourneert (input, nieuwe `ctx_sent`-state of None).
+    """
+    state = state_store.get(conversation_id)
+    entry = state.get("results")
+    block, sent_items = results_context.select(entry, user_text, state.get("ctx_sent"))
+    if not block:
+        return user_text, None
+    return [
+        {"role": "developer", "content": block},
+        {"role": "user", "content": user_text},
+    ], {"id": entry["id"], "items": sent_items}
 
 
-def _handle_tool_result(
-    name: str,
-    result: Dict[str, Any],
+def remember_turn(
     conversation_id: str,
-    user_text: str,
-) -> Dict[str, Any]:
+    handled: Dict[str, Any],
+    tool_calls: List[Tuple[str, Optional[str], Dict[str, Any]]],
+) -> None:
     """
-    Verwerkt de output van één toolcall:
-    - Roept Typesense / Agenda fetchers aan
-    - Werkt LAST_RESULTS bij
-    - Bouwt de envelope (nog ZONDER ack-tekst)
-    Retourneert een dict met:
-      { "envelope": envelope_dict, "output_item": {...} }
+    Sla de gekozen toolcall (voor filters, zie filter_delta) en de resultaten
+    compact op in de state store; boekdetails alvast prefetchen.
     """
-    # standaard “function_call_output” voor commit naar Responses API
-    output_item = {
+    fields: Dict[str, Any] = {}
+    chosen = (handled.get("output_item") or {}).get("call_id")
+    for name, call_id, args in tool_calls:
+        if call_id == chosen and name in ("build_search_params", "build_agenda_query"):
+            fields["last_tool"] = {"name": name, "args": args}
+    last = handled.get("last_results")
+    if last:
+        fields.update(results=results_context.precompute(last), ctx_sent=None)
+    if fields:
+        state_store.update(conversation_id, **fields)
+    if last and last["kind"] == "books":
+        prefetch.schedule(b.get("ppn") for b in last["items"])
+
+
+def _tool_calls(resp) -> List[Tuple[str, Optional[str], Dict[str, Any]]]:
+    """(naam, call_id, argumenten) per toolcall in een Responses-result."""
+    return [
+        (
+            call.name,
+            getattr(call, "call_id", None) or getattr(call, "id", None),
+            call.arguments if isinstance(call.arguments, dict) else json.loads(call.arguments or "{}"),
+        )
+        for call in _extract_tool_calls(resp)
+    ]
+
+
+def build_specs(tool_calls: List[Tuple[str, Optional[str], Dict[str, Any]]]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Toolparameters bouwen (goedkoop, lokaal); call_id gaat mee in het result."""
+    specs: List[Tuple[str, Dict[str, Any]]] = []
+    for name, call_id, args in tool_calls:
+        impl = TOOL_IMPLS.get(name)
+        with metrics.span("tool_build", tool=name):
+            result = impl(**args) if impl else {"error": f"Unknown tool: {name}"}
+        result["_call_id"] = call_id
+        specs.append((name, result))
+    return specs
+
+
+def _output_item(result: Dict[str, Any]) -> Dict[str, str]:
+    """Standaard “function_call_output” voor commit naar Responses API."""
+    return {
         "type": "function_call_output",
-        "call_id": result.get("_call_id") or "",   # wordt verderop gezet door caller
+        "call_id": result.get("_call_id") or "",
         "output": json.dumps(result, ensure_ascii=False),
     }
 
+
+def _agenda_context_items(ag_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "title": it.get("title"),
+            "summary": it.get("summary"),
+            "date": it.get("date") or (it.get("raw_date") or {}).get("start") if isinstance(it.get("raw_date"), dict) else it.get("date"),
+            "time": it.get("time"),
+            "location": it.get("location"),
+        }
+        for it in ag_results[:20]
+    ]
+
+
+def fetch_kind(name: str, result: Dict[str, Any]) -> Optional[str]:
+    """Welke fetch hoort bij deze toolcall: 'faq', 'books', 'agenda_api', 'events' of None."""
     if name == "build_faq_params":
-        faq_results = typesense_search_faq(result)
+        return "faq"
+    if name in ("build_search_params", "build_compare_params"):
+        if result.get("collection") in (COLLECTION_BOOKS, COLLECTION_BOOKS_KN):
+            return "books"
+        return None
+    if name == "build_agenda_query":
+        if "API" in result and "URL" in result:
+            return "agenda_api"
+        if result.get("collection") == COLLECTION_EVENTS:
+            return "events"
+    return None
+
 
-        # Neem (indien aanwezig) de eerste locatie uit de FAQ-resultaten op in de envelope
-        loc: Optional[str] = None
-        if faq_results:
-            first = faq_results[0] or {}
-            loc_val = first.get("location")
-            if isinstance(loc_val, str) and loc_val.strip():
-                loc = loc_val.strip()
+def fetch_collection(kind: Optional[str], result: Dict[str, Any]) -> Optional[str]:
+    """Collectie-tag voor metrics: Typesense-collectie, of "agenda" voor de OBA API."""
+    return "agenda" if kind == "agenda_api" else result.get("collection")
+
+
+def _fetch(kind: Optional[str], result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if kind == "faq":
+        return typesense_search_faq(result)
+    if kind == "books":
+        items = speculative.take(result)
+        return items if items is not None else typesense_search_books(result)
+    if kind == "agenda_api":
+        # Scenario A: lokale agenda-index, anders XML agenda via OBA API
+        ag_results = agenda_index.query_url(result["API"])
+        if ag_results is None:
+            ag_results = fetch_agenda_results(result["API"])
+        return ag_results
+    if kind == "events":
+        # Scenario B: contextuele agendazoekvraag via Typesense events
+        return typesense_search_events(result)
+    return []
 
+
+def _first_location(items: List[Dict[str, Any]]) -> Optional[str]:
+    if items:
+        loc_val = (items[0] or {}).get("location")
+        if isinstance(loc_val, str) and loc_val.strip():
+            return loc_val.strip()
+    return None
+
+
+def build_handled(
+    name: str,
+    result: Dict[str, Any],
+    kind: Optional[str],
+    fetched: List[Dict[str, Any]],
+    conversation_id: str,
+) -> Dict[str, Any]:
+    """
+    Bouwt uit de opgehaalde resultaten van één toolcall:
+    - de envelope (nog ZONDER ack-tekst)
+    - de nieuwe resultaten-entry voor de state store (de caller slaat die op)
+    Retourneert een dict met:
+      { "envelope": envelope_dict, "output_item": {...}, "last_results": dict|None }
+    """
+    output_item = _output_item(result)
+    last_results: Optional[Dict[str, Any]] = None
+
+    if kind == "faq":
         envelope = make_envelope(
             "faq",
-            results=faq_results,
+            results=fetched,
             url=None,
-            message=(NO_RESULTS_MSG if not faq_results else None),
+            message=(NO_RESULTS_MSG if not fetched else None),
             thread_id=conversation_id,
-            location=loc,
+            # Neem (indien aanwezig) de eerste locatie uit de FAQ-resultaten op in de envelope
+            location=_first_location(fetched),
         )
-        return {"envelope": envelope, "output_item": output_item}
 
-    if name in ("build_search_params", "build_compare_params"):
-        coll = result.get("collection")
-        if coll in (COLLECTION_BOOKS, COLLECTION_BOOKS_KN):
-            book_results = typesense_search_books(result)
-            if book_results:
-                LAST_RESULTS[conversation_id] = {
-                    "kind": "books",
-                    "items": book_results[:20],  # bevat ppn/titel/auteur/beschrijving
-                }
-            envelope = make_envelope(
-                "collection",
-                results=book_results,
-                url=None,
-                message=(NO_RESULTS_MSG if not book_results else result.get("Message")),
-                thread_id=conversation_id,
-            )
-        else:
-            # Valt terug op tekst als er een onverwachte collection is
-            envelope = make_envelope(
-                "text",
-                results=[],
-                url=None,
-                message=result.get("Message"),
-                thread_id=conversation_id,
-            )
-        return {"envelope": envelope, "output_item": output_item}
+    elif kind == "books":
+        if fetched:
+            last_results = {
+                "kind": "books",
+                "items": fetched[:20],  # bevat ppn/titel/auteur/beschrijving
+            }
+        envelope = make_envelope(
+            "collection",
+            results=fetched,
+            url=None,
+            message=(NO_RESULTS_MSG if not fetched else result.get("Message")),
+            thread_id=conversation_id,
+        )
 
-    if name == "build_agenda_query":
-        if "API" in result and "URL" in result:
-            # Scenario A: XML agenda via OBA API
-            ag_results = fetch_agenda_results(result["API"])
+    elif name in ("build_search_params", "build_compare_params"):
+        # Valt terug op tekst als er een onverwachte collection is
+        envelope = make_envelope(
+            "text",
+            results=[],
+            url=None,
+            message=result.get("Message"),
+            thread_id=conversation_id,
+        )
 
-            if ag_results:
-                LAST_RESULTS[conversation_id] = {
-                    "kind": "agenda",
-                    "items": [
-                        {
-                            "title": it.get("title"),
-                            "summary": it.get("summary"),
-                            "date": it.get("date") or (it.get("raw_date") or {}).get("start") if isinstance(it.get("raw_date"), dict) else it.get("date"),
-                            "time": it.get("time"),
-                            "location": it.get("location"),
-                        }
-                        for it in ag_results[:20]
-                    ],
-                }
-
-            first_location = None
-            if ag_results:
-                loc_val = ag_results[0].get("location")
-                if isinstance(loc_val, str) and loc_val.strip():
-                    first_location = loc_val.strip()
-
-            envelope = make_envelope(
-                "agenda",
-                results=ag_results,
-                url=result.get("URL"),
-                message=(NO_RESULTS_MSG if not ag_results else result.get("Message")),
-                thread_id=conversation_id,
-                location=first_location,
-            )
-            return {"envelope": envelope, "output_item": output_item}
-
-        elif result.get("collection") == COLLECTION_EVENTS:
-            # Scenario B: contextuele agendazoekvraag via Typesense events
-            ag_results = typesense_search_events(result)
-
-            if ag_results:
-                LAST_RESULTS[conversation_id] = {
-                    "kind": "agenda",
-                    "items": [
-                        {
-                            "title": it.get("title"),
-                            "summary": it.get("summary"),
-                            "date": it.get("date") or (it.get("raw_date") or {}).get("start") if isinstance(it.get("raw_date"), dict) else it.get("date"),
-                            "time": it.get("time"),
-                            "location": it.get("location"),
-                        }
-                        for it in ag_results[:20]
-                    ],
-                }
-
-            first_location: Optional[str] = None
-            if ag_results:
-                loc_val = ag_results[0].get("location")
-                if isinstance(loc_val, str) and loc_val.strip():
-                    first_location = loc_val.strip()
-
-            envelope = make_envelope(
-                "agenda",
-                results=ag_results,
-                url=None,
-                message=(NO_RESULTS_MSG if not ag_results else result.get("Message")),
-                thread_id=conversation_id,
-                location=first_location,
-            )
-        else:
-            envelope = make_envelope(
-                "agenda",
-                results=[],
-                url=None,
-                message=NO_RESULTS_MSG,
-                thread_id=conversation_id,
-            )
+    elif kind in ("agenda_api", "events"):
+        if fetched:
+            last_results = {"kind": "agenda", "items": _agenda_context_items(fetched)}
+        envelope = make_envelope(
+            "agenda",
+            results=fetched,
+            url=result.get("URL") if kind == "agenda_api" else None,
+            message=(NO_RESULTS_MSG if not fetched else result.get("Message")),
+            thread_id=conversation_id,
+            location=_first_location(fetched),
+        )
 
-        return {"envelope": envelope, "output_item": output_item}
+    elif name == "build_agenda_query":
+        envelope = make_envelope(
+            "agenda",
+            results=[],
+            url=None,
+            message=NO_RESULTS_MSG,
+            thread_id=conversation_id,
+        )
 
-    # Onbekende tool
-    envelope = make_envelope(
-        "text",
-        results=[],
-        url=None,
-        message="Onbekende tool.",
-        thread_id=conversation_id,
-    )
-    return {"envelope": envelope, "output_item": output_item}
+    else:
+        # Onbekende tool
+        envelope = make_envelope(
+            "text",
+            results=[],
+            url=None,
+            message="Onbekende tool.",
+            thread_id=conversation_id,
+        )
+
+    return {"envelope": envelope, "output_item": output_item, "last_results": last_results}
+
+
+def _handle_tool_result(
+    name: str,
+    result: Dict[str, Any],
+    conversation_id: str,
+    user_text: str,
+) -> Dict[str, Any]:
+    """Verwerkt de output van één toolcall: fetch (Typesense / Agenda) + envelope."""
+    kind = fetch_kind(name, result)
+    with metrics.span("fetch", tool=name, kind=kind, collection=fetch_collection(kind, result)):
+        fetched = _fetch(kind, result) if kind else []
+    return build_handled(name, result, kind, fetched, conversation_id)
 
 
 def _ack_instruction(envelope: Dict[str, Any], user_text: str) -> str:
@@ -271,71 +319,223 @@ def _ack_instruction(envelope: Dict[str, Any], user_text: str) -> str:
     return "Zeg iets als: Klaar met zoeken, bekijk wat ik heb gevonden in het overzicht."
 
 
-def ask_with_tools(conversation_id: str, user_text: str) -> Union[str, Dict[str, Any]]:
+def _model_call(stream: bool, emit_text: bool, stage: str, **kwargs: Any) -> Iterator[Tuple[str, Dict[str, Any]]]:
     """
-    - Geen toolcall  → return tekst-envelop
-    - Wel toolcall   → commit outputs + return gevulde envelop (incl. korte ack-tekst)
+    Eén Responses-call. Niet-streamend: direct de response. Streamend: yield
+    ("tool", {name}) zodra een toolcall start en ("delta", {text}) per teksttoken
+    (alleen als `emit_text`). Geeft in beide gevallen de complete response terug;
+    usage en timing worden onder `stage` geregistreerd. De call krijgt het
+    resterende budget van de beurt; is dat op, dan volgt DeadlineExceeded.
     """
-    # 1) Eerste beurt met tools (system dynamisch met LAST_RESULTS)
-    resp = client.responses.create(
-        model=MODEL,
-        instructions=_dyn_system_for(conversation_id),
-        conversation=conversation_id,
-        input=user_text,
-        tools=TOOLS,
-        tool_choice="auto",
-    )
+    t0 = time.monotonic()
+    budget = deadline.timeout()
+    api = client if budget is None else budget_client
+    if budget is not None:
+        kwargs["timeout"] = budget
+    if not stream:
+        resp = api.responses.create(**kwargs)
+        usage.record(stage, resp, time.monotonic() - t0)
+        return resp
+
+    final = None
+    ttft = None
+    events = api.responses.create(stream=True, **kwargs)
+    try:
+        for ev in events:
+            if ttft is None:
+                ttft = time.monotonic() - t0
+            etype = getattr(ev, "type", "")
+            if etype == "response.output_item.added":
+                item = getattr(ev, "item", None)
+                if getattr(item, "type", "") in ("function_call", "tool_call"):
+                    yield "tool", {"name": getattr(item, "name", None)}
+            elif etype == "response.output_text.delta" and emit_text:
+                yield "delta", {"text": ev.delta}
+            elif etype == "response.completed":
+                final = ev.response
+            if final is None and deadline.expired():
+                raise deadline.DeadlineExceeded(f"{stage} stream")
+    finally:
+        events.close()
+    if final is None:
+        raise RuntimeError("Responses stream ended without response.completed")
+    usage.record(stage, final, time.monotonic() - t0, ttft)
+    return final
+
+
+def run_turn(
+    conversation_id: str,
+    user_text: str,
+    stream: bool = False,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Eén gespreksbeurt als reeks events:
+      ("tool",    {"name": ...})   toolkeuze bekend            (alleen bij stream)
+      ("results", envelope)        zoekresultaten binnen, nog zonder ack
+      ("delta",   {"text": ...})   ack-/antwoordtekst per token (alleen bij stream)
+      ("done",    envelope)        definitieve envelope
+    `conversation_id` is de thread_id van de frontend; na een compactie loopt
+    het gesprek op een andere (actieve) OpenAI-conversatie verder. De beurt
+    loopt binnen REQUEST_DEADLINE (zie deadline).
+    """
+    owns_deadline = deadline.start()
+    try:
+        return (yield from _turn(conversation_id, user_text, stream))
+    finally:
+        speculative.settle()
+        if owns_deadline:
+            deadline.clear()
+
+
+def _turn(conversation_id: str, user_text: str, stream: bool) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    # 0) Actieve conversatie; openstaande compactie afwachten, mislukte commit herstellen
+    cid = compaction.active_conversation(client, conversation_id)
+
+    # 1) Eenduidige invoer lokaal routeren (of een gecachte toolkeuze voor een
+    #    bekende openingsvraag), anders de eerste beurt met tools
+    #    (vaste SYSTEM-prefix, relevante resultaten als developer-item)
+    state = state_store.get(conversation_id)
+    routed = intent_router.route(user_text, state.get("last_tool")) or decision_cache.lookup(user_text, state)
+    lead: List[Dict[str, Any]] = []
+    resp = None
+    tool_calls: List[Tuple[str, Optional[str], Dict[str, Any]]] = []
+    if not routed and deadline.affords(deadline.MODEL_MIN_BUDGET):
+        turn_input, ctx_sent = _turn_input(conversation_id, user_text)
+        # Opt-in: gegokte boekenzoekvraag alvast starten terwijl MODEL kiest
+        speculative.start(user_text)
+        try:
+            resp = yield from _model_call(
+                stream,
+                True,
+                "tools",
+                model=MODEL,
+                instructions=SYSTEM,
+                conversation=cid,
+                input=turn_input,
+                tools=TOOLS,
+                tool_choice="auto",
+            )
+        except MODEL_TIMEOUTS as e:
+            logger.warning(f"[DEADLINE] tools call: {e!r}")
+        else:
+            if ctx_sent:
+                state_store.update(conversation_id, ctx_sent=ctx_sent)
+            tool_calls = _tool_calls(resp)
+            if tool_calls:
+                decision_cache.store(user_text, state, tool_calls)
+    if not routed and resp is None:
+        # Geen (tijdige) toolkeuze van MODEL: heuristische zoekvraag op de invoer
+        deadline.degrade("heuristic_search")
+        routed = intent_router.heuristic(user_text)
+        if routed is None:
+            yield "done", make_envelope("text", results=[], url=None, message=NO_RESULTS_MSG, thread_id=conversation_id)
+            return
+    if routed:
+        lead = intent_router.synthetic_items(user_text, routed)
+        if routed["tool"] is None:
+            envelope = make_envelope("text", results=[], url=None, message=HELP_MSG, thread_id=conversation_id)
+            if stream:
+                yield "delta", {"text": HELP_MSG}
+            conversation_commits.add_items(client, cid, lead + [conversation_commits.assistant_message(HELP_MSG)])
+            compaction.record_turn(client, conversation_id, cid, None)
+            yield "done", envelope
+            return
+        if stream:
+            yield "tool", {"name": routed["tool"]}
+        tool_calls = [(routed["tool"], routed["call_id"], routed["args"])]
 
     # 2) Geen tools → gewoon tekst
-    calls = _extract_tool_calls(resp)
-    if not calls:
+    if not tool_calls:
         text = (resp.output_text or "").strip()
-        return make_envelope(
+        compaction.record_turn(client, conversation_id, cid, resp)
+        yield "done", make_envelope(
             "text",
             results=[],
             url=None,
             message=text,
             thread_id=conversation_id,
         )
+        return
 
-    # 3) Verwerk alle toolcalls
-    envelope: Optional[Dict[str, Any]] = None
-    outputs: List[Dict[str, str]] = []
-
-    for call in calls:
-        name = call.name
-        call_id = getattr(call, "call_id", None) or getattr(call, "id", None)
-        args = call.arguments if isinstance(call.arguments, dict) else json.loads(call.arguments or "{}")
+    # 3) Verwerk alle toolcalls: parameters bouwen (goedkoop), fetches parallel
+    specs = build_specs(tool_calls)
 
-        impl = TOOL_IMPLS.get(name)
-        result = impl(**args) if impl else {"error": f"Unknown tool: {name}"}
-        # geef call_id mee in result, zodat _handle_tool_result het kan loggen
-        result["_call_id"] = call_id
-
-        handled = _handle_tool_result(name, result, conversation_id, user_text)
-        envelope = handled["envelope"]  # laatste envelope is leidend
-        outputs.append(handled["output_item"])
-
-    # 4) Korte ack genereren en invullen als message nog leeg is
-    instruction = _ack_instruction(envelope, user_text)
-    ack_resp = client.responses.create(
-        model=FASTMODEL,
-        instructions=instruction,
-        conversation=conversation_id,
-        tools=[],
-        input=outputs,
-        tool_choice="none",
+    # Elke call krijgt een output; alleen de leidende envelope wordt getoond
+    outputs: List[Dict[str, str]] = [_output_item(result) for _, result in specs]
+    handled = tool_executor.run(
+        specs,
+        lambda name, result: _handle_tool_result(name, result, conversation_id, user_text),
     )
-    ack_text = (ack_resp.output_text or "").strip() if hasattr(ack_resp, "output_text") else ""
+    if handled is None:
+        envelope = make_envelope(
+            "text",
+            results=[],
+            url=None,
+            message=NO_RESULTS_MSG,
+            thread_id=conversation_id,
+        )
+    else:
+        envelope = handled["envelope"]
+        remember_turn(conversation_id, handled, tool_calls)
+
+    yield "results", envelope
+
+    # 4) Ack: vaste tekst + commit zonder modelcall, of (FAQ) een korte FASTMODEL-call;
+    #    zonder budget (of bij een time-out) valt de FAQ-ack terug op tekst
+    needs_ack_text = not (envelope.get("response") or {}).get("message")
+    ack_text: Optional[str] = None
+    if ack.needs_model_ack(envelope):
+        if deadline.affords(deadline.ACK_MIN_BUDGET):
+            instruction = _ack_instruction(envelope, user_text)
+            try:
+                ack_resp = yield from _model_call(
+                    stream,
+                    needs_ack_text,
+                    "ack",
+                    model=FASTMODEL,
+                    instructions=instruction,
+                    conversation=cid,
+                    tools=[],
+                    input=lead + outputs,
+                    tool_choice="none",
+                )
+                ack_text = (ack_resp.output_text or "").strip() if hasattr(ack_resp, "output_text") else ""
+            except MODEL_TIMEOUTS as e:
+                logger.warning(f"[DEADLINE] ack call: {e!r}")
+        if ack_text is None:
+            deadline.degrade("skip_ack")
+    if ack_text is None:
+        ack_text = ack.fallback_ack(envelope, user_text)
+        if stream and needs_ack_text:
+            yield "delta", {"text": ack_text}
+        shown = envelope["response"].get("message") or ack_text
+        conversation_commits.add_items(
+            client,
+            cid,
+            lead + outputs + [conversation_commits.assistant_message(shown)],
+        )
 
-    if envelope and not (envelope.get("response") or {}).get("message"):
+    if needs_ack_text:
         envelope["response"]["message"] = ack_text or envelope["response"].get("message")
 
-    print("message " + (envelope.get("response") or {}).get("message", ""), flush=True)
+    compaction.record_turn(client, conversation_id, cid, resp)
+    logger.debug("message " + ((envelope.get("response") or {}).get("message") or ""))
+    yield "done", envelope
+
+
+def ask_with_tools(conversation_id: str, user_text: str) -> Union[str, Dict[str, Any]]:
+    """
+    - Geen toolcall  → return tekst-envelop
+    - Wel toolcall   → commit outputs + return gevulde envelop (incl. korte ack-tekst)
+    """
+    envelope: Optional[Dict[str, Any]] = None
+    for event, data in run_turn(conversation_id, user_text):
+        if event == "done":
+            envelope = data
     return envelope or make_envelope(
         "text",
         results=[],
         url=None,
-        message=(ack_text or "Klaar."),
+        message="Klaar.",
         thread_id=conversation_id,
     )
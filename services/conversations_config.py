@@ -1,3 +1,5 @@
+import os
+
 MODEL  = "gpt-4.1-mini"
 FASTMODEL = "gpt-4.1-nano"
 SYSTEM = """
@@ -52,3 +54,25 @@ Uitvoer
 
 NO_RESULTS_MSG = "Sorry, ik heb niets gevonden. Misschien kun je je zoekopdracht anders formuleren."
 
+# Vaste helptekst (intent_router beantwoordt "help" zonder modelcall)
+HELP_MSG = (
+    "Ik ben Nexi, de zoekhulp van de OBA. Ik kan zoeken in de boekencollectie "
+    "(op titel, auteur of onderwerp), in de agenda met activiteiten en in "
+    "praktische informatie over de OBA, zoals lidmaatschap, locaties en openingstijden. "
+    "Stel je vraag gewoon in je eigen woorden."
+)
+
+
+# Ack-strategie: "auto" = vaste tekst voor resultatenlijsten, model alleen voor FAQ;
+# "model" = altijd een FASTMODEL-call (oud gedrag)
+ACK_MODE = os.getenv("ACK_MODE", "auto")
+
+# Vaste ack-teksten per taal voor collectie/agenda/tekst-beurten
+ACK_TEMPLATES = {
+    "nl": "Klaar met zoeken, bekijk wat ik heb gevonden in het overzicht.",
+    "en": "Done searching, have a look at what I found in the overview.",
+    "de": "Fertig mit der Suche, schau dir an, was ich in der Übersicht gefunden habe.",
+    "fr": "Recherche terminée, regarde ce que j'ai trouvé dans l'aperçu.",
+    "es": "He terminado de buscar, mira lo que encontré en el resumen.",
+    "tr": "Aramayı bitirdim, bulduklarıma genel bakışta göz at.",
+}
@@ -0,0 +1,119 @@
+# services/deadline.py
+"""
+Deadline per gespreksbeurt, met degradatie in plaats van een time-out.
+
+De frontend geeft een beurt na 30 s op (script.js). Daarna liep een trage
+beurt server-side gewoon door, terwijl elke upstream-call zijn eigen vaste
+timeout had. `start()` zet aan het begin van run_turn een deadline
+(REQUEST_DEADLINE) in een contextvar. Die gaat vanzelf mee naar
+asyncio-taken en `to_thread`; tool_executor kopieert de context naar zijn
+pool. Elke stage krijgt het resterende budget:
+- model:  `timeout()` als request-timeout; streams stoppen bij het verstrijken
+- HTTP:   `http_timeout()` begrenst connect/read in http_client en async_http
+- tools:  tool_executor wacht hooguit tot de deadline
+
+Als het budget (bijna) op is, degradeert de beurt (`degrade(kind)`):
+- heuristic_search  geen tijd voor de toolkeuze van MODEL → boekenzoekvraag op de invoer
+- partial_results   toolcalls of agenda-stream niet op tijd klaar → wat er al binnen is
+- skip_ack          geen tijd voor de FASTMODEL-ack → vaste tekst of eerste FAQ-antwoord
+- fetch_skipped     upstream-call niet meer gestart (zoekvraag geeft niets)
+De tellingen staan in STATS en als `oba_degradations_total` op /metrics.
+"""
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from services import metrics
+
+logger = logging.getLogger("oba_app")
+
+# Onder de 30 s van de frontend, zodat de gebruiker altijd een antwoord ziet
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "25"))
+# Minimaal resterend budget om nog een modelcall te beginnen
+MODEL_MIN_BUDGET = float(os.getenv("DEADLINE_MODEL_MIN", "4"))
+ACK_MIN_BUDGET = float(os.getenv("DEADLINE_ACK_MIN", "2"))
+
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("oba_deadline", default=None)
+
+STATS: Dict[str, int] = {
+    "turns": 0,
+    "heuristic_search": 0,
+    "partial_results": 0,
+    "skip_ack": 0,
+    "fetch_skipped": 0,
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Het budget van de beurt is op."""
+
+
+def start(budget: Optional[float] = None) -> bool:
+    """
+    Zet de deadline voor deze beurt. False als er al een loopt (die blijft
+    gelden) of als deadlines uit staan (REQUEST_DEADLINE=0); alleen wie True
+    krijgt, roept later `clear()` aan.
+    """
+    budget = REQUEST_DEADLINE if budget is None else budget
+    if budget <= 0 or _DEADLINE.get() is not None:
+        return False
+    _DEADLINE.set(time.monotonic() + budget)
+    STATS["turns"] += 1
+    return True
+
+
+def clear() -> None:
+    _DEADLINE.set(None)
+
+
+def remaining() -> Optional[float]:
+    """Resterend budget in seconden (kan negatief zijn), of None zonder deadline."""
+    d = _DEADLINE.get()
+    return None if d is None else d - time.monotonic()
+
+
+def affords(seconds: float) -> bool:
+    """True als er geen deadline is of er nog minstens `seconds` over is."""
+    r = remaining()
+    return r is None or r >= seconds
+
+
+def expired() -> bool:
+    r = remaining()
+    return r is not None and r <= 0
+
+
+def timeout(default: Optional[float] = None) -> Optional[float]:
+    """Timeout voor één call: `default`, begrensd door het resterende budget."""
+    r = remaining()
+    if r is None:
+        return default
+    if r <= 0:
+        raise DeadlineExceeded("budget op")
+    return r if default is None else min(default, r)
+
+
+def http_timeout(policy: Tuple[float, float]) -> Tuple[float, float]:
+    """(connect, read) uit het upstreambeleid, begrensd door het resterende budget."""
+    r = remaining()
+    if r is None:
+        return policy
+    if r <= 0:
+        degrade("fetch_skipped")
+        raise DeadlineExceeded("budget op vóór upstream-call")
+    connect, read = policy
+    return min(connect, r), min(read, r)
+
+
+def degrade(kind: str) -> None:
+    """Tel een degradatie van soort `kind` (zie de module-docstring)."""
+    STATS[kind] = STATS.get(kind, 0) + 1
+    metrics.inc("degradations", kind=kind)
+    r = remaining()
+    logger.warning(f"[DEADLINE] degrade={kind} remaining_ms={'-' if r is None else int(r * 1000)}")
+
+
+def stats() -> Dict[str, Any]:
+    return {**STATS, "request_deadline_s": REQUEST_DEADLINE}
@@ -0,0 +1,107 @@
+# services/decision_cache.py
+"""
+Gedeelde cache van toolkeuzes voor openingsvragen.
+
+Veel gesprekken beginnen met dezelfde korte vraag, en MODEL kiest daar
+steeds dezelfde tool met dezelfde argumenten. Zonder eerdere resultaten in
+het gesprek hangt die keuze alleen af van de tekst, SYSTEM, TOOLS en MODEL;
+dan is (genormaliseerde tekst) → (toolnaam, argumenten) te cachen.
+
+De sleutel begint met een hash van SYSTEM + TOOLS + MODEL, dus na een
+wijziging daarvan worden oude beslissingen vanzelf niet meer gevonden (en
+`invalidate()` ruimt ze op). Alleen beslissingen met precies één toolcall
+worden bewaard; een tekstantwoord gaat altijd via het model.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from services import metrics
+from services.cache import MISS, TTLCache, make_backend
+from services.conversations_config import MODEL, SYSTEM
+from services.oba_config import TOOLS
+
+logger = logging.getLogger("oba_app")
+
+DECISION_CACHE_ENABLED = os.getenv("DECISION_CACHE", "1") == "1"
+DECISION_MAX_CHARS = int(os.getenv("DECISION_CACHE_MAX_CHARS", "200"))
+
+DECISION_CACHE = TTLCache(
+    "decisions",
+    max_items=int(os.getenv("DECISION_CACHE_MAX_ITEMS", "5000")),
+    default_ttl=float(os.getenv("DECISION_CACHE_TTL", "86400")),
+    backend=make_backend(os.getenv("DECISION_CACHE_MONGO_URI"), "decision_cache"),
+)
+
+# Verandert bij elke wijziging van prompt, tools of model
+VERSION = hashlib.sha1(
+    json.dumps([SYSTEM, TOOLS, MODEL], sort_keys=True, ensure_ascii=False).encode("utf-8")
+).hexdigest()[:12]
+
+STATS = {"stored": 0, "skipped": 0}
+
+
+def normalize(text: str) -> str:
+    t = re.sub(r"\s+", " ", (text or "").strip().lower())
+    return t.rstrip(" ?!.")
+
+
+def _key(user_text: str) -> Optional[str]:
+    norm = normalize(user_text)
+    if not norm or len(norm) > DECISION_MAX_CHARS or norm.startswith("[filter]"):
+        return None
+    return f"{VERSION}:{hashlib.sha1(norm.encode('utf-8')).hexdigest()}"
+
+
+def eligible(state: Dict[str, Any]) -> bool:
+    """Alleen zonder eerdere resultaten: dan kan de context de keuze niet beïnvloeden."""
+    return DECISION_CACHE_ENABLED and not state.get("results")
+
+
+def lookup(user_text: str, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Gecachte toolkeuze in hetzelfde formaat als intent_router.route(), of None."""
+    if not eligible(state):
+        return None
+    key = _key(user_text)
+    if key is None:
+        return None
+    hit = DECISION_CACHE.get(key)
+    if hit is MISS:
+        return None
+    logger.debug(f"[DECISION] cache hit tool={hit['tool']}")
+    return {
+        "intent": "cached",
+        "tool": hit["tool"],
+        "args": dict(hit["args"]),
+        "confidence": 1.0,
+        "call_id": f"call_cache_{uuid.uuid4().hex[:16]}",
+    }
+
+
+def store(user_text: str, state: Dict[str, Any], tool_calls: List[Tuple[str, Optional[str], Dict[str, Any]]]) -> None:
+    """Bewaar de modelkeuze als die cachebaar is."""
+    if not eligible(state):
+        return
+    key = _key(user_text)
+    if key is None or len(tool_calls) != 1:
+        STATS["skipped"] += 1
+        return
+    name, _, args = tool_calls[0]
+    DECISION_CACHE.set(key, {"tool": name, "args": args})
+    STATS["stored"] += 1
+
+
+def invalidate() -> int:
+    """Verwijder alle beslissingen van de huidige versie (bijv. na handmatig bijstellen)."""
+    return DECISION_CACHE.invalidate(VERSION)
+
+
+def stats() -> Dict[str, Any]:
+    return {**DECISION_CACHE.stats(), **STATS, "version": VERSION}
+
+
+metrics.register("decision_cache", stats)
@@ -0,0 +1,284 @@
+# services/faq_index.py
+"""
+Lokale FAQ-index: de hele COLLECTION_FAQ in het geheugen.
+
+De FAQ-collectie is klein en verandert zelden, maar elke praktische vraag
+kostte een hybride zoekvraag naar Typesense. Een achtergrondjob exporteert
+daarom periodiek alle documenten (vraag, antwoord, locatie, embedding) naar
+een in-process snapshot:
+- lexicaal: BM25 over de tokens van vraag + antwoord (vraag telt dubbel)
+- vector:   genormaliseerde embedding-matrix; de cosine-scores voor alle
+            documenten zijn één matrix-vectorproduct (numpy als dat er is,
+            anders puur Python)
+De twee ranglijsten worden net als bij Typesense' `alpha: 0.8` samengevoegd
+met rank fusion. De query-embedding komt van FAQ_EMBED_MODEL (hetzelfde
+model als in het Typesense-schema); zonder dat model is de index lexicaal.
+
+`search(params)` geeft dezelfde {vraag, antwoord, location}-items als
+typesense_search, of None als de index geen goed antwoord kan geven: geen
+snapshot, geen query-embedding (terwijl er vectoren zijn) of geen enkele
+treffer. De caller gebruikt dan Typesense.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from services import cassette, http_client, metrics, typesense_search
+from services.cache import MISS, TTLCache
+from services.oba_config import COLLECTION_FAQ
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optioneel
+    np = None
+
+FAQ_EMBED_MODEL = os.getenv("FAQ_EMBED_MODEL", "")
+# Standaard alleen aan met een querymodel: lexicaal alleen is zwakker dan de hybride zoekvraag van Typesense
+FAQ_INDEX_ENABLED = os.getenv("FAQ_INDEX", "1" if FAQ_EMBED_MODEL else "0") == "1"
+FAQ_SYNC_INTERVAL = float(os.getenv("FAQ_SYNC_INTERVAL", "3600"))
+FAQ_HYBRID_ALPHA = float(os.getenv("FAQ_HYBRID_ALPHA", "0.8"))
+FAQ_PER_PAGE = typesense_search.PROFILES[COLLECTION_FAQ]["per_page"]
+
+QUERY_EMBEDDINGS = TTLCache(
+    "faq_query_embeddings",
+    max_items=int(os.getenv("FAQ_EMBED_CACHE_MAX_ITEMS", "2048")),
+    default_ttl=float(os.getenv("FAQ_EMBED_CACHE_TTL", "86400")),
+)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_BM25_K1, _BM25_B = 1.2, 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if len(t) > 1]
+
+
+class _Snapshot:
+    def __init__(self, docs: List[Dict[str, Any]]) -> None:
+        self.docs = docs
+        self.items = [typesense_search._map_faq(d) for d in docs]
+        # Lexicaal: termfrequenties per document + idf
+        self.tfs: List[Counter] = []
+        df: Counter = Counter()
+        for d in docs:
+            tf = Counter(tokenize(d.get("vraag") or "") * 2 + tokenize(d.get("antwoord") or ""))
+            self.tfs.append(tf)
+            df.update(tf.keys())
+        n = len(docs) or 1
+        self.idf = {t: math.log(1 + (n - c + 0.5) / (c + 0.5)) for t, c in df.items()}
+        self.lengths = [sum(tf.values()) for tf in self.tfs]
+        self.avg_len = (sum(self.lengths) / n) or 1.0
+        # Vector: alleen als elk document een embedding van dezelfde lengte heeft
+        vectors = [d.get("embedding") for d in docs]
+        self.dim = len(vectors[0]) if vectors and vectors[0] else 0
+        self.matrix: Any = None
+        if self.dim and all(isinstance(v, list) and len(v) == self.dim for v in vectors):
+            self.matrix = _normalized_matrix(vectors)
+        for d in docs:
+            d.pop("embedding", None)
+        self.synced_at = time.time()
+
+
+_SNAPSHOT: Optional[_Snapshot] = None
+_LOCK = threading.Lock()
+_WAKE = threading.Event()
+_THREAD: Optional[threading.Thread] = None
+
+STATS = {"hits": 0, "fallbacks": 0, "vector_queries": 0, "embed_errors": 0,
+         "syncs": 0, "sync_errors": 0, "last_sync_ms": 0}
+
+
+# --- Vectoren ---
+def _normalize(v: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in v)) or 1.0
+    return [x / norm for x in v]
+
+
+def _normalized_matrix(vectors: List[List[float]]) -> Any:
+    if np is not None:
+        m = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return m / norms
+    return [_normalize(v) for v in vectors]
+
+
+def _cosines(matrix: Any, query: List[float]) -> List[float]:
+    q = _normalize(query)
+    if np is not None:
+        return (matrix @ np.asarray(q, dtype=np.float32)).tolist()
+    return [sum(a * b for a, b in zip(row, q)) for row in matrix]
+
+
+def _embed(texts: List[str]) -> List[List[float]]:
+    from openai import OpenAI  # alleen nodig als FAQ_EMBED_MODEL gezet is
+    resp = OpenAI(**cassette.openai_kwargs()).embeddings.create(model=FAQ_EMBED_MODEL, input=texts)
+    return [list(d.embedding) for d in resp.data]
+
+
+def _query_vector(q: str) -> Optional[List[float]]:
+    key = re.sub(r"\s+", " ", q.strip().lower())
+    hit = QUERY_EMBEDDINGS.get(key)
+    if hit is not MISS:
+        return hit
+    try:
+        vec = _embed([q])[0]
+    except Exception as e:
+        STATS["embed_errors"] += 1
+        print(f"[FAQ][index] embed error: {e}", flush=True)
+        return None
+    QUERY_EMBEDDINGS.set(key, vec)
+    return vec
+
+
+# --- Sync ---
+def _export_url() -> Optional[str]:
+    url = typesense_search.TYPESENSE_API_URL
+    if not url:
+        return None
+    base = url.rstrip("/").rsplit("/multi_search", 1)[0]
+    return f"{base}/collections/{COLLECTION_FAQ}/documents/export"
+
+
+def _export() -> List[Dict[str, Any]]:
+    """Alle FAQ-documenten via de JSONL-export van Typesense."""
+    url = _export_url()
+    if not url or not typesense_search.TYPESENSE_API_KEY:
+        raise RuntimeError("Typesense niet geconfigureerd")
+    # Embeddings alleen meenemen als er een querymodel is om ze mee te vergelijken
+    fields = "vraag,antwoord,locatie" + (",embedding" if FAQ_EMBED_MODEL else "")
+    r = http_client.get("typesense", url, params={"include_fields": fields}, headers=typesense_search.headers())
+    if r.status_code != 200:
+        raise RuntimeError(f"status={r.status_code}")
+    return [json.loads(line) for line in r.text.splitlines() if line.strip()]
+
+
+def sync() -> None:
+    """Bouw een nieuwe snapshot en wissel hem atomisch in."""
+    global _SNAPSHOT
+    t0 = time.time()
+    try:
+        docs = [d for d in _export() if d.get("vraag") or d.get("antwoord")]
+        if FAQ_EMBED_MODEL and docs and not all(d.get("embedding") for d in docs):
+            # Export zonder embeddings → zelf embedden met hetzelfde model
+            texts = [f"{d.get('vraag') or ''}\n{d.get('antwoord') or ''}" for d in docs]
+            vectors: List[List[float]] = []
+            for i in range(0, len(texts), 100):
+                vectors.extend(_embed(texts[i:i + 100]))
+            for d, v in zip(docs, vectors):
+                d["embedding"] = v
+        snap = _Snapshot(docs)
+    except Exception as e:
+        STATS["sync_errors"] += 1
+        print(f"[FAQ][index] sync error: {e}", flush=True)
+        return
+
+    _SNAPSHOT = snap
+    STATS["syncs"] += 1
+    STATS["last_sync_ms"] = int((time.time() - t0) * 1000)
+    print(
+        f"[FAQ][index] synced docs={len(snap.docs)} vectors={snap.matrix is not None} "
+        f"dur_ms={STATS['last_sync_ms']}",
+        flush=True,
+    )
+
+
+def _loop() -> None:
+    while True:
+        sync()
+        _WAKE.wait(FAQ_SYNC_INTERVAL)
+        _WAKE.clear()
+
+
+def ensure_started() -> None:
+    """Start de sync-thread één keer (no-op als FAQ_INDEX=0)."""
+    global _THREAD
+    if not FAQ_INDEX_ENABLED or _THREAD is not None:
+        return
+    with _LOCK:
+        if _THREAD is None:
+            _THREAD = threading.Thread(target=_loop, name="faq-index-sync", daemon=True)
+            _THREAD.start()
+
+
+def request_sync() -> None:
+    """Laat de achtergrondjob direct opnieuw exporteren (bijv. na een herindexering)."""
+    _WAKE.set()
+
+
+# --- Zoeken ---
+def _bm25(snap: _Snapshot, terms: List[str]) -> List[Tuple[float, int]]:
+    scored = []
+    for i, tf in enumerate(snap.tfs):
+        score = 0.0
+        norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * snap.lengths[i] / snap.avg_len)
+        for t in terms:
+            f = tf.get(t)
+            if f:
+                score += snap.idf[t] * f * (_BM25_K1 + 1) / (f + norm)
+        if score > 0:
+            scored.append((score, i))
+    scored.sort(reverse=True)
+    return scored
+
+
+def rank(snap: _Snapshot, q: str, vector: Optional[List[float]]) -> List[int]:
+    """Documentposities op volgorde: rank fusion van BM25 en cosine (alpha = vectorgewicht)."""
+    lexical = _bm25(snap, list(dict.fromkeys(tokenize(q))))
+    if vector is None or snap.matrix is None or len(vector) != snap.dim:
+        return [i for _, i in lexical]
+
+    cos = _cosines(snap.matrix, vector)
+    by_vector = sorted(range(len(cos)), key=lambda i: cos[i], reverse=True)
+    fused: Dict[int, float] = {}
+    for r, (_, i) in enumerate(lexical):
+        fused[i] = (1 - FAQ_HYBRID_ALPHA) / (r + 1)
+    for r, i in enumerate(by_vector):
+        fused[i] = fused.get(i, 0.0) + FAQ_HYBRID_ALPHA / (r + 1)
+    return sorted(fused, key=lambda i: fused[i], reverse=True)
+
+
+def search(params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """FAQ-items voor build_faq_params-parameters, of None → Typesense (zie module-docstring)."""
+    snap = _SNAPSHOT
+    if not FAQ_INDEX_ENABLED or snap is None:
+        STATS["fallbacks"] += 1
+        return None
+    q = (params.get("q") or "").strip()
+    if not q:
+        return []
+    vector = None
+    if FAQ_EMBED_MODEL and snap.matrix is not None:
+        vector = _query_vector(q)
+        if vector is None:
+            # Alleen BM25 zou stil slechter zoeken dan Typesense' hybride zoekvraag
+            STATS["fallbacks"] += 1
+            return None
+        STATS["vector_queries"] += 1
+    out = [snap.items[i] for i in rank(snap, q, vector) if snap.items[i] is not None]
+    if not out:
+        STATS["fallbacks"] += 1
+        return None
+    STATS["hits"] += 1
+    return [dict(item) for item in out[:FAQ_PER_PAGE]]
+
+
+def stats() -> Dict[str, Any]:
+    snap = _SNAPSHOT
+    return {
+        **STATS,
+        "enabled": FAQ_INDEX_ENABLED,
+        "docs": len(snap.docs) if snap else 0,
+        "vectors": bool(snap and snap.matrix is not None),
+        "numpy": np is not None,
+        "age_s": int(time.time() - snap.synced_at) if snap else None,
+        "query_embeddings": QUERY_EMBEDDINGS.stats(),
+    }
+
+
+metrics.register("faq_index", stats)
@@ -0,0 +1,84 @@
+# services/filter_delta.py
+"""
+Filters uit het filterpaneel als delta op de vorige toolcall.
+
+/apply_filters stuurt "[FILTER] Indeling: x||Taal: y" (collectie) of
+"[FILTER] Locatie: ..||Leeftijd: ..||Wanneer: ..||Type: .." (agenda). In
+plaats van het model de zoekparameters opnieuw te laten bedenken, worden de
+filters hier op de opgeslagen argumenten van de vorige toolcall gelegd; de
+intent_router voert de beurt daarna zonder modelcall uit.
+
+Geen vorige toolcall, een onbekend filter of een filter dat niet bij de
+vorige tool past → None, en het model beslist zoals voorheen.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.oba_config import AGENDA_LOCATIONS, IND_ALL, LANG_HINTS
+
+_PREFIX = re.compile(r"^\s*\[FILTER\]\s*", re.I)
+
+BOOK_KEYS = {"indeling", "taal", "locatie"}
+AGENDA_KEYS = {"locatie", "leeftijd", "wanneer", "type"}
+
+
+def parse(filter_text: str) -> Dict[str, List[str]]:
+    """'[FILTER] Indeling: a||Indeling: b||Taal: c' → {'indeling': [a, b], 'taal': [c]}."""
+    out: Dict[str, List[str]] = {}
+    for part in _PREFIX.sub("", filter_text or "").split("||"):
+        key, sep, value = part.partition(":")
+        if not sep or not value.strip():
+            continue
+        out.setdefault(key.strip().lower(), []).append(value.strip())
+    return out
+
+
+def _books(args: Dict[str, Any], filters: Dict[str, List[str]]) -> Optional[Dict[str, Any]]:
+    new = dict(args)
+    if "indeling" in filters:
+        if not all(v in IND_ALL for v in filters["indeling"]):
+            return None
+        new["indeling"] = filters["indeling"]
+    if "taal" in filters:
+        lang = filters["taal"][-1]
+        if lang not in LANG_HINTS:
+            return None
+        new["filters"] = {**(args.get("filters") or {}), "language": lang}
+    if "locatie" in filters:
+        new["location_kraaiennest"] = "kraaiennest" in filters["locatie"][-1].lower()
+    return new
+
+
+def _agenda(args: Dict[str, Any], filters: Dict[str, List[str]]) -> Optional[Dict[str, Any]]:
+    # Expliciete facetten → scenario A (verfijning), ook na een scenario-B zoekvraag
+    new = {**args, "scenario": "A"}
+    if "locatie" in filters:
+        waar = AGENDA_LOCATIONS.get(filters["locatie"][-1])
+        if waar is None:
+            return None
+        new["waar"] = waar
+    if "leeftijd" in filters:
+        new["leeftijd"] = filters["leeftijd"][-1]
+    if "wanneer" in filters:
+        new["wanneer"] = filters["wanneer"][-1]
+    if "type" in filters:
+        new["type_activiteit"] = filters["type"][-1]
+    return new
+
+
+def apply(last_tool: Optional[Dict[str, Any]], filter_text: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(toolnaam, nieuwe argumenten) voor deze filters, of None als het model moet beslissen."""
+    if not last_tool:
+        return None
+    filters = parse(filter_text)
+    if not filters:
+        return None
+    name, args = last_tool.get("name"), last_tool.get("args") or {}
+
+    if name == "build_search_params" and set(filters) <= BOOK_KEYS:
+        new = _books(args, filters)
+    elif name == "build_agenda_query" and set(filters) <= AGENDA_KEYS:
+        new = _agenda(args, filters)
+    else:
+        return None
+    return (name, new) if new is not None else None
@@ -0,0 +1,134 @@
+# services/http_client.py
+"""
+Gedeelde upstream HTTP-laag.
+
+Eén `requests.Session` per upstream (Typesense, OBA API), met een eigen
+connection pool, keep-alive, retry/backoff-beleid en standaard timeout.
+Sessies worden lazy aangemaakt en daarna door alle threads gedeeld.
+"""
+import os
+import threading
+from typing import Any, Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services import cassette, deadline
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# --- Beleid per upstream ---
+# pool_connections: aantal hosts per upstream dat in de pool bewaard blijft
+# pool_maxsize:     max. open verbindingen per host (≈ aantal gelijktijdige threads)
+# retries/backoff:  alleen bij verbindingsfouten en 502/503/504
+# timeout:          (connect, read) in seconden
+UPSTREAMS: Dict[str, Dict[str, Any]] = {
+    "typesense": {
+        "pool_connections": _env_int("TYPESENSE_POOL_CONNECTIONS", 2),
+        "pool_maxsize": _env_int("TYPESENSE_POOL_MAXSIZE", 20),
+        "retries": _env_int("TYPESENSE_RETRIES", 2),
+        "backoff": _env_float("TYPESENSE_BACKOFF", 0.2),
+        # Typesense multi_search is een POST maar wel idempotent
+        "retry_methods": frozenset({"GET", "POST"}),
+        "timeout": (
+            _env_float("TYPESENSE_CONNECT_TIMEOUT", 3.05),
+            _env_float("TYPESENSE_READ_TIMEOUT", 10),
+        ),
+    },
+    "oba": {
+        "pool_connections": _env_int("OBA_POOL_CONNECTIONS", 2),
+        "pool_maxsize": _env_int("OBA_POOL_MAXSIZE", 20),
+        "retries": _env_int("OBA_RETRIES", 2),
+        "backoff": _env_float("OBA_BACKOFF", 0.3),
+        "retry_methods": frozenset({"GET"}),
+        "timeout": (
+            _env_float("OBA_CONNECT_TIMEOUT", 3.05),
+            _env_float("OBA_READ_TIMEOUT", 15),
+        ),
+    },
+}
+
+_SESSIONS: Dict[str, requests.Session] = {}
+_LOCK = threading.Lock()
+
+
+class _DeadlineRetry(Retry):
+    """Retry die geen nieuwe poging meer doet als de deadline van de beurt verstreken is."""
+
+    def is_exhausted(self) -> bool:
+        return deadline.expired() or super().is_exhausted()
+
+
+def _build_session(upstream: str, policy: Dict[str, Any]) -> requests.Session:
+    retry = _DeadlineRetry(
+        total=policy["retries"],
+        connect=policy["retries"],
+        read=policy["retries"],
+        status=policy["retries"],
+        backoff_factor=policy["backoff"],
+        status_forcelist=(502, 503, 504),
+        allowed_methods=policy["retry_methods"],
+        raise_on_status=False,
+    )
+    adapter = cassette.wrap_adapter(
+        HTTPAdapter(
+            pool_connections=policy["pool_connections"],
+            pool_maxsize=policy["pool_maxsize"],
+            max_retries=retry,
+        ),
+        upstream,
+    )
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def get_session(upstream: str) -> requests.Session:
+    """Geef de gedeelde sessie voor `upstream` terug (thread-safe, lazy)."""
+    s = _SESSIONS.get(upstream)
+    if s is not None:
+        return s
+    with _LOCK:
+        s = _SESSIONS.get(upstream)
+        if s is None:
+            s = _build_session(upstream, UPSTREAMS[upstream])
+            _SESSIONS[upstream] = s
+        return s
+
+
+def request(upstream: str, method: str, url: str, **kwargs: Any) -> requests.Response:
+    """Voer een request uit via de pool van `upstream`, met diens standaard timeout (begrensd door de deadline)."""
+    if "timeout" not in kwargs:
+        kwargs["timeout"] = deadline.http_timeout(UPSTREAMS[upstream]["timeout"])
+    return get_session(upstream).request(method, url, **kwargs)
+
+
+def get(upstream: str, url: str, **kwargs: Any) -> requests.Response:
+    return request(upstream, "GET", url, **kwargs)
+
+
+def post(upstream: str, url: str, **kwargs: Any) -> requests.Response:
+    return request(upstream, "POST", url, **kwargs)
+
+
+def close_all() -> None:
+    """Sluit alle sessies (bijv. bij afsluiten van een worker)."""
+    with _LOCK:
+        for s in _SESSIONS.values():
+            s.close()
+        _SESSIONS.clear()
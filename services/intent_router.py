@@ -0,0 +1,187 @@
+# services/intent_router.py
+"""
+Deterministische pre-router vóór de eerste modelcall.
+
+Eenduidige invoer heeft geen toolkeuze van MODEL nodig:
+- "help" / "hulp"                     → vaste helptekst, geen tool
+- een titel tussen aanhalingstekens   → build_search_params op short_title
+- "boeken van/door <Auteur>"          → build_search_params op main_author
+- "[FILTER] …" (apply_filters)        → filters als delta op de vorige
+                                        toolcall (zie filter_delta)
+Elke regel geeft een confidence; alleen vanaf ROUTER_MIN_CONFIDENCE wordt
+de beurt lokaal afgehandeld, anders beslist het model zoals altijd.
+
+De beurt wordt daarna als gewone toolbeurt verwerkt; `synthetic_items`
+levert de user message + function_call voor de conversatie, zodat de
+geschiedenis er hetzelfde uitziet als na een modelgekozen toolcall.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from typing import Any, Dict, List, Optional
+
+from services import filter_delta, metrics, usage
+
+logger = logging.getLogger("oba_app")
+
+ROUTER_ENABLED = os.getenv("INTENT_ROUTER", "1") == "1"
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.8"))
+
+# HELP_MSG is Nederlands: andere talen gaan naar het model (antwoord in de taal van de gebruiker)
+_HELP = re.compile(r"^\s*(help|hulp|\?)\s*[!?.]*\s*$", re.I)
+_QUOTED = re.compile(r"[\"“”„'‘’]([^\"“”„'‘’]{2,120})[\"“”„'‘’]")
+_TITLE_PREFIX = re.compile(r"^\s*(het boek|boek|titel|de titel|the book|title)\s*:?\s*$", re.I)
+_AUTHOR = re.compile(
+    r"^\s*(?:(?:alle|de)\s+)?(?:boeken|boek|romans?|werk|books?|novels?)\s+(?:van|door|by|von|de)\s+"
+    r"(?:(?:de\s+)?(?:schrijver|auteur|author)\s+)?(?P<name>[^\d?!,;:]{2,60}?)\s*[?!.]?\s*$",
+    re.I,
+)
+_NAME_PART = re.compile(r"^(?:[A-ZÀ-Ý][\w'’.-]*|van|de|der|den|ten|ter|von|le|la|du|\w\.)$")
+_FILTER = re.compile(r"^\s*\[FILTER\]", re.I)
+# Woorden die op iets anders dan een simpele titel-/auteurzoekvraag wijzen
+_AMBIGUOUS = re.compile(
+    r"\b(agenda|activiteit\w*|workshop\w*|evenement\w*|lidmaatschap|openingstijd\w*|"
+    r"lenen|verlengen|boete|vergelijk\w*|verschil|over|zoals|lijkt op|tips?)\b",
+    re.I,
+)
+
+_LOCK = threading.Lock()
+# routed: lokaal afgehandeld; fallback: regel te onzeker; unmatched: geen regel (beide → model of decision_cache)
+STATS: Dict[str, Any] = {"routed": 0, "fallback": 0, "unmatched": 0, "saved_ms_est": 0, "by_intent": {}}
+
+
+def _author(text: str) -> Optional[Dict[str, Any]]:
+    m = _AUTHOR.match(text)
+    if not m:
+        return None
+    name = m.group("name").strip()
+    parts = name.split()
+    if not 1 <= len(parts) <= 5:
+        return None
+    # Hoofdletters zoals bij een naam → zeker; anders twijfel ("boeken van vroeger")
+    conf = 0.9 if all(_NAME_PART.match(p) for p in parts) and parts[-1][:1].isupper() else 0.5
+    return {
+        "intent": "author",
+        "tool": "build_search_params",
+        "args": {"user_query": name, "query_by_choice": "main_author"},
+        "confidence": conf,
+    }
+
+
+def _title(text: str) -> Optional[Dict[str, Any]]:
+    m = _QUOTED.search(text)
+    if not m:
+        return None
+    title = m.group(1).strip()
+    rest = (text[: m.start()] + text[m.end():]).strip()
+    if not rest:
+        conf = 0.95
+    elif _TITLE_PREFIX.match(rest):
+        conf = 0.9
+    else:
+        # Titel met vrije tekst eromheen: het model bepaalt wat er gevraagd wordt
+        conf = 0.5
+    return {
+        "intent": "title",
+        "tool": "build_search_params",
+        "args": {"user_query": title, "query_by_choice": "short_title"},
+        "confidence": conf,
+    }
+
+
+def classify(user_text: str, last_tool: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Beste regel voor deze invoer (met confidence), of None."""
+    text = (user_text or "").strip()
+    if not text:
+        return None
+    if _HELP.match(text):
+        return {"intent": "help", "tool": None, "args": {}, "confidence": 1.0}
+    if _FILTER.match(text):
+        # Zonder (passende) vorige toolcall is een filter niet lokaal toe te passen
+        delta = filter_delta.apply(last_tool, text)
+        if delta is None:
+            return {"intent": "filter", "tool": None, "args": {}, "confidence": 0.0}
+        return {"intent": "filter", "tool": delta[0], "args": delta[1], "confidence": 1.0}
+
+    candidates = [c for c in (_title(text), _author(text)) if c]
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda c: c["confidence"])
+    if _AMBIGUOUS.search(_QUOTED.sub(" ", text)):
+        best["confidence"] -= 0.3
+    return best
+
+
+def route(user_text: str, last_tool: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Route bij voldoende zekerheid; None = laat het model kiezen."""
+    if not ROUTER_ENABLED:
+        return None
+    hit = classify(user_text, last_tool)
+    if hit is None:
+        with _LOCK:
+            STATS["unmatched"] += 1
+        return None
+    if hit["confidence"] < ROUTER_MIN_CONFIDENCE:
+        with _LOCK:
+            STATS["fallback"] += 1
+        return None
+
+    saved = usage.avg_latency_ms("tools")
+    with _LOCK:
+        STATS["routed"] += 1
+        STATS["saved_ms_est"] += saved
+        STATS["by_intent"][hit["intent"]] = STATS["by_intent"].get(hit["intent"], 0) + 1
+    logger.debug(f"[ROUTER] intent={hit['intent']} conf={hit['confidence']:.2f} saved_ms~{saved}")
+    if hit["tool"]:
+        hit["call_id"] = f"call_router_{uuid.uuid4().hex[:16]}"
+    return hit
+
+
+def heuristic(user_text: str) -> Optional[Dict[str, Any]]:
+    """
+    Noodroute als er geen tijd meer is voor de toolkeuze van MODEL (zie
+    deadline): een boekenzoekvraag op de invoer zelf, met de query_by-heuristiek
+    van build_search_params. None voor filters en lege invoer.
+    """
+    text = (user_text or "").strip()
+    if not text or _FILTER.match(text):
+        return None
+    return {
+        "intent": "heuristic",
+        "tool": "build_search_params",
+        "args": {"user_query": text},
+        "confidence": 0.0,
+        "call_id": f"call_router_{uuid.uuid4().hex[:16]}",
+    }
+
+
+def synthetic_items(user_text: str, routed: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """User message (+ function_call) zoals het model ze in de conversatie had gezet."""
+    items: List[Dict[str, Any]] = [{"type": "message", "role": "user", "content": user_text}]
+    if routed.get("tool"):
+        items.append({
+            "type": "function_call",
+            "call_id": routed["call_id"],
+            "name": routed["tool"],
+            "arguments": json.dumps(routed["args"], ensure_ascii=False),
+        })
+    return items
+
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        candidates = STATS["routed"] + STATS["fallback"]
+        turns = candidates + STATS["unmatched"]
+        return {
+            **STATS,
+            "by_intent": dict(STATS["by_intent"]),
+            "not_routed": STATS["fallback"] + STATS["unmatched"],  # toolkeuze via model of decision_cache
+            "routed_share_of_candidates": round(STATS["routed"] / candidates, 4) if candidates else 0.0,
+            "routed_share_of_turns": round(STATS["routed"] / turns, 4) if turns else 0.0,
+        }
+
+
+metrics.register("intent_router", stats)
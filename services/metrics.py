@@ -0,0 +1,156 @@
+# services/metrics.py
+"""
+Latency-spans en tellers per stage van een beurt, als Prometheus-tekst.
+
+Stages (label `stage`):
+- model       Responses-call (`call` = tools | ack), plus model_ttft bij streaming
+- tool_build  toolparameters bouwen (`tool`)
+- fetch       resultaten ophalen voor één toolcall (`tool`, `kind`, `collection`),
+              inclusief cache en lokale indexen
+- upstream    de HTTP-call zelf (`upstream` = typesense | oba, `collection`)
+- xml_parse   agenda-XML parsen (telt niet mee in `upstream`)
+- serialize   envelope/SSE-event naar JSON (`route`)
+- request     hele HTTP-request (`route`, `status`)
+
+`span()` meet een blok, `observe()` een al gemeten duur; `inc()` telt op.
+Subsystemen met een `stats()`-dict (caches, pools, router, ...) melden zich
+met `register()`; hun numerieke waarden verschijnen als gauges
+`<PREFIX>_<subsystem>_<key>` (geneste dicts met `_` aaneengeregen, bools als
+0/1). `render()` geeft alles in het Prometheus text format voor /metrics.
+"""
+import bisect
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+PREFIX = "oba"
+BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_LOCK = threading.Lock()
+# (stage, labels) → [bucket-tellingen..., +Inf, som]
+_HISTOGRAMS: Dict[Labels, List[float]] = {}
+# naam → labels → waarde
+_COUNTERS: Dict[str, Dict[Labels, float]] = {}
+# subsystem → stats()-functie, uitgelezen bij elke render()
+_GAUGES: Dict[str, Callable[[], Dict[str, Any]]] = {}
+_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _labels(tags: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in tags.items() if v is not None and v != ""))
+
+
+def observe(stage: str, seconds: float, **tags: Any) -> None:
+    """Registreer een gemeten duur voor `stage` (tags met None/"" vallen weg)."""
+    if not METRICS_ENABLED:
+        return
+    key = _labels({"stage": stage, **tags})
+    idx = bisect.bisect_left(BUCKETS, seconds)
+    with _LOCK:
+        h = _HISTOGRAMS.get(key)
+        if h is None:
+            h = _HISTOGRAMS[key] = [0.0] * (len(BUCKETS) + 2)
+        h[idx] += 1
+        h[-1] += seconds
+
+
+@contextmanager
+def span(stage: str, **tags: Any) -> Iterator[None]:
+    """Meet de duur van het blok als `stage`; werkt ook rond een `await`."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - t0, **tags)
+
+
+def inc(name: str, value: float = 1, **labels: Any) -> None:
+    """Tel `value` op bij teller `<PREFIX>_<name>_total`."""
+    if not METRICS_ENABLED:
+        return
+    key = _labels(labels)
+    with _LOCK:
+        series = _COUNTERS.setdefault(name, {})
+        series[key] = series.get(key, 0.0) + value
+
+
+def register(subsystem: str, stats_fn: Callable[[], Dict[str, Any]]) -> None:
+    """Toon de numerieke waarden van `stats_fn()` als gauges op /metrics."""
+    _GAUGES[subsystem] = stats_fn
+
+
+def _flatten(prefix: str, stats: Dict[str, Any], out: List[Tuple[str, float]]) -> None:
+    for k, v in stats.items():
+        name = f"{prefix}_{_NAME.sub('_', str(k))}"
+        if isinstance(v, dict):
+            _flatten(name, v, out)
+        elif isinstance(v, (bool, int, float)):
+            out.append((name, float(v)))
+
+
+def _gauge_lines() -> List[str]:
+    lines: List[str] = []
+    for subsystem, fn in sorted(_GAUGES.items()):
+        try:
+            stats = fn()
+        except Exception as e:
+            print(f"[METRICS] stats {subsystem}: {e}", flush=True)
+            continue
+        values: List[Tuple[str, float]] = []
+        _flatten(f"{PREFIX}_{subsystem}", stats, values)
+        for name, value in values:
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_num(value)}")
+    return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(v)
+
+
+def render() -> str:
+    """Alle histogrammen, tellers en subsystem-gauges in het Prometheus text exposition format."""
+    with _LOCK:
+        histograms = {k: list(v) for k, v in _HISTOGRAMS.items()}
+        counters = {n: dict(s) for n, s in _COUNTERS.items()}
+
+    name = f"{PREFIX}_stage_duration_seconds"
+    lines = [
+        f"# HELP {name} Duur per stage van een beurt.",
+        f"# TYPE {name} histogram",
+    ]
+    for labels, h in sorted(histograms.items()):
+        cumulative = 0.0
+        for le, count in zip(BUCKETS, h):
+            cumulative += count
+            lines.append(f"{name}_bucket{_fmt(labels, (('le', _num(le)),))} {_num(cumulative)}")
+        cumulative += h[len(BUCKETS)]
+        lines.append(f"{name}_bucket{_fmt(labels, (('le', '+Inf'),))} {_num(cumulative)}")
+        lines.append(f"{name}_sum{_fmt(labels)} {h[-1]:.6f}")
+        lines.append(f"{name}_count{_fmt(labels)} {_num(cumulative)}")
+
+    for counter, series in sorted(counters.items()):
+        cname = f"{PREFIX}_{counter}_total"
+        lines.append(f"# TYPE {cname} counter")
+        for labels, value in sorted(series.items()):
+            lines.append(f"{cname}{_fmt(labels)} {_num(value)}")
+    lines.extend(_gauge_lines())
+    return "\n".join(lines) + "\n"
+
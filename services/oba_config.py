@@ -6,6 +6,9 @@ COLLECTION_BOOKS    = os.getenv("COLLECTION_BOOKS",    "obadb30725")
 COLLECTION_FAQ      = os.getenv("COLLECTION_FAQ",      "obafaq")
 COLLECTION_EVENTS   = os.getenv("COLLECTION_EVENTS",   "obadbevents")
 
+# OBA API (search/resolver/details); te overschrijven voor een lokale stub (bench/)
+OBA_API_BASE        = os.getenv("OBA_API_BASE",        "https://zoeken.oba.nl/api/v1")
+
 IND_FICTION = [
     "prentenboeken baby",
     "prentenboeken tot 4 jaar",
@@ -27,6 +30,37 @@ IND_ALL = IND_FICTION + IND_NONFICTION
 
 LANG_HINTS = ["Nederlands", "Engels", "Duits", "Frans", "Spaans", "Turks", "Arabisch"]
 
+# Locatiewaarden uit het agendafilter (static/html/filteragenda.html) → `waar`
+AGENDA_LOCATIONS = {
+    "centrale-oba": "Centrale OBA",
+    "oba-banne": "OBA Banne",
+    "oba-bijlmer": "OBA Bijlmer",
+    "oba-bos-en-lommer": "OBA Bos en Lommer",
+    "oba-buitenveldert": "OBA Buitenveldert",
+    "oba-cc-amstel": "OBA CC Amstel",
+    "oba-de-hallen": "OBA De Hallen",
+    "oba-duivendrecht": "OBA Duivendrecht",
+    "oba-geuzenveld": "OBA Geuzenveld",
+    "oba-ijburg": "OBA IJburg",
+    "oba-mercatorplein": "OBA Mercatorplein",
+    "oba-molenwijk": "OBA Molenwijk",
+    "oba-nextlab-kraaiennest": "OBA Next Lab Kraaiennest",
+    "oba-nextlab-sluisbuurt": "OBA Next Lab Sluisbuurt",
+    "oba-olympisch-kwartier": "OBA Olympisch Kwartier",
+    "oba-osdorp": "OBA Osdorp",
+    "oba-ouderkerk": "OBA Ouderkerk",
+    "oba-postjesweg": "OBA Postjesweg",
+    "oba-punt-ganzenhoef": "OBA punt Ganzenhoef",
+    "oba-reigersbos": "OBA Reigersbos",
+    "oba-roelof-hartplein": "OBA Roelof Hartplein",
+    "oba-slotermeer": "OBA Slotermeer",
+    "oba-spaarndammerbuurt": "OBA Spaarndammerbuurt",
+    "oba-staatsliedenbuurt": "OBA Staatsliedenbuurt",
+    "oba-van-der-pek": "OBA Van der Pek",
+    "oba-waterlandplein": "OBA Waterlandplein",
+    "oba-weesp": "OBA Weesp",
+}
+
 TOOLS: List[Dict[str, Any]] = [
     {
         "type": "function",
@@ -0,0 +1,146 @@
+# services/oba_details.py
+"""
+Boekdetails in één server-side stap: PPN → item_id (resolver) → details.
+
+Beide stappen zijn gecachet:
+- PPN → item_id verandert vrijwel nooit (lange TTL)
+- het getrimde detaildocument heeft een kortere TTL; daarna wordt het met
+  If-None-Match / If-Modified-Since bij de OBA API gerevalideerd
+"""
+import os
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Optional
+
+from services import http_client
+from services.cache import MISS, TTLCache
+from services.oba_config import OBA_API_BASE
+
+OBA_API_KEY = os.getenv("OBA_API_KEY", "")
+
+RESOLVER_CACHE = TTLCache(
+    "resolver",
+    max_items=int(os.getenv("RESOLVER_CACHE_MAX_ITEMS", "20000")),
+    default_ttl=float(os.getenv("RESOLVER_CACHE_TTL", "86400")),
+)
+DETAIL_CACHE = TTLCache(
+    "details",
+    max_items=int(os.getenv("DETAIL_CACHE_MAX_ITEMS", "5000")),
+    default_ttl=float(os.getenv("DETAIL_CACHE_TTL", "3600")),
+)
+# Verlopen details + validators, voor conditionele revalidatie
+DETAIL_VALIDATORS = TTLCache(
+    "details_validators",
+    max_items=int(os.getenv("DETAIL_CACHE_MAX_ITEMS", "5000")),
+    default_ttl=float(os.getenv("DETAIL_VALIDATOR_TTL", "86400")),
+)
+
+
+def _first(val: Any) -> Optional[str]:
+    if isinstance(val, list):
+        val = val[0] if val else None
+    if isinstance(val, str) and val.strip():
+        return val.strip()
+    return None
+
+
+def trim_details(detail_json: Dict[str, Any]) -> Dict[str, Any]:
+    """Alleen wat de detailpagina toont: titel, samenvatting, cover."""
+    rec = (detail_json or {}).get("record") or {}
+    return {
+        "title": _first(rec.get("titles")),
+        "summary": _first(rec.get("summaries")) or _first(rec.get("description")),
+        "cover": _first(rec.get("coverimages")),
+    }
+
+
+def resolver_url(ppn: str) -> str:
+    return f"{OBA_API_BASE}/resolver/ppn/?id={ppn}&authorization={OBA_API_KEY}"
+
+
+def details_url(item_id: str) -> str:
+    return f"{OBA_API_BASE}/details/?id=|oba-catalogus|{item_id}&authorization={OBA_API_KEY}&output=json"
+
+
+def parse_item_id(content: bytes) -> Optional[str]:
+    """Haal item_id (derde deel van '|oba-catalogus|<id>') uit de resolver-XML."""
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError as e:
+        print(f"[DETAIL][resolver] XML parse error: {e}", flush=True)
+        return None
+    parts = (root.findtext(".//itemid") or "").split("|")
+    return parts[2] if len(parts) > 2 and parts[2] else None
+
+
+def validator_headers(stale: Any) -> Dict[str, str]:
+    """Conditionele request-headers op basis van een verlopen cache-entry."""
+    headers: Dict[str, str] = {}
+    if stale is not MISS:
+        if stale.get("etag"):
+            headers["If-None-Match"] = stale["etag"]
+        if stale.get("last_modified"):
+            headers["If-Modified-Since"] = stale["last_modified"]
+    return headers
+
+
+def store_details(item_id: str, status: int, headers: Any, body: Any, stale: Any) -> Optional[Dict[str, Any]]:
+    """Verwerk een details-response (200/304) en werk beide caches bij."""
+    if status == 304 and stale is not MISS:
+        doc = stale["doc"]
+        DETAIL_VALIDATORS.set(item_id, stale)
+    elif status == 200:
+        try:
+            doc = trim_details(body())
+        except ValueError as e:
+            print(f"[DETAIL][details] JSON decode error: {e}", flush=True)
+            return None
+        DETAIL_VALIDATORS.set(item_id, {
+            "doc": doc,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        })
+    else:
+        print(f"[DETAIL][details] item_id={item_id} status={status}", flush=True)
+        return None
+
+    DETAIL_CACHE.set(item_id, doc)
+    return doc
+
+
+def resolve_item_id(ppn: str) -> Optional[str]:
+    """PPN → item_id, gecachet."""
+    cached = RESOLVER_CACHE.get(ppn)
+    if cached is not MISS:
+        return cached
+
+    r = http_client.get("oba", resolver_url(ppn))
+    if r.status_code != 200:
+        print(f"[DETAIL][resolver] ppn={ppn} status={r.status_code}", flush=True)
+        return None
+
+    item_id = parse_item_id(r.content)
+    if item_id:
+        RESOLVER_CACHE.set(ppn, item_id)
+    return item_id
+
+
+def fetch_details(item_id: str) -> Optional[Dict[str, Any]]:
+    """Getrimde details voor `item_id`, gecachet met conditionele revalidatie."""
+    cached = DETAIL_CACHE.get(item_id)
+    if cached is not MISS:
+        return cached
+
+    stale = DETAIL_VALIDATORS.get(item_id)
+    r = http_client.get("oba", details_url(item_id), headers=validator_headers(stale))
+    return store_details(item_id, r.status_code, r.headers, r.json, stale)
+
+
+def get_book_detail(ppn: str) -> Optional[Dict[str, Any]]:
+    """Resolver + details in één stap. None als het boek niet gevonden wordt."""
+    item_id = resolve_item_id(ppn)
+    if not item_id:
+        return None
+    doc = fetch_details(item_id)
+    if doc is None:
+        return None
+    return {"ppn": ppn, "item_id": item_id, **doc}
@@ -1,13 +1,17 @@
 # services/oba_helpers.py
 import os
 import json
-import requests
+import logging
+import time
 import xml.etree.ElementTree as ET
 from typing import Any, Dict, List, Optional
 
+from services import deadline, faq_index, http_client, metrics, typesense_search
+from services.cache import MISS, TTLCache
+
+logger = logging.getLogger("oba_app")
+
 # --- ENV ---
-TYPESENSE_API_URL = os.getenv("TYPESENSE_API_URL")
-TYPESENSE_API_KEY = os.getenv("TYPESENSE_API_KEY")
 OBA_API_KEY       = os.getenv("OBA_API_KEY", "")
 
 
@@ -49,205 +53,189 @@ def make_envelope(
 
 # --- Typesense ---
 def typesense_search_books(params: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Best-effort Typesense search (books)."""
-    print("Doing a Typesense search...")
-    if not TYPESENSE_API_URL or not TYPESENSE_API_KEY:
-        return []
-
-    body = {"searches": [{
-        "q": params.get("q"),
-        "query_by": params.get("query_by"),
-        "collection": params.get("collection"),
-        "prefix": "false",
-        "vector_query": params.get("vector_query"),
-        "include_fields": "*",
-        "per_page": 15,
-        "filter_by": params.get("filter_by"),
-    }]}
-
-    print(f"[TS] POST {TYPESENSE_API_URL}")
-    print(f"[TS] Request body: {body}", flush=True)
-
-    try:
-        r = requests.post(
-            TYPESENSE_API_URL,
-            json=body,
-            headers={"Content-Type": "application/json", "X-TYPESENSE-API-KEY": TYPESENSE_API_KEY},
-            timeout=15,
-        )
-        if r.status_code != 200:
-            print(f"[TS] Error body: {r.text[:500]}", flush=True)
-            return []
-        hits = r.json().get("results", [{}])[0].get("hits", [])
-        print(f"[TS] Collection={body['searches'][0]['collection']} hits={len(hits)}", flush=True)
-        if hits:
-            print(f"[TS] First doc keys: {list(hits[0].get('document', {}).keys())}", flush=True)
-        out = []
-        for h in hits:
-            doc = h.get("document") or {}
-            out.append({"ppn": doc.get("ppn"), "short_title": doc.get("short_title")})
-        return out
-    except Exception:
-        return []
+    """Best-effort Typesense search (books). Returns [{ppn, short_title}, ...]."""
+    return typesense_search.search(params)
 
 
 def typesense_search_faq(params: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Best-effort Typesense search (FAQ). Returns [{vraag, antwoord, location?}, ...]."""
-    if not TYPESENSE_API_URL or not TYPESENSE_API_KEY:
-        return []
-
-    body = {"searches": [{
-        "q": params.get("q"),
-        "query_by": params.get("query_by"),
-        "collection": params.get("collection"),
-        "prefix": "false",
-        "vector_query": params.get("vector_query") or "",
-        "include_fields": "*",
-        "per_page": 15,
-        "filter_by": params.get("filter_by") or "",
-    }]}
-    try:
-        r = requests.post(
-            TYPESENSE_API_URL,
-            json=body,
-            headers={"Content-Type": "application/json", "X-TYPESENSE-API-KEY": TYPESENSE_API_KEY},
-            timeout=15,
-        )
-        if r.status_code != 200:
-            return []
-        hits = r.json().get("results", [{}])[0].get("hits", [])
-        out: List[Dict[str, Any]] = []
-        for h in hits:
-            doc = h.get("document") or {}
-            vraag = doc.get("vraag")
-            antwoord = doc.get("antwoord")
-
-            # Locatie kan komma-gescheiden zijn, alleen eerste nodig
-            raw_loc = doc.get("locatie")
-            first_location: Optional[str] = None
-            if isinstance(raw_loc, str) and raw_loc.strip():
-                first_location = raw_loc.split(",")[0].strip()
-
-            if vraag or antwoord:
-                out.append({
-                    "vraag": vraag,
-                    "antwoord": antwoord,
-                    "location": first_location,
-                })
-        return out
-    except Exception:
-        return []
+    """FAQ uit de lokale index; anders (zie faq_index.search) Typesense. Returns [{vraag, antwoord, location?}, ...]."""
+    local = faq_index.search(params)
+    if local is not None:
+        return local
+    return typesense_search.search(params)
 
 
 def typesense_search_events(params: Dict[str, Any]) -> List[Dict[str, Any]]:
-    
-    if not TYPESENSE_API_URL or not TYPESENSE_API_KEY:
-        return []
+    """Best-effort Typesense search (events). Returns agenda-items zoals fetch_agenda_results."""
+    return typesense_search.search(params)
 
-    body = {
-        "searches": [{
-            "q": params.get("q"),
-            "query_by": params.get("query_by"),
-            "collection": params.get("collection"),
-            "prefix": "false",
-            "vector_query": params.get("vector_query") or "",
-            "include_fields": "*",
-            "per_page": 15,
-            "filter_by": params.get("filter_by") or "",
-        }]
-    }
 
-    try:
-        r = requests.post(
-            TYPESENSE_API_URL,
-            json=body,
-            headers={
-                "Content-Type": "application/json",
-                "X-TYPESENSE-API-KEY": TYPESENSE_API_KEY,
-            },
-            timeout=15,
-        )
-        if r.status_code != 200:
-            return []
-
-        hits = r.json().get("results", [{}])[0].get("hits", [])
-        out: List[Dict[str, Any]] = []
-
-        for h in hits:
-            doc = h.get("document") or {}
-
-            start = doc.get("starttijd")
-            end = doc.get("eindtijd")
-
-         
-            title = doc.get("titel") or "Geen titel"
-            summary = doc.get("samenvatting") or ""
-            cover = doc.get("afbeelding") or ""
-            link = doc.get("deeplink") or "#"
-            location = doc.get("locatienaam") or doc.get("gebouw") or "Locatie onbekend"
-            
-            out.append({
-                "title": title,
-                "summary": summary,
-                "cover": cover,
-                "link": link,
-                "date": start,
-                "time": "",
-                "location": location,
-                "raw_date": {"start": start, "end": end} if (start or end) else None
-            })
-
-        return out
-
-    except Exception:
-        return []
+# --- OBA Agenda ---
+# Frontend toont 10 items + een "Meer"-knop zodra er meer zijn → 11 is genoeg
+AGENDA_MAX_ITEMS = int(os.getenv("AGENDA_MAX_ITEMS", "11"))
+
+AGENDA_CACHE = TTLCache(
+    "agenda",
+    max_items=int(os.getenv("AGENDA_CACHE_MAX_ITEMS", "256")),
+    default_ttl=float(os.getenv("AGENDA_CACHE_TTL", "300")),
+)
+
+# Directe paden vanaf <result>; ".//"-variant alleen als fallback
+_AGENDA_FIELDS = {
+    "title": "titles/title",
+    "cover": "coverimages/coverimage",
+    "link": "custom/evenement/deeplink",
+    "summary": "summaries/summary",
+    "location": "custom/gebeurtenis/locatienaam",
+}
+
+
+def agenda_field(res: ET.Element, path: str) -> str:
+    txt = res.findtext(path)
+    if txt is None:
+        txt = res.findtext(".//" + path)
+    return (txt or "").strip()
+
+
+def parse_agenda_item(res: ET.Element) -> Dict[str, Any]:
+    item = {k: agenda_field(res, p) for k, p in _AGENDA_FIELDS.items()}
+    item["title"] = item["title"] or "Geen titel"
+    return item
+
+
+class AgendaStreamParser:
+    """
+    Incrementele agenda-XML parser: voer bytes in met `feed()`; verwerkte
+    <result>-nodes worden direct opgeruimd. `feed()` geeft True zodra er
+    `max_items` items binnen zijn en de rest van de response niet meer nodig is.
+    """
+
+    def __init__(self, max_items: int = AGENDA_MAX_ITEMS):
+        self.max_items = max_items
+        self.items: List[Dict[str, Any]] = []
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack: List[ET.Element] = []
+        self.parse_s = 0.0  # tijd in de parser zelf, los van het wachten op bytes
+        self.truncated = False  # gestopt door de deadline: items zijn een deel (niet cachen)
+
+    def feed(self, chunk: bytes) -> bool:
+        t0 = time.perf_counter()
+        try:
+            return self._feed(chunk)
+        finally:
+            self.parse_s += time.perf_counter() - t0
+
+    def _feed(self, chunk: bytes) -> bool:
+        self._parser.feed(chunk)
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._stack.append(elem)
+                continue
+            self._stack.pop()
+            if elem.tag != "result":
+                continue
+            self.items.append(parse_agenda_item(elem))
+            elem.clear()
+            if self._stack:
+                self._stack[-1].remove(elem)
+            if len(self.items) >= self.max_items:
+                return True
+        return False
+
+    def close(self) -> None:
+        # Alleen aanroepen als de hele response gelezen is (valideert het einde)
+        self._parser.close()
+
+
+def parse_agenda_stream(stream: Any, max_items: int = AGENDA_MAX_ITEMS, chunk_size: int = 16384) -> List[Dict[str, Any]]:
+    """
+    Parse agenda-XML incrementeel uit een file-achtige stream. Het parsen stopt
+    zodra `max_items` items binnen zijn.
+    """
+    return feed_stream(AgendaStreamParser(max_items), stream, chunk_size)
+
+
+def feed_stream(parser: AgendaStreamParser, stream: Any, chunk_size: int = 16384) -> List[Dict[str, Any]]:
+    """
+    Voer een file-achtige stream aan `parser` tot hij genoeg items heeft of de
+    stream op is. Verstrijkt de deadline van de beurt, dan stopt het lezen met
+    de items die er al zijn.
+    """
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            parser.close()
+            break
+        if parser.feed(chunk):
+            break
+        if deadline.expired() and parser.items:
+            stop_partial(parser)
+            break
+    return parser.items
+
+
+def stop_partial(parser: AgendaStreamParser) -> None:
+    """Markeer een agenda-stream als afgebroken door de deadline."""
+    parser.truncated = True
+    deadline.degrade("partial_results")
+
+
+def agenda_cache_key(api_url: str, max_items: int) -> str:
+    # Cachesleutel = facet-URL zonder API-key
+    return f"agenda:{api_url}|{max_items}"
+
+
+def with_oba_key(api_url: str) -> str:
+    if "authorization=" not in api_url:
+        api_url += ("&" if "?" in api_url else "?") + f"authorization={OBA_API_KEY}"
+    return api_url
 
 
-# --- OBA Agenda ---
-def fetch_agenda_results(api_url: str) -> List[Dict[str, Any]]:
-    """Fetch agenda XML en geef lijst met {title, cover, link, summary} terug."""
+def fetch_agenda_results(api_url: str, max_items: int = AGENDA_MAX_ITEMS) -> List[Dict[str, Any]]:
+    """Fetch agenda XML (streaming, gecachet) en geef lijst met {title, cover, link, summary, location} terug."""
     if not api_url:
         print("[AGENDA][fetch] empty api_url", flush=True)
         return []
 
-    if "authorization=" not in api_url:
-        api_url += ("&" if "?" in api_url else "?") + f"authorization={OBA_API_KEY}"
+    key = agenda_cache_key(api_url, max_items)
+    cached = AGENDA_CACHE.get(key)
+    if cached is not MISS:
+        return list(cached)
 
-    try:
-        print(f"[AGENDA][fetch] GET {api_url}", flush=True)
-        r = requests.get(api_url, timeout=15)
-        print(f"[AGENDA][fetch] status={r.status_code}", flush=True)
-        if r.status_code != 200:
-            print(f"[AGENDA][fetch] body(start)={r.text[:400]!r}", flush=True)
-            return []
+    api_url = with_oba_key(api_url)
 
+    try:
+        logger.debug(f"[AGENDA][fetch] GET {key}")
+        t0 = time.perf_counter()
+        parser = AgendaStreamParser(max_items)
+        r = http_client.get("oba", api_url, stream=True)
         try:
-            root = ET.fromstring(r.text)
-        except Exception as e:
-            print(f"[AGENDA][fetch] XML parse error: {e}", flush=True)
-            print(f"[AGENDA][fetch] body(start)={r.text[:400]!r}", flush=True)
-            return []
-
-        nodes = root.findall(".//result")
-        print(f"[AGENDA][fetch] result nodes={len(nodes)}", flush=True)
-
-        out: List[Dict[str, Any]] = []
-        for res in nodes:
-            title = (res.findtext(".//titles/title") or "").strip() or "Geen titel"
-            cover = (res.findtext(".//coverimages/coverimage") or "").strip()
-            link = (res.findtext(".//custom/evenement/deeplink") or "").strip()
-            summary = (res.findtext(".//summaries/summary") or "").strip()
-            loc = res.findtext(".//custom/gebeurtenis/locatienaam")
-
-            out.append({
-                "title": title,
-                "cover": cover,
-                "link": link,
-                "summary": summary,
-                "location": (loc or "").strip()
-            })
-
-        return out
+            if r.status_code != 200:
+                metrics.inc("upstream_errors", upstream="oba", status=r.status_code)
+                print(f"[AGENDA][fetch] status={r.status_code} body(start)={r.text[:400]!r}", flush=True)
+                return []
+
+            r.raw.decode_content = True
+            try:
+                out = feed_stream(parser, r.raw)
+            except ET.ParseError as e:
+                print(f"[AGENDA][fetch] XML parse error: {e}", flush=True)
+                return []
+            except Exception:
+                # Read-timeout halverwege (budget op): geef terug wat er al is
+                if not parser.items or deadline.remaining() is None:
+                    raise
+                stop_partial(parser)
+                out = parser.items
+        finally:
+            r.close()
+            metrics.observe("xml_parse", parser.parse_s, upstream="oba")
+            metrics.observe("upstream", time.perf_counter() - t0 - parser.parse_s, upstream="oba", collection="agenda")
+
+        logger.debug(f"[AGENDA][fetch] result nodes={len(out)}")
+        if not parser.truncated:
+            AGENDA_CACHE.set(key, out)
+        return list(out)
 
     except Exception as e:
         print(f"[AGENDA][fetch] request error: {e}", flush=True)
@@ -3,10 +3,12 @@ import urllib.parse as ul
 from typing import Any, Dict, List, Optional
 
 from services.oba_config import (
+    IND_ALL,
     COLLECTION_BOOKS,
     COLLECTION_BOOKS_KN,
     COLLECTION_FAQ,
     COLLECTION_EVENTS,
+    OBA_API_BASE,
 )
 
 FICTION_MAP = {
@@ -49,6 +51,7 @@ def _build_search_params(
     audience: Optional[str] = None,
     content_type: Optional[str] = None,
     filters: Optional[Dict[str, Any]] = None,
+    indeling: Optional[List[str]] = None,
 ) -> Dict[str, Any]:
 
     text = (user_query or "").strip()
@@ -71,15 +74,17 @@ def _build_search_params(
     else:
         vq = ""
 
-    indeling: List[str] = []
+    # Expliciete indeling (filterpaneel) gaat voor afleiding uit doelgroep/type
+    indeling_list: List[str] = [i for i in (indeling or []) if i in IND_ALL]
 
-    if audience and content_type in ("fictie", "beide"):
-        indeling += FICTION_MAP.get(audience, [])
+    if not indeling_list:
+        if audience and content_type in ("fictie", "beide"):
+            indeling_list += FICTION_MAP.get(audience, [])
 
-    if audience and content_type in ("nonfictie", "beide"):
-        indeling += NONFICTION_MAP.get(audience, [])
+        if audience and content_type in ("nonfictie", "beide"):
+            indeling_list += NONFICTION_MAP.get(audience, [])
 
-    fb = _mk_filter_by(indeling_list=indeling, language=language)
+    fb = _mk_filter_by(indeling_list=indeling_list, language=language)
     books = COLLECTION_BOOKS_KN if location_kraaiennest else COLLECTION_BOOKS
 
     return {
@@ -120,7 +125,7 @@ def _build_agenda_query(
 
         url = base_front + ("?" + "&".join(qs) if qs else "")
 
-        base_api = "https://zoeken.oba.nl/api/v1/search/?q=table:evenementen&refine=true"
+        base_api = f"{OBA_API_BASE}/search/?q=table:evenementen&refine=true"
         facets = []
         if waar:
             facets.append("facet=waar%28" + ul.quote_plus(f"/root/OBA/{waar}") + "%29")
@@ -0,0 +1,90 @@
+# services/prefetch.py
+"""
+Opt-in prefetch van boekdetails (DETAIL_PREFETCH=1).
+
+Zodra een boekenzoekactie resultaten oplevert, worden de details van de
+eerste N PPN's op de achtergrond in de resolver/detail-cache gezet. De
+worker pool en de wachtrij zijn begrensd; bij drukte wordt er niets
+ingepland in plaats van te wachten, zodat de envelope nooit vertraagt.
+
+PREFETCHED onthoudt welke PPN's vooraf zijn opgehaald; de hit/miss-tellers
+daarvan zijn de prefetch hit rate (een detailklik op een geprefetchte PPN).
+`wasted` telt de opgehaalde details die (nog) niemand heeft geopend. De
+tellers staan als gauges `oba_prefetch_*` op /metrics.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable
+
+from services import metrics, oba_details
+from services.cache import MISS, TTLCache
+
+PREFETCH_ENABLED = os.getenv("DETAIL_PREFETCH", "0") == "1"
+PREFETCH_TOP_N = int(os.getenv("DETAIL_PREFETCH_TOP_N", "4"))
+PREFETCH_WORKERS = int(os.getenv("DETAIL_PREFETCH_WORKERS", "4"))
+PREFETCH_MAX_PENDING = int(os.getenv("DETAIL_PREFETCH_MAX_PENDING", "32"))
+
+PREFETCHED = TTLCache(
+    "prefetch",
+    max_items=int(os.getenv("DETAIL_CACHE_MAX_ITEMS", "5000")),
+    default_ttl=oba_details.DETAIL_CACHE.default_ttl,
+)
+
+_POOL = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_SLOTS = threading.BoundedSemaphore(PREFETCH_MAX_PENDING)
+STATS = {"scheduled": 0, "dropped": 0, "done": 0, "errors": 0, "prefetched": 0}
+
+
+def _run(ppn: str) -> None:
+    try:
+        if oba_details.get_book_detail(ppn) is not None:
+            PREFETCHED.set(ppn, True)
+            STATS["prefetched"] += 1
+        STATS["done"] += 1
+    except Exception as e:
+        STATS["errors"] += 1
+        print(f"[PREFETCH] ppn={ppn} error: {e}", flush=True)
+    finally:
+        _SLOTS.release()
+
+
+def schedule(ppns: Iterable[Any]) -> None:
+    """Plan prefetch voor de eerste PREFETCH_TOP_N PPN's; blokkeert nooit."""
+    if not PREFETCH_ENABLED:
+        return
+    seen = set()
+    for ppn in ppns:
+        if len(seen) >= PREFETCH_TOP_N:
+            break
+        if not ppn or ppn in seen:
+            continue
+        seen.add(ppn)
+        if not _SLOTS.acquire(blocking=False):
+            STATS["dropped"] += 1
+            continue
+        STATS["scheduled"] += 1
+        _POOL.submit(_run, str(ppn))
+
+
+def record_access(ppn: str) -> None:
+    """Tel een detailklik als prefetch-hit of -miss (elke prefetch telt één keer)."""
+    if not PREFETCH_ENABLED or not ppn:
+        return
+    if PREFETCHED.get(ppn) is not MISS:
+        PREFETCHED.delete(ppn)
+
+
+def stats() -> Dict[str, Any]:
+    s = PREFETCHED.stats()
+    return {
+        **STATS,
+        "enabled": PREFETCH_ENABLED,
+        "hits": s["hits"],
+        "misses": s["misses"],
+        "wasted": max(0, STATS["prefetched"] - s["hits"]),
+        "hit_rate": s["hit_rate"],
+    }
+
+
+metrics.register("prefetch", stats)
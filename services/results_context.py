@@ -0,0 +1,141 @@
+# services/results_context.py
+"""
+Contextblok met de laatste zoekresultaten, binnen een tokenbudget.
+
+Alles wat duur is gebeurt één keer, bij het opslaan van de resultaten
+(`precompute`): per item een compacte, genummerde regel, een tokenschatting
+en de zoektermen (woorden uit titel/auteur). Per beurt kiest `select` alleen
+nog welke regels meegaan:
+- noemt de gebruiker een item (termoverlap), dan die items eerst
+- verwijst de gebruiker naar "deze", "de tweede", "meer over" e.d., dan de
+  items in rangorde
+- anders niets: een nieuwe, losse vraag krijgt geen oude resultaten mee
+Regels die al eerder in deze conversatie zijn geïnjecteerd, worden niet
+opnieuw meegestuurd; de conversatie onthoudt ze zelf.
+"""
+import hashlib
+import os
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+RESULTS_CONTEXT_TOKENS = int(os.getenv("RESULTS_CONTEXT_TOKENS", "600"))
+RESULTS_CONTEXT_ITEM_CHARS = int(os.getenv("RESULTS_CONTEXT_ITEM_CHARS", "160"))
+RESULTS_CONTEXT_MAX_ITEMS = 20
+
+HEADER = (
+    "Dit zijn de laatste zoekresultaten. Als iemand hier iets over vraagt, geef antwoord.\n"
+    "ZOEKRESULTATEN\n"
+)
+FOOTER = "\nEINDE_ZOEKRESULTATEN"
+
+_WORD = re.compile(r"\w{4,}", re.UNICODE)
+# Verwijzingen naar eerdere resultaten. Losse woorden als "die"/"welke" en
+# losse getallen komen in bijna elke nieuwe vraag voor; alleen echte
+# verwijzingen tellen: "deze boeken", "het tweede (boek)", "nummer 3", "meer over".
+_RESULT_NOUN = (
+    r"(boek|boeken|titel|titels|activiteit|activiteiten|evenement|evenementen|workshop|workshops|"
+    r"resultaat|resultaten|book|books|title|titles|event|events|activity|activities|result|results|one|ones)"
+)
+_ORDINAL = (
+    r"(eerste|tweede|derde|vierde|vijfde|laatste|first|second|third|fourth|fifth|last|"
+    r"\d{1,2}(e|de|ste|st|nd|rd|th))"
+)
+_REFERS = re.compile(
+    rf"\b(deze|die|dit|dat|this|that|these|those)\s+{_RESULT_NOUN}\b"
+    rf"|\b{_ORDINAL}\s+{_RESULT_NOUN}\b"
+    rf"|\b(de|het|the)\s+{_ORDINAL}\s*[?.!]*\s*$"
+    r"|\b(van|uit|of)\s+(deze|die|these|those|them)\b|\b(ervan|daarvan|hiervan)\b"
+    r"|\b(meer over|more about|waarover)\b"
+    r"|\b(nummer|number|nr|no)\.?\s*\d{1,2}\b|#\s*\d{1,2}\b",
+    re.I,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Snelle lokale schatting (~4 tekens per token), zonder tokenizer."""
+    return max(1, (len(text) + 3) // 4)
+
+
+def _clip(v: Any, n: int) -> str:
+    if not isinstance(v, str):
+        return ""
+    v = " ".join(v.split())
+    return v if len(v) <= n else v[:n].rstrip() + "…"
+
+
+def _line(kind: str, i: int, it: Dict[str, Any]) -> Tuple[str, str]:
+    """(compacte regel, tekst voor zoektermen) voor item i."""
+    if kind == "books":
+        title = _clip(it.get("short_title"), 120)
+        author = _clip(it.get("auteur"), 60)
+        desc = _clip(it.get("beschrijving"), RESULTS_CONTEXT_ITEM_CHARS)
+        line = f"{i}. {title}" + (f" — {author}" if author else "") + (f": {desc}" if desc else "")
+        return line, f"{title} {author}"
+
+    title = _clip(it.get("title"), 120)
+    when = " ".join(p for p in (_clip(it.get("date"), 40), _clip(it.get("time"), 20)) if p)
+    loc = _clip(it.get("location"), 60)
+    summ = _clip(it.get("summary"), RESULTS_CONTEXT_ITEM_CHARS)
+    line = f"{i}. {title}" + "".join(f" | {p}" for p in (when, loc) if p) + (f": {summ}" if summ else "")
+    return line, f"{title} {loc}"
+
+
+def precompute(last: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Compacte, vooraf opgebouwde context-entry voor de state store."""
+    kind = (last or {}).get("kind")
+    if kind not in ("books", "agenda"):
+        return None
+    lines: List[str] = []
+    tokens: List[int] = []
+    terms: List[List[str]] = []
+    for i, it in enumerate((last.get("items") or [])[:RESULTS_CONTEXT_MAX_ITEMS], start=1):
+        line, term_text = _line(kind, i, it)
+        lines.append(line)
+        tokens.append(estimate_tokens(line) + 1)
+        terms.append(sorted({w.lower() for w in _WORD.findall(term_text)}))
+    if not lines:
+        return None
+    rid = hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()[:12]
+    return {"id": rid, "kind": kind, "lines": lines, "tokens": tokens, "terms": terms}
+
+
+def select(
+    entry: Optional[Dict[str, Any]],
+    user_text: str,
+    sent: Optional[Dict[str, Any]] = None,
+    budget: int = RESULTS_CONTEXT_TOKENS,
+) -> Tuple[str, List[int]]:
+    """
+    Kies de regels voor deze beurt binnen `budget` tokens.
+    `sent` = {"id": ..., "items": [...]} van eerdere injecties.
+    Retourneert (contextblok of "", alle tot nu toe geïnjecteerde indices).
+    """
+    if not entry:
+        return "", []
+    already: Set[int] = set(sent.get("items") or []) if sent and sent.get("id") == entry["id"] else set()
+
+    words = {w.lower() for w in _WORD.findall(user_text or "")}
+    scores = [len(words.intersection(t)) for t in entry["terms"]]
+    matched = sorted((i for i, s in enumerate(scores) if s), key=lambda i: -scores[i])
+    if matched:
+        order = matched + [i for i in range(len(scores)) if i not in matched]
+    elif _REFERS.search(user_text or ""):
+        order = list(range(len(scores)))
+    else:
+        return "", sorted(already)
+
+    budget -= estimate_tokens(HEADER + FOOTER)
+    chosen: List[int] = []
+    for i in order:
+        if i in already:
+            continue
+        cost = entry["tokens"][i]
+        if cost > budget:
+            break
+        chosen.append(i)
+        budget -= cost
+
+    if not chosen:
+        return "", sorted(already)
+    block = HEADER + "\n".join(entry["lines"][i] for i in sorted(chosen)) + FOOTER
+    return block, sorted(already.union(chosen))
@@ -0,0 +1,210 @@
+# services/speculative.py
+"""
+Opt-in speculatieve boekenzoekvraag (SPECULATIVE_SEARCH=1).
+
+Normaal start de Typesense-zoekvraag pas als MODEL de argumenten voor
+build_search_params teruggeeft. In speculatieve modus gokt `start()` die
+zoekvraag lokaal: build_search_params op de invoer zelf (zoals
+intent_router.heuristic), dus met de query_by-heuristiek (`_looks_author`/`_looks_title`) en alpha 0.8. De gok
+loopt terwijl het model nadenkt.
+- `take(result)`: kiest het model een zoekvraag met dezelfde cachesleutel
+  (zie typesense_search.cache_key), dan wordt het speculatieve resultaat
+  gebruikt (hit). Anders zoekt de beurt gewoon zelf (miss).
+- `settle()`: aan het eind van de beurt; een niet gebruikte gok wordt
+  weggegooid (miss of unused) en de kosten tellen als verspild.
+
+De lopende gok zit in een contextvar, net als de deadline, en is zo
+zichtbaar in de toolthreads en asyncio-taken van de beurt. Met de
+tellers (hit rate, verspilde queries en ms, gewonnen ms) is de
+heuristiek bij te stellen.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from services import async_oba_helpers, deadline, http_client, intent_router, metrics, typesense_search
+from services.oba_tools import TOOL_IMPLS
+
+logger = logging.getLogger("oba_app")
+
+SPECULATIVE_ENABLED = os.getenv("SPECULATIVE_SEARCH", "0") == "1"
+SPECULATIVE_WORKERS = int(os.getenv("SPECULATIVE_WORKERS", "4"))
+SPECULATIVE_MIN_CHARS = int(os.getenv("SPECULATIVE_MIN_CHARS", "3"))
+
+_POOL = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix="speculative")
+_CURRENT: ContextVar[Optional["Speculation"]] = ContextVar("oba_speculation", default=None)
+_LOCK = threading.Lock()
+
+STATS: Dict[str, Any] = {
+    "started": 0,
+    "hits": 0,
+    "misses": 0,      # model koos een andere boekenzoekvraag
+    "unused": 0,      # model koos geen boekenzoekvraag
+    "errors": 0,
+    "wasted_queries": 0,
+    "wasted_ms": 0,
+    "saved_ms": 0,
+}
+
+
+class Speculation:
+    def __init__(self, params: Dict[str, Any], key: str) -> None:
+        self.params = params
+        self.key = key
+        self.t0 = time.perf_counter()
+        self.dur: Optional[float] = None
+        self.state = "running"  # running → used | discarded
+        self.searched = False  # model koos een boekenzoekvraag (zie _claim)
+        self.lead = 0.0  # voorsprong op de echte zoekvraag bij een hit
+        self.future: Any = None  # concurrent Future of asyncio Task
+
+
+def guess(user_text: str) -> Optional[Dict[str, Any]]:
+    """De zoekparameters die het model waarschijnlijk kiest, of None."""
+    # Dezelfde boekenzoekvraag als de noodroute van de deadline
+    routed = intent_router.heuristic(user_text)
+    if routed is None or len(user_text.strip()) < SPECULATIVE_MIN_CHARS:
+        return None
+    return TOOL_IMPLS[routed["tool"]](**routed["args"])
+
+
+def _prepare(user_text: str) -> Optional[Speculation]:
+    if not SPECULATIVE_ENABLED or _CURRENT.get() is not None:
+        return None
+    params = guess(user_text)
+    prepared = typesense_search.prepare(params) if params else None
+    if prepared is None:
+        return None
+    spec = Speculation(params, prepared[2])
+    _CURRENT.set(spec)
+    STATS["started"] += 1
+    return spec
+
+
+def _finished(spec: Speculation) -> None:
+    with _LOCK:
+        spec.dur = time.perf_counter() - spec.t0
+        # Geannuleerd vóór (of tijdens) het zoeken: geen voltooide query, dus niet verspild
+        if spec.state == "discarded" and not spec.future.cancelled():
+            _waste(spec)
+
+
+def _waste(spec: Speculation) -> None:
+    # Aanroepen onder _LOCK, zodra de gok weggegooid én klaar is
+    STATS["wasted_queries"] += 1
+    STATS["wasted_ms"] += int((spec.dur or 0.0) * 1000)
+    metrics.inc("speculative_wasted_seconds", spec.dur or 0.0)
+
+
+def start(user_text: str) -> None:
+    """Start de gok voor deze beurt in de pool (no-op als uit of al gestart)."""
+    spec = _prepare(user_text)
+    if spec is None:
+        return
+    spec.future = _POOL.submit(contextvars.copy_context().run, typesense_search.search, spec.params)
+    spec.future.add_done_callback(lambda _: _finished(spec))
+
+
+def astart(user_text: str) -> None:
+    """Async `start()`: de gok als asyncio-taak."""
+    spec = _prepare(user_text)
+    if spec is None:
+        return
+    spec.future = asyncio.ensure_future(async_oba_helpers.typesense_search_any(spec.params))
+    spec.future.add_done_callback(lambda _: _finished(spec))
+
+
+def _claim(result: Dict[str, Any]) -> Optional[Speculation]:
+    spec = _CURRENT.get()
+    if spec is None or spec.state != "running":
+        return None
+    spec.searched = True
+    prepared = typesense_search.prepare(result)
+    if prepared is None or prepared[2] != spec.key:
+        return None
+    with _LOCK:
+        spec.state = "used"
+        # Zo lang liep de gok al toen de echte zoekvraag zou starten (hooguit zijn duur)
+        lead = time.perf_counter() - spec.t0
+        spec.lead = lead if spec.dur is None else min(lead, spec.dur)
+    return spec
+
+
+def _hit(spec: Speculation) -> None:
+    STATS["hits"] += 1
+    STATS["saved_ms"] += int(spec.lead * 1000)
+    metrics.inc("speculative", outcome="hit")
+
+
+def _wait_budget() -> float:
+    # Hooguit zo lang als de echte zoekvraag zelf mocht duren, begrensd door de deadline
+    connect, read = http_client.UPSTREAMS["typesense"]["timeout"]
+    return deadline.timeout(connect + read)
+
+
+def take(result: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Resultaat van de gok als `result` (boekenzoekvraag van het model) dezelfde zoekvraag is, anders None."""
+    spec = _claim(result)
+    if spec is None:
+        return None
+    try:
+        items = spec.future.result(timeout=_wait_budget())
+    except Exception as e:
+        STATS["errors"] += 1
+        logger.warning(f"[SPECULATIVE] wait error: {e!r}")
+        return None
+    _hit(spec)
+    return list(items)
+
+
+async def atake(result: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Async `take()`."""
+    spec = _claim(result)
+    if spec is None:
+        return None
+    try:
+        items = await asyncio.wait_for(asyncio.shield(spec.future), timeout=_wait_budget())
+    except Exception as e:
+        STATS["errors"] += 1
+        logger.warning(f"[SPECULATIVE] wait error: {e!r}")
+        return None
+    _hit(spec)
+    return list(items)
+
+
+def settle() -> None:
+    """Sluit de gok van deze beurt af: niet gebruikt → weggooien (asyncio-taak annuleren)."""
+    spec = _CURRENT.get()
+    if spec is None:
+        return
+    _CURRENT.set(None)
+    with _LOCK:
+        if spec.state != "running":
+            return
+        spec.state = "discarded"
+        outcome = "miss" if spec.searched else "unused"
+        STATS["misses" if spec.searched else "unused"] += 1
+        if spec.dur is not None:
+            _waste(spec)
+    metrics.inc("speculative", outcome=outcome)
+    if spec.future is not None:
+        # Een lopende thread-zoekvraag loopt door (en vult de cache); een wachtende of asyncio-taak stopt
+        spec.future.cancel()
+
+
+def stats() -> Dict[str, Any]:
+    started = STATS["started"]
+    return {
+        **STATS,
+        "enabled": SPECULATIVE_ENABLED,
+        "hit_rate": round(STATS["hits"] / started, 4) if started else 0.0,
+    }
+
+
+metrics.register("speculative", stats)
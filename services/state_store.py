@@ -0,0 +1,330 @@
+# services/state_store.py
+"""
+Per-conversatie state (o.a. de laatste zoekresultaten voor het contextblok),
+begrensd en optioneel gedeeld tussen workers/serverless-instanties.
+
+Backends (STATE_BACKEND):
+- memory: in-process LRU + TTL, begrensd op aantal entries én bytes
+- sqlite: lokaal SQLite-bestand (STATE_SQLITE_PATH), gedeeld door workers
+          op dezelfde machine
+- mongo:  MongoDB (STATE_MONGO_URI), gedeeld door alle instanties
+
+Entries worden als compacte JSON opgeslagen; de resultaten staan er al als
+vooraf opgebouwde contextregels in (zie results_context.precompute).
+Omvang, bytes, evictions en hit rate staan als gauges `oba_state_store_*`
+op /metrics, om STATE_MAX_ITEMS/STATE_MAX_BYTES bij te stellen.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from services import metrics
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_TTL = float(os.getenv("STATE_TTL", "7200"))
+STATE_MAX_ITEMS = int(os.getenv("STATE_MAX_ITEMS", "5000"))
+STATE_MAX_BYTES = int(os.getenv("STATE_MAX_BYTES", str(16 * 1024 * 1024)))
+STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "/tmp/nexi_state.sqlite3")
+STATE_MONGO_URI = os.getenv("STATE_MONGO_URI")
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+# --- Backends (slaan JSON-strings op) ---
+class MemoryStore:
+    """In-process LRU + TTL, begrensd op STATE_MAX_ITEMS en STATE_MAX_BYTES."""
+
+    shared = False
+
+    def __init__(self, max_items: int, max_bytes: int):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            exp, raw = entry
+            if exp <= time.monotonic():
+                self._drop(key)
+                self.expired += 1
+                return None
+            self._data.move_to_end(key)
+            return raw
+
+    def set(self, key: str, raw: str, ttl: float) -> None:
+        with self._lock:
+            self._set(key, raw, ttl)
+
+    def merge(self, key: str, fields: Dict[str, Any], ttl: float) -> Dict[str, Any]:
+        """Lees, voeg samen en schrijf onder één lock (atomisch t.o.v. andere updates)."""
+        with self._lock:
+            entry = self._data.get(key)
+            state = json.loads(entry[1]) if entry is not None and entry[0] > time.monotonic() else {}
+            state.update(fields)
+            self._set(key, _dumps(state), ttl)
+        return state
+
+    def _set(self, key: str, raw: str, ttl: float) -> None:
+        if key in self._data:
+            self._drop(key)
+        self._data[key] = (time.monotonic() + ttl, raw)
+        self._bytes += len(raw)
+        while self._data and (len(self._data) > self.max_items or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._data)))
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        _, raw = self._data.pop(key)
+        self._bytes -= len(raw)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "bytes": self._bytes,
+                "max_items": self.max_items,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+
+class SqliteStore:
+    """Gedeelde state in een lokaal SQLite-bestand (meerdere workers, één machine)."""
+
+    shared = True
+
+    def __init__(self, path: str, max_items: int):
+        self.path = path
+        self.max_items = max_items
+        self._conn = sqlite3.connect(path, timeout=2, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (k TEXT PRIMARY KEY, v TEXT, exp REAL, ts REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS state_ts ON state(ts)")
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT v FROM state WHERE k = ? AND exp > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, raw: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (k, v, exp, ts) VALUES (?, ?, ?, ?)",
+                (key, raw, now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune(now)
+
+    def merge(self, key: str, fields: Dict[str, Any], ttl: float) -> Dict[str, Any]:
+        """Lees, voeg samen en schrijf in één schrijftransactie (atomisch, ook tussen workers)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT v FROM state WHERE k = ? AND exp > ?", (key, now)).fetchone()
+                state = json.loads(row[0]) if row else {}
+                state.update(fields)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO state (k, v, exp, ts) VALUES (?, ?, ?, ?)",
+                    (key, _dumps(state), now + ttl, now),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune(now)
+        return state
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM state WHERE k = ?", (key,))
+
+    def _prune(self, now: float) -> None:
+        # Verlopen rijen weg, daarna de oudste boven max_items
+        self.expired += self._conn.execute("DELETE FROM state WHERE exp <= ?", (now,)).rowcount
+        self.evictions += self._conn.execute(
+            "DELETE FROM state WHERE k IN (SELECT k FROM state ORDER BY ts DESC LIMIT -1 OFFSET ?)",
+            (self.max_items,),
+        ).rowcount
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            size, nbytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(v)), 0) FROM state").fetchone()
+        return {
+            "size": size,
+            "bytes": nbytes,
+            "max_items": self.max_items,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+
+class MongoStore:
+    """
+    Gedeelde state in MongoDB; verlopen documenten ruimt Mongo zelf op (TTL-index).
+    Elk veld staat als eigen JSON-string onder `f`, zodat `merge()` met `$set`
+    alleen de gewijzigde velden schrijft.
+    """
+
+    shared = True
+
+    def __init__(self, uri: str, db: str = "nexi", collection: str = "conversation_state"):
+        from pymongo import MongoClient  # optionele dependency
+
+        self._coll = MongoClient(uri, serverSelectionTimeoutMS=2000)[db][collection]
+        self._coll.create_index("exp", expireAfterSeconds=0)
+
+    @staticmethod
+    def _state(doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: json.loads(v) for k, v in (doc.get("f") or {}).items()}
+
+    def get(self, key: str) -> Optional[str]:
+        doc = self._coll.find_one({"_id": key, "exp": {"$gt": datetime.now(timezone.utc)}})
+        return None if doc is None else _dumps(self._state(doc))
+
+    def set(self, key: str, raw: str, ttl: float) -> None:
+        exp = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        fields = {k: _dumps(v) for k, v in json.loads(raw).items()}
+        self._coll.replace_one({"_id": key}, {"_id": key, "f": fields, "exp": exp}, upsert=True)
+
+    def merge(self, key: str, fields: Dict[str, Any], ttl: float) -> Dict[str, Any]:
+        from pymongo import ReturnDocument
+
+        now = datetime.now(timezone.utc)
+        changes: Dict[str, Any] = {f"f.{k}": _dumps(v) for k, v in fields.items()}
+        changes["exp"] = now + timedelta(seconds=ttl)
+        # Verlopen maar nog niet opgeruimd: eerst leegmaken, zoals get() het ook niet meer ziet
+        self._coll.delete_one({"_id": key, "exp": {"$lte": now}})
+        doc = self._coll.find_one_and_update(
+            {"_id": key}, {"$set": changes}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return self._state(doc)
+
+    def delete(self, key: str) -> None:
+        self._coll.delete_one({"_id": key})
+
+    def info(self) -> Dict[str, Any]:
+        coll_stats = self._coll.database.command("collStats", self._coll.name)
+        return {"size": coll_stats.get("count", 0), "bytes": coll_stats.get("size", 0)}
+
+
+def _make_store() -> Any:
+    try:
+        if STATE_BACKEND == "sqlite":
+            return SqliteStore(STATE_SQLITE_PATH, STATE_MAX_ITEMS)
+        if STATE_BACKEND == "mongo" and STATE_MONGO_URI:
+            return MongoStore(STATE_MONGO_URI)
+    except Exception as e:
+        print(f"[STATE] {STATE_BACKEND} backend disabled, using memory: {e}", flush=True)
+    return MemoryStore(STATE_MAX_ITEMS, STATE_MAX_BYTES)
+
+
+STORE = _make_store()
+STATS = {"gets": 0, "hits": 0, "sets": 0, "errors": 0}
+
+
+# --- API ---
+def shared() -> bool:
+    """True als de state over workers/instances gedeeld wordt (sqlite of mongo)."""
+    return STORE.shared
+
+
+def get(conversation_id: str) -> Dict[str, Any]:
+    """State van een conversatie ({} als er niets (meer) is)."""
+    if not conversation_id:
+        return {}
+    STATS["gets"] += 1
+    try:
+        raw = STORE.get(conversation_id)
+    except Exception as e:
+        STATS["errors"] += 1
+        print(f"[STATE] get error: {e}", flush=True)
+        return {}
+    if raw is None:
+        return {}
+    STATS["hits"] += 1
+    return json.loads(raw)
+
+
+def put(conversation_id: str, state: Dict[str, Any]) -> None:
+    if not conversation_id:
+        return
+    STATS["sets"] += 1
+    raw = _dumps(state)
+    try:
+        STORE.set(conversation_id, raw, STATE_TTL)
+    except Exception as e:
+        STATS["errors"] += 1
+        print(f"[STATE] set error: {e}", flush=True)
+
+
+def update(conversation_id: str, **fields: Any) -> Dict[str, Any]:
+    """
+    Voeg velden samen met de bestaande state en sla op, atomisch per backend:
+    gelijktijdige updates (beurt en compactie) overschrijven elkaars velden niet.
+    """
+    if not conversation_id:
+        return dict(fields)
+    STATS["sets"] += 1
+    try:
+        return STORE.merge(conversation_id, fields, STATE_TTL)
+    except Exception as e:
+        STATS["errors"] += 1
+        print(f"[STATE] update error: {e}", flush=True)
+        return {**get(conversation_id), **fields}
+
+
+def delete(conversation_id: str) -> None:
+    try:
+        STORE.delete(conversation_id)
+    except Exception as e:
+        STATS["errors"] += 1
+        print(f"[STATE] delete error: {e}", flush=True)
+
+
+def stats() -> Dict[str, Any]:
+    try:
+        info = STORE.info()
+    except Exception as e:
+        info = {"error": str(e)}
+    gets = STATS["gets"]
+    return {
+        "backend": type(STORE).__name__,
+        **STATS,
+        "misses": gets - STATS["hits"],
+        "hit_rate": round(STATS["hits"] / gets, 4) if gets else 0.0,
+        **info,
+    }
+
+
+metrics.register("state_store", stats)
@@ -0,0 +1,173 @@
+# services/tool_executor.py
+"""
+Voert de fetches van meerdere toolcalls binnen één beurt parallel uit.
+
+Alleen de envelope van de laatste (leidende) toolcall wordt getoond, dus:
+- dubbele calls (zelfde tool + parameters) en calls die door een latere
+  call van dezelfde tool worden overschreven, worden overgeslagen;
+- de overige calls lopen gelijktijdig in een begrensde pool met een deadline
+  per call;
+- het resultaat is deterministisch: de laatste call (in volgorde van het
+  model) die op tijd en zonder fout klaar is. Zodra die vaststaat worden
+  nog niet gestarte calls geannuleerd.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services import deadline
+
+TOOL_EXEC_WORKERS = int(os.getenv("TOOL_EXEC_WORKERS", "8"))
+TOOL_CALL_DEADLINE = float(os.getenv("TOOL_CALL_DEADLINE", "12"))
+
+_POOL = ThreadPoolExecutor(max_workers=TOOL_EXEC_WORKERS, thread_name_prefix="tool")
+STATS = {"calls": 0, "skipped": 0, "cancelled": 0, "timeouts": 0, "errors": 0, "parallel_turns": 0}
+
+Spec = Tuple[str, Dict[str, Any]]  # (toolnaam, impl-resultaat)
+
+
+def _signature(spec: Spec) -> str:
+    name, result = spec
+    params = {k: v for k, v in result.items() if k != "_call_id"}
+    return name + ":" + json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def select(specs: List[Spec]) -> List[int]:
+    """Indexen van de calls die echt uitgevoerd moeten worden (in volgorde)."""
+    keep: List[int] = []
+    seen_names = set()
+    seen_sigs = set()
+    for i in range(len(specs) - 1, -1, -1):
+        name = specs[i][0]
+        sig = _signature(specs[i])
+        if name in seen_names or sig in seen_sigs:
+            continue
+        seen_names.add(name)
+        seen_sigs.add(sig)
+        keep.append(i)
+    keep.reverse()
+    STATS["skipped"] += len(specs) - len(keep)
+    return keep
+
+
+def _budget(deadline_s: Optional[float]) -> float:
+    """Wachttijd voor de calls: TOOL_CALL_DEADLINE (of `deadline_s`), binnen de deadline van de beurt."""
+    budget = TOOL_CALL_DEADLINE if deadline_s is None else deadline_s
+    left = deadline.remaining()
+    return budget if left is None else max(0.0, min(budget, left))
+
+
+def run(specs: List[Spec], handle: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+        deadline_s: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Voer `handle(name, result)` uit voor de geselecteerde calls en geef de
+    afgehandelde dict van de leidende call terug (None als alles faalde).
+    """
+    if not specs:
+        return None
+    idx = select(specs)
+    STATS["calls"] += len(idx)
+
+    # Eén call: gewoon in deze thread, geen pool-overhead
+    if len(idx) == 1:
+        name, result = specs[idx[0]]
+        try:
+            return handle(name, result)
+        except Exception as e:
+            STATS["errors"] += 1
+            print(f"[TOOLS] {name} error: {e}", flush=True)
+            return None
+
+    STATS["parallel_turns"] += 1
+    until = time.monotonic() + _budget(deadline_s)
+    # Context mee naar de pool, zodat de deadline van de beurt ook daar geldt
+    futures: List[Future] = [_POOL.submit(contextvars.copy_context().run, handle, *specs[i]) for i in idx]
+    done: Dict[int, Dict[str, Any]] = {}
+    failed = set()
+
+    # Wacht tot de hoogste nog-kansrijke call klaar is (of de deadline verstrijkt)
+    pending = set(range(len(futures)))
+    while pending:
+        best = max((j for j in range(len(futures)) if j not in failed), default=None)
+        if best is None or best in done:
+            break
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            STATS["timeouts"] += len(pending)
+            if done:
+                deadline.degrade("partial_results")
+            break
+        finished, _ = wait([futures[j] for j in pending], timeout=remaining, return_when=FIRST_COMPLETED)
+        for f in finished:
+            j = futures.index(f)
+            pending.discard(j)
+            try:
+                done[j] = f.result()
+            except Exception as e:
+                failed.add(j)
+                STATS["errors"] += 1
+                print(f"[TOOLS] {specs[idx[j]][0]} error: {e}", flush=True)
+
+    for j in pending:
+        if futures[j].cancel():
+            STATS["cancelled"] += 1
+
+    for j in sorted(done, reverse=True):
+        return done[j]
+    return None
+
+
+async def arun(specs: List[Spec], handle: Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]],
+               deadline_s: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Async variant van `run()`: zelfde selectie en merge, echte annulering van taken."""
+    if not specs:
+        return None
+    idx = select(specs)
+    STATS["calls"] += len(idx)
+    if len(idx) > 1:
+        STATS["parallel_turns"] += 1
+
+    until = time.monotonic() + _budget(deadline_s)
+    tasks = [asyncio.ensure_future(handle(*specs[i])) for i in idx]
+    done: Dict[int, Dict[str, Any]] = {}
+    failed = set()
+
+    pending = set(range(len(tasks)))
+    while pending:
+        best = max((j for j in range(len(tasks)) if j not in failed), default=None)
+        if best is None or best in done:
+            break
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            STATS["timeouts"] += len(pending)
+            if done:
+                deadline.degrade("partial_results")
+            break
+        finished, _ = await asyncio.wait(
+            [tasks[j] for j in pending], timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+        )
+        for t in finished:
+            j = tasks.index(t)
+            pending.discard(j)
+            try:
+                done[j] = t.result()
+            except Exception as e:
+                failed.add(j)
+                STATS["errors"] += 1
+                print(f"[TOOLS] {specs[idx[j]][0]} error: {e}", flush=True)
+
+    for j in pending:
+        tasks[j].cancel()
+        STATS["cancelled"] += 1
+
+    for j in sorted(done, reverse=True):
+        return done[j]
+    return None
+
+
+def stats() -> Dict[str, Any]:
+    return dict(STATS)
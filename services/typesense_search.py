@@ -0,0 +1,196 @@
+# services/typesense_search.py
+"""
+Eén Typesense-zoekmachine voor alle collecties.
+
+Per collectie staat in PROFILES welke velden Typesense moet teruggeven
+(include/exclude), hoeveel hits, of prefix-matching aan staat en hoe een
+document naar het frontend-formaat wordt omgezet. Een nieuwe collectie
+toevoegen = een profiel toevoegen.
+
+Resultaten worden gecachet op de genormaliseerde zoekparameters, met een
+TTL per collectie (`ttl` in het profiel). Na een herindexering kan de
+cache per collectie geleegd worden met `invalidate_cache(collection)`.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services import http_client, metrics
+from services.cache import MISS, TTLCache, make_backend
+from services.oba_config import (
+    COLLECTION_BOOKS,
+    COLLECTION_BOOKS_KN,
+    COLLECTION_FAQ,
+    COLLECTION_EVENTS,
+)
+
+TYPESENSE_API_URL = os.getenv("TYPESENSE_API_URL")
+TYPESENSE_API_KEY = os.getenv("TYPESENSE_API_KEY")
+
+logger = logging.getLogger("oba_app")
+
+SEARCH_CACHE = TTLCache(
+    "typesense",
+    max_items=int(os.getenv("SEARCH_CACHE_MAX_ITEMS", "2048")),
+    default_ttl=float(os.getenv("SEARCH_CACHE_TTL", "600")),
+    backend=make_backend(os.getenv("SEARCH_CACHE_MONGO_URI"), "search_cache"),
+)
+
+
+# --- Result mappers (document → frontend-item) ---
+def _map_book(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return {"ppn": doc.get("ppn"), "short_title": doc.get("short_title")}
+
+
+def _map_faq(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    vraag = doc.get("vraag")
+    antwoord = doc.get("antwoord")
+    if not (vraag or antwoord):
+        return None
+
+    # Locatie kan komma-gescheiden zijn, alleen eerste nodig
+    raw_loc = doc.get("locatie")
+    first_location: Optional[str] = None
+    if isinstance(raw_loc, str) and raw_loc.strip():
+        first_location = raw_loc.split(",")[0].strip()
+
+    return {"vraag": vraag, "antwoord": antwoord, "location": first_location}
+
+
+def _map_event(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    start = doc.get("starttijd")
+    end = doc.get("eindtijd")
+    return {
+        "title": doc.get("titel") or "Geen titel",
+        "summary": doc.get("samenvatting") or "",
+        "cover": doc.get("afbeelding") or "",
+        "link": doc.get("deeplink") or "#",
+        "date": start,
+        "time": "",
+        "location": doc.get("locatienaam") or doc.get("gebouw") or "Locatie onbekend",
+        "raw_date": {"start": start, "end": end} if (start or end) else None,
+    }
+
+
+# --- Profielen ---
+_BOOKS_PROFILE: Dict[str, Any] = {
+    "include_fields": "ppn,short_title",
+    "exclude_fields": "embedding",
+    "per_page": 15,
+    "prefix": "false",
+    "ttl": float(os.getenv("SEARCH_CACHE_TTL_BOOKS", "1800")),
+    "map": _map_book,
+}
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    COLLECTION_BOOKS: _BOOKS_PROFILE,
+    COLLECTION_BOOKS_KN: _BOOKS_PROFILE,
+    COLLECTION_FAQ: {
+        "include_fields": "vraag,antwoord,locatie",
+        "exclude_fields": "embedding",
+        "per_page": 15,
+        "prefix": "false",
+        "ttl": float(os.getenv("SEARCH_CACHE_TTL_FAQ", "3600")),
+        "map": _map_faq,
+    },
+    COLLECTION_EVENTS: {
+        "include_fields": "titel,samenvatting,afbeelding,deeplink,locatienaam,gebouw,starttijd,eindtijd",
+        "exclude_fields": "embedding",
+        "per_page": 15,
+        "prefix": "false",
+        "ttl": float(os.getenv("SEARCH_CACHE_TTL_EVENTS", "300")),
+        "map": _map_event,
+    },
+}
+
+
+def build_search(params: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Bouw één multi_search-entry uit tool-parameters + collectieprofiel."""
+    return {
+        "q": params.get("q"),
+        "query_by": params.get("query_by"),
+        "collection": params.get("collection"),
+        "prefix": profile["prefix"],
+        "vector_query": params.get("vector_query") or "",
+        "include_fields": profile["include_fields"],
+        "exclude_fields": profile["exclude_fields"],
+        "per_page": profile["per_page"],
+        "filter_by": params.get("filter_by") or "",
+    }
+
+
+def cache_key(search_entry: Dict[str, Any]) -> str:
+    """Sleutel op genormaliseerde parameters: q zonder hoofdletters/extra spaties."""
+    norm = {k: (v.strip() if isinstance(v, str) else v) for k, v in search_entry.items()}
+    norm["q"] = re.sub(r"\s+", " ", (norm.get("q") or "").lower())
+    digest = hashlib.sha1(
+        json.dumps(norm, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return f"{search_entry.get('collection')}:{digest}"
+
+
+def invalidate_cache(collection: Optional[str] = None) -> int:
+    """Leeg de zoekcache voor één collectie (of alles), bijv. na een herindexering."""
+    return SEARCH_CACHE.invalidate(collection)
+
+
+def prepare(params: Dict[str, Any], collection: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], str]]:
+    """(profiel, multi_search-entry, cachesleutel) voor deze zoekvraag; None zonder profiel."""
+    coll = collection or params.get("collection")
+    profile = PROFILES.get(coll)
+    if profile is None:
+        print(f"[TS] Geen profiel voor collection={coll}", flush=True)
+        return None
+    entry = build_search({**params, "collection": coll}, profile)
+    return profile, entry, cache_key(entry)
+
+
+def map_hits(profile: Dict[str, Any], data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Zet een multi_search-response om naar frontend-items volgens het profiel."""
+    hits = data.get("results", [{}])[0].get("hits", [])
+    mapper: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]] = profile["map"]
+    out: List[Dict[str, Any]] = []
+    for h in hits:
+        item = mapper(h.get("document") or {})
+        if item is not None:
+            out.append(item)
+    return out
+
+
+def headers() -> Dict[str, str]:
+    return {"Content-Type": "application/json", "X-TYPESENSE-API-KEY": TYPESENSE_API_KEY or ""}
+
+
+def search(params: Dict[str, Any], collection: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Best-effort Typesense search voor elke collectie met een profiel.
+    `collection` overschrijft params["collection"] voor de profielkeuze.
+    """
+    if not TYPESENSE_API_URL or not TYPESENSE_API_KEY:
+        return []
+
+    prepared = prepare(params, collection)
+    if prepared is None:
+        return []
+    profile, entry, key = prepared
+
+    cached = SEARCH_CACHE.get(key)
+    if cached is not MISS:
+        return list(cached)
+
+    try:
+        with metrics.span("upstream", upstream="typesense", collection=entry["collection"]):
+            r = http_client.post("typesense", TYPESENSE_API_URL, json={"searches": [entry]}, headers=headers())
+        if r.status_code != 200:
+            metrics.inc("upstream_errors", upstream="typesense", status=r.status_code)
+            print(f"[TS] Error body: {r.text[:500]}", flush=True)
+            return []
+        out = map_hits(profile, r.json())
+        logger.debug(f"[TS] Collection={entry['collection']} hits={len(out)}")
+        SEARCH_CACHE.set(key, out, profile["ttl"])
+        return list(out)
+    except Exception:
+        return []
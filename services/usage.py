@@ -0,0 +1,84 @@
+# services/usage.py
+"""
+Tokengebruik en latency per stage van een gespreksbeurt ("tools" = de eerste
+modelcall met tools, "ack" = de korte FASTMODEL-call).
+
+Per stage: aantal calls, input-, cached- en output-tokens (uit `resp.usage`),
+totale latency en, bij streaming, time-to-first-token. De verhouding
+cached/input laat zien of de statische prefix (SYSTEM + TOOLS) door de
+prompt-cache van de provider wordt hergebruikt.
+"""
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from services import metrics
+
+logger = logging.getLogger("oba_app")
+
+_LOCK = threading.Lock()
+STAGES: Dict[str, Dict[str, float]] = {}
+
+
+def _cached_tokens(usage: Any) -> int:
+    details = getattr(usage, "input_tokens_details", None)
+    return int(getattr(details, "cached_tokens", 0) or 0)
+
+
+def record(stage: str, resp: Any, elapsed_s: float, ttft_s: Optional[float] = None) -> None:
+    """Tel usage + timing van één Responses-call bij `stage` op."""
+    usage = getattr(resp, "usage", None)
+    input_tokens = int(getattr(usage, "input_tokens", 0) or 0)
+    cached = _cached_tokens(usage)
+    output_tokens = int(getattr(usage, "output_tokens", 0) or 0)
+
+    with _LOCK:
+        s = STAGES.setdefault(stage, {
+            "calls": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0,
+            "latency_ms": 0.0, "streamed": 0, "ttft_ms": 0.0,
+        })
+        s["calls"] += 1
+        s["input_tokens"] += input_tokens
+        s["cached_tokens"] += cached
+        s["output_tokens"] += output_tokens
+        s["latency_ms"] += elapsed_s * 1000
+        if ttft_s is not None:
+            s["streamed"] += 1
+            s["ttft_ms"] += ttft_s * 1000
+
+    metrics.observe("model", elapsed_s, call=stage)
+    if ttft_s is not None:
+        metrics.observe("model_ttft", ttft_s, call=stage)
+    metrics.inc("model_tokens", input_tokens - cached, call=stage, type="uncached")
+    metrics.inc("model_tokens", cached, call=stage, type="cached")
+    metrics.inc("model_tokens", output_tokens, call=stage, type="output")
+
+    logger.debug(
+        f"[USAGE] stage={stage} in={input_tokens} cached={cached} out={output_tokens} "
+        f"dur_ms={int(elapsed_s * 1000)}"
+        + (f" ttft_ms={int(ttft_s * 1000)}" if ttft_s is not None else "")
+    )
+
+
+def avg_latency_ms(stage: str) -> int:
+    """Gemiddelde latency van `stage` tot nu toe (0 als er nog niets gemeten is)."""
+    with _LOCK:
+        s = STAGES.get(stage)
+        return int(s["latency_ms"] / s["calls"]) if s and s["calls"] else 0
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    with _LOCK:
+        for stage, s in STAGES.items():
+            calls = s["calls"] or 1
+            out[stage] = {
+                "calls": s["calls"],
+                "input_tokens": s["input_tokens"],
+                "cached_tokens": s["cached_tokens"],
+                "output_tokens": s["output_tokens"],
+                "cached_ratio": round(s["cached_tokens"] / s["input_tokens"], 4) if s["input_tokens"] else 0.0,
+                "avg_latency_ms": int(s["latency_ms"] / calls),
+                "avg_ttft_ms": int(s["ttft_ms"] / s["streamed"]) if s["streamed"] else None,
+            }
+    return out
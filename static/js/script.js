@@ -254,6 +254,82 @@ async function startThread() {
     thread_id = data.thread_id;
 }
 
+/* ===== Streaming (SSE) ===== */
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let idx;
+        while ((idx = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, idx);
+            buffer = buffer.slice(idx + 2);
+            let event = 'message';
+            let data = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
+/* Eén beurt naar de server; leest SSE-events als de server streamt, anders gewone JSON.
+   Geeft de definitieve envelope terug (of null bij een HTTP-fout). */
+async function postTurn(url, payload, onEvent) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        body: JSON.stringify({ ...payload, stream: true })
+    });
+    if (!response.ok) return null;
+
+    const contentType = response.headers.get('content-type') || '';
+    if (!contentType.includes('text/event-stream') || !response.body) {
+        return await response.json();
+    }
+
+    let final = null;
+    await readEventStream(response, (event, data) => {
+        if (event === 'done') {
+            final = data;
+        } else if (event === 'error') {
+            throw new Error(data?.response?.message || 'stream error');
+        } else if (onEvent) {
+            onEvent(event, data);
+        }
+    });
+    return final;
+}
+
+function showResultList(resp) {
+    previousResults = resp.results || [];
+    if (resp.type === 'agenda') {
+        displayAgendaResults(previousResults);
+        if (resp.url) {
+            displayAssistantMessage(
+                `Bekijk alles op <a href="${resp.url}" target="_blank">OBA Agenda</a>`
+            );
+        }
+    } else {
+        displaySearchResults(previousResults);
+    }
+}
+
+/* Toon de definitieve tekst; vervangt een al gestreamd bericht in plaats van het te herhalen */
+function finishAssistantMessage(message, streamedEl) {
+    if (streamedEl) {
+        streamedEl.innerHTML = message;
+        scrollToBottom();
+    } else {
+        displayAssistantMessage(message);
+    }
+}
+
 async function sendMessage() {
     const userInput = document.getElementById('user-input').value.trim();
     if (userInput === "") return;
@@ -270,19 +346,36 @@ async function sendMessage() {
 
     timeoutHandle = setTimeout(() => { showErrorMessage(); }, 30000);
 
+    const streamed = { results: false, messageEl: null };
+
     try {
-        const response = await fetch('/send_message', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                thread_id: thread_id,
-                user_input: userInput,
-                assistant_id: 'asst_ejPRaNkIhjPpNHDHCnoI5zKY'
-            })
+        const data = await postTurn('/send_message', {
+            thread_id: thread_id,
+            user_input: userInput,
+            assistant_id: 'asst_ejPRaNkIhjPpNHDHCnoI5zKY'
+        }, (event, payload) => {
+            if (event === 'tool') {
+                // Server leeft nog: geef de zoekactie opnieuw de volle wachttijd
+                clearTimeout(timeoutHandle);
+                timeoutHandle = setTimeout(() => { showErrorMessage(); }, 30000);
+            } else if (event === 'results') {
+                hideLoader();
+                clearTimeout(timeoutHandle);
+                const resp = payload?.response;
+                if (resp?.type === 'agenda' || resp?.type === 'collection') {
+                    showResultList(resp);
+                    streamed.results = true;
+                }
+            } else if (event === 'delta') {
+                hideLoader();
+                clearTimeout(timeoutHandle);
+                if (!streamed.messageEl) streamed.messageEl = displayAssistantMessage('');
+                streamed.messageEl.textContent += payload.text;
+                scrollToBottom();
+            }
         });
-        if (!response.ok) { showErrorMessage(); return; }
+        if (!data) { showErrorMessage(); return; }
 
-        const data = await response.json();
         console.log("[NEXITEXT][OUTPUT][SEND]", data);
 
         hideLoader();
@@ -294,31 +387,21 @@ async function sendMessage() {
         switch (resp?.type) {
             case 'agenda':
             case 'collection': {
-                previousResults = resp.results || [];
-                if (resp.type === 'agenda') {
-                    displayAgendaResults(previousResults);
-                    if (resp.url) {
-                        displayAssistantMessage(
-                            `Bekijk alles op <a href="${resp.url}" target="_blank">OBA Agenda</a>`
-                        );
-                    }
-                } else {
-                    displaySearchResults(previousResults);
-                }
-                if (resp.message) displayAssistantMessage(resp.message);
+                if (!streamed.results) showResultList(resp);
+                if (resp.message) finishAssistantMessage(resp.message, streamed.messageEl);
                 decideAndLoadFilter(previousResults);
                 if (resp.type === 'agenda') await sendStatusKlaar();
                 break;
             }
             case 'faq': {
-                if (resp.message) displayAssistantMessage(resp.message);
+                if (resp.message) finishAssistantMessage(resp.message, streamed.messageEl);
                 document.getElementById("filter-options").innerHTML = "";
                 previousResults = [];
                 break;
             }
             case 'text':
             default: {
-                displayAssistantMessage(resp?.message || 'Ik heb je vraag niet helemaal begrepen.');
+                finishAssistantMessage(resp?.message || 'Ik heb je vraag niet helemaal begrepen.', streamed.messageEl);
                 document.getElementById("filter-options").innerHTML = "";
                 previousResults = [];
                 break;
@@ -390,6 +473,7 @@ function displayAssistantMessage(message) {
     }
     messageContainer.appendChild(messageElement);
     scrollToBottom();
+    return messageElement;
 }
 
 function displaySearchResults(results) {
@@ -531,64 +615,47 @@ function showAgendaDetail(result) {
 
 async function fetchAndShowDetailPage(ppn) {
     try {
-        const resolverResponse = await fetch(`/proxy/resolver?ppn=${ppn}`);
-        const resolverText = await resolverResponse.text();
-        const parser = new DOMParser();
-        const resolverDoc = parser.parseFromString(resolverText, "application/xml");
-        const itemIdElement = resolverDoc.querySelector('itemid');
-        if (!itemIdElement) {
-            throw new Error('Item ID not found in resolver response.');
+        const detailResponse = await fetch(`/proxy/book?ppn=${encodeURIComponent(ppn)}`);
+        if (!detailResponse.ok) {
+            throw new Error('Book details not found.');
         }
-        const itemId = itemIdElement.textContent.split('|')[2];
-
-        const detailResponse = await fetch(`/proxy/details?item_id=${itemId}`);
-        const contentType = detailResponse.headers.get("content-type");
-        if (contentType && contentType.indexOf("application/json") !== -1) {
-            const detailJson = await detailResponse.json();
-            const rec = detailJson?.record ?? {};
-
-            const titles = Array.isArray(rec.titles) ? rec.titles : (rec.titles ? [rec.titles] : []);
-            const covers = Array.isArray(rec.coverimages) ? rec.coverimages : (rec.coverimages ? [rec.coverimages] : []);
-            const summaries = Array.isArray(rec.summaries) ? rec.summaries : [];
-            const descriptions = Array.isArray(rec.description) ? rec.description : (rec.description ? [rec.description] : []);
-
-            const title = titles[0] || 'Titel niet beschikbaar';
-            const summary = summaries[0] || descriptions[0] || 'Samenvatting niet beschikbaar';
-            const coverImage = covers[0] || '';
-
-            const detailContainer = document.getElementById('detail-container');
-            const searchResultsContainer = document.getElementById('search-results');
-
-            searchResultsContainer.style.display = 'none';
-            detailContainer.style.display = 'block';
-
-            detailContainer.innerHTML = `
-                <div class="detail-container">
-                    <img src="${coverImage}" alt="Cover for PPN ${ppn}" class="detail-cover">
-                    <div class="detail-summary">
-                        <p>${summary}</p>
-                        <div class="detail-buttons">
-                            <button onclick="goBackToResults()">Terug</button>
-                            <button onclick="window.open('https://oba.nl/nl/collectie/oba-collectie?id=' + encodeURIComponent('|oba-catalogus|' + '${itemId}'), '_blank')">Meer informatie op OBA.nl</button>
-                            <button onclick="window.open('https://iguana.oba.nl/iguana/www.main.cls?sUrl=search&theme=OBA#app=Reserve&ppn=${ppn}', '_blank')">Reserveer</button>
-                        </div>
+        const detail = await detailResponse.json();
+        const itemId = detail.item_id;
+
+        const title = detail.title || 'Titel niet beschikbaar';
+        const summary = detail.summary || 'Samenvatting niet beschikbaar';
+        const coverImage = detail.cover || '';
+
+        const detailContainer = document.getElementById('detail-container');
+        const searchResultsContainer = document.getElementById('search-results');
+
+        searchResultsContainer.style.display = 'none';
+        detailContainer.style.display = 'block';
+
+        detailContainer.innerHTML = `
+            <div class="detail-container">
+                <img src="${coverImage}" alt="Cover for PPN ${ppn}" class="detail-cover">
+                <div class="detail-summary">
+                    <p>${summary}</p>
+                    <div class="detail-buttons">
+                        <button onclick="goBackToResults()">Terug</button>
+                        <button onclick="window.open('https://oba.nl/nl/collectie/oba-collectie?id=' + encodeURIComponent('|oba-catalogus|' + '${itemId}'), '_blank')">Meer informatie op OBA.nl</button>
+                        <button onclick="window.open('https://iguana.oba.nl/iguana/www.main.cls?sUrl=search&theme=OBA#app=Reserve&ppn=${ppn}', '_blank')">Reserveer</button>
                     </div>
                 </div>
-            `;
-            const imgEl = detailContainer.querySelector('.detail-cover');
-            loadCoverOrPlaceholder(imgEl.src, '/static/images/placeholder.png', (src) => {
-                imgEl.src = src;
-            });
+            </div>
+        `;
+        const imgEl = detailContainer.querySelector('.detail-cover');
+        loadCoverOrPlaceholder(imgEl.src, '/static/images/placeholder.png', (src) => {
+            imgEl.src = src;
+        });
 
-            const currentUrl = window.location.href.split('?')[0];
-            const breadcrumbs = document.getElementById('breadcrumbs');
-            breadcrumbs.innerHTML = `<a href="#" onclick="goBackToResults()">resultaten</a> > <span class="breadcrumb-title"><a href="${currentUrl}?ppn=${ppn}" target="_blank">${title}</a></span>`;
+        const currentUrl = window.location.href.split('?')[0];
+        const breadcrumbs = document.getElementById('breadcrumbs');
+        breadcrumbs.innerHTML = `<a href="#" onclick="goBackToResults()">resultaten</a> > <span class="breadcrumb-title"><a href="${currentUrl}?ppn=${ppn}" target="_blank">${title}</a></span>`;
 
-            if (!linkedPPNs.has(ppn)) {
-                sendDetailPageLinkToUser(title, currentUrl, ppn);
-            }
-        } else {
-            throw new Error('Unexpected response content type');
+        if (!linkedPPNs.has(ppn)) {
+            sendDetailPageLinkToUser(title, currentUrl, ppn);
         }
     } catch (error) {
         displayAssistantMessage('Er is iets misgegaan bij het ophalen van de detailpagina.');
@@ -626,6 +693,16 @@ function sendDetailPageLinkToUser(title, baseUrl, ppn) {
     linkedPPNs.add(ppn);
 }
 
+function showFilteredResults(resp) {
+    previousResults = resp.results || [];
+    if (resp.type === 'agenda') {
+        displayAgendaResults(previousResults);
+    } else {
+        displaySearchResults(previousResults);
+    }
+    decideAndLoadFilter(previousResults);
+}
+
 async function applyFiltersAndSend() {
     let filterString = "";
 
@@ -663,20 +740,29 @@ async function applyFiltersAndSend() {
     document.getElementById('detail-container').style.display = 'none';
     document.getElementById('breadcrumbs').innerHTML = '';
 
+    const streamed = { results: false, message: false };
+
     try {
-        const response = await fetch('/apply_filters', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                thread_id: thread_id,
-                filter_values: filterString,
-                assistant_id: 'asst_ejPRaNkIhjPpNHDHCnoI5zKY'
-            })
+        const data = await postTurn('/apply_filters', {
+            thread_id: thread_id,
+            filter_values: filterString,
+            assistant_id: 'asst_ejPRaNkIhjPpNHDHCnoI5zKY'
+        }, (event, payload) => {
+            if (event !== 'results') return;
+            hideLoader();
+            const resp = payload?.response;
+            if (resp?.type === 'agenda' || resp?.type === 'collection') {
+                if (resp.message) {
+                    displayAssistantMessage(resp.message);
+                    streamed.message = true;
+                }
+                showFilteredResults(resp);
+                streamed.results = true;
+            }
         });
 
-        if (!response.ok) { hideLoader(); return; }
+        if (!data) { hideLoader(); return; }
 
-        const data = await response.json();
         console.log("[NEXITEXT][OUTPUT][FILTER]", data);
 
         hideLoader();
@@ -684,20 +770,14 @@ async function applyFiltersAndSend() {
         const { response: resp, thread_id: newTid } = data;
         if (newTid) thread_id = newTid;
 
-        if (resp && resp.message && resp.type !== 'faq') {
+        if (resp && resp.message && resp.type !== 'faq' && !streamed.message) {
             displayAssistantMessage(resp.message);
         }
 
         switch (resp?.type) {
             case 'agenda':
             case 'collection': {
-                previousResults = resp.results || [];
-                if (resp.type === 'agenda') {
-                    displayAgendaResults(previousResults);
-                } else {
-                    displaySearchResults(previousResults);
-                }
-                decideAndLoadFilter(previousResults);
+                if (!streamed.results) showFilteredResults(resp);
                 break;
             }
             case 'faq': {